@@ -0,0 +1,119 @@
+"""
+Regras de agenda (recursos e turnos por dia) e cálculos de ocupação.
+Não depende do Streamlit nem de numpy/pandas.
+"""
+import calendar
+from datetime import date, timedelta
+from typing import Dict, Iterable, List, Mapping, Optional, Sequence, Tuple
+
+TURNOS_SEMANA = ["19h - 22h"]
+TURNOS_FIM_DE_SEMANA = ["08h - 12h", "14h - 18h", "19h - 22h"]
+
+# recurso das reservas antigas (sem a coluna "recurso") e da instalação padrão
+RECURSO_PADRAO = "sala"
+
+
+class Recurso:
+    """Um espaço/equipamento reservável e o seu calendário de turnos."""
+
+    __slots__ = ("chave", "nome", "turnos_semana", "turnos_fim_de_semana")
+
+    def __init__(self, chave: str, nome: str, turnos_semana: Sequence[str] = TURNOS_SEMANA,
+                 turnos_fim_de_semana: Sequence[str] = TURNOS_FIM_DE_SEMANA):
+        self.chave = chave
+        self.nome = nome
+        self.turnos_semana = list(turnos_semana)
+        self.turnos_fim_de_semana = list(turnos_fim_de_semana)
+
+    def turnos(self, d: date) -> List[str]:
+        # 0=seg ... 6=dom
+        if d.weekday() <= 4:
+            return list(self.turnos_semana)
+        return list(self.turnos_fim_de_semana)
+
+
+# chave -> Recurso, na ordem de exibição
+RECURSOS: Dict[str, Recurso] = {RECURSO_PADRAO: Recurso(RECURSO_PADRAO, "Sala de ensaios")}
+
+
+def configurar_recursos(cfg: Optional[Mapping[str, Mapping]]) -> Dict[str, Recurso]:
+    """
+    Troca os recursos conforme a configuração (secrets RECURSOS), por ex.:
+        [RECURSOS.sala]
+        nome = "Sala de ensaios"
+        [RECURSOS.salao]
+        nome = "Salão paroquial"
+        semana = ["19h - 22h"]
+        fim_de_semana = ["08h - 12h", "14h - 18h"]
+    Turnos não informados seguem os da sala. Sem cfg, só a sala de ensaios.
+    Monta um dict novo e troca numa atribuição só: as sessões que estão lendo
+    RECURSOS em outras threads nunca veem o registro vazio ou pela metade.
+    """
+    global RECURSOS
+    novos = {}
+    for chave, c in (cfg or {}).items():
+        novos[chave] = Recurso(
+            chave,
+            c.get("nome", chave),
+            c.get("semana", TURNOS_SEMANA),
+            c.get("fim_de_semana", TURNOS_FIM_DE_SEMANA),
+        )
+    RECURSOS = novos or {RECURSO_PADRAO: Recurso(RECURSO_PADRAO, "Sala de ensaios")}
+    return RECURSOS
+
+
+def assinatura_recursos(recursos: Mapping[str, Recurso]) -> Tuple:
+    """Chaves e turnos dos recursos, para chaves de cache: muda quando a configuração muda."""
+    return tuple((k, tuple(r.turnos_semana), tuple(r.turnos_fim_de_semana)) for k, r in recursos.items())
+
+
+def recurso(chave: str) -> Recurso:
+    """Recurso pela chave; chaves desconhecidas (linhas antigas) usam os turnos da sala."""
+    r = RECURSOS.get(chave or RECURSO_PADRAO)
+    return r if r is not None else Recurso(chave, chave)
+
+
+def turnos_por_data(d: date, chave: str = RECURSO_PADRAO) -> List[str]:
+    return recurso(chave).turnos(d)
+
+
+def expandir_recorrencia(inicio: date, ate: date, a_cada_semanas: int = 1) -> List[date]:
+    """Datas de uma série semanal (a_cada_semanas=2: quinzenal) de inicio até ate, inclusive."""
+    if a_cada_semanas < 1:
+        raise ValueError("a_cada_semanas deve ser >= 1")
+    passo = timedelta(weeks=a_cada_semanas)
+    datas = []
+    d = inicio
+    while d <= ate:
+        datas.append(d)
+        d += passo
+    return datas
+
+
+def norm_data(d: date) -> str:
+    return d.strftime("%Y-%m-%d")
+
+
+def ocupacao_mes_registros(reservas: Iterable, ano: int, mes: int,
+                           chaves: Optional[Iterable[str]] = None) -> Dict[str, Tuple[Dict[date, int], Dict[date, int]]]:
+    """
+    {recurso: (ocupados, totais)} por dia do mês, para todos os recursos numa
+    passada só: recebe os registros (Reserva, com .data e .recurso) do mês —
+    ex.: IndiceReservas.do_mes — e conta por (recurso, dia) num dict.
+    """
+    chaves = list(RECURSOS) if chaves is None else list(chaves)
+    contados: Dict[Tuple[str, str], int] = {}
+    for r in reservas:
+        k = (r.recurso or RECURSO_PADRAO, r.data)
+        contados[k] = contados.get(k, 0) + 1
+
+    datas = [date(ano, mes, dia) for dia in range(1, calendar.monthrange(ano, mes)[1] + 1)]
+    resultado = {}
+    for chave in chaves:
+        rec = recurso(chave)
+        resultado[chave] = (
+            {dt: contados.get((chave, norm_data(dt)), 0) for dt in datas},
+            {dt: len(rec.turnos(dt)) for dt in datas},
+        )
+    return resultado
+
@@ -1,23 +1,44 @@
+import time
+
+_t_inicio = time.perf_counter()
+
 import os
-import hashlib
 import uuid
 import calendar
-from datetime import date
-from io import StringIO
-from typing import Optional
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Optional
 
-import pandas as pd
 import streamlit as st
 
-# (Somente no modo local)
-import portalocker
+# Só módulos leves aqui: pandas e o backend (requests/portalocker/sqlite3)
+# são importados depois que a "casca" da página já foi desenhada, e cada
+# backend só carrega as dependências do seu modo.
+from erros import (
+    ConflitoGitHub,
+    GitHubIndisponivel,
+    MuitasTentativas,
+    PinIncorreto,
+    ReservaNaoEncontrada,
+    TurnoIndisponivel,
+)
+from agenda import (
+    RECURSO_PADRAO,
+    assinatura_recursos,
+    configurar_recursos,
+    expandir_recorrencia,
+    ocupacao_mes_registros,
+)
+from estado import EstadoReservas
+from exportar import FORMATOS, exportar
+from indice import IndiceReservas, Reserva, para_dataframe
+from metricas import METRICAS
+from senhas import VerificadorPin, configurar_kdf, gerar_hash, iguais, precisa_migrar
 
-# (Somente no modo Cloud/GitHub)
-import base64
-import requests
+if TYPE_CHECKING:
+    import pandas as pd
 
-#IMPORT NECESSÁRIO PARA FUNÇÃO SALVAR RESERVA
-import time
+    from armazenamento import Armazenamento, ArmazenamentoCSV, ArmazenamentoGitHub, ArmazenamentoLog, ArmazenamentoSQLite
+    from fila_gravacao import FilaGravacao
 
 # =========================================================
 # Config / Estilo
@@ -104,7 +125,10 @@ st.markdown("""
 """, unsafe_allow_html=True)
 
 ARQUIVO = "reservas.csv"
-COLUNAS = ["id", "data", "turno", "grupo", "pin_hash"]
+ARQUIVO_DB = "reservas.db"
+ARQUIVO_LOG = "reservas.jsonl"
+MAX_SEMANAS_SERIE = 52  # reserva recorrente: no máximo um ano à frente
+DIAS_SEMANA = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
 # =========================================================
 # Persistência no GitHub (reservas.csv) — para não “zerar” na nuvem
 # Configure no Streamlit Cloud em Secrets:
@@ -116,241 +140,178 @@ COLUNAS = ["id", "data", "turno", "grupo", "pin_hash"]
 # GITHUB_REPO = "marcusandre-bot/reserva-sala-ensaios"
 # GITHUB_BRANCH = "main"
 # GITHUB_FILE = "reservas.csv"
-# =========================================================
-# -------------------------
-# Persistência no GitHub (reservas.csv)
-# -------------------------
-from io import StringIO
-from typing import Optional, Tuple
-
-def github_config_ok() -> bool:
-    return all(k in st.secrets for k in ["GITHUB_TOKEN", "GITHUB_REPO", "GITHUB_BRANCH", "GITHUB_FILE"])
-
-def _gh_headers():
-    return {
-        "Authorization": f"token {st.secrets['GITHUB_TOKEN']}",
-        "Accept": "application/vnd.github+json",
-    }
-    
-# GITHUB ANTIGO (BACKUP CASO DÊ ERRO NO NOVO)
-#def github_get_file() -> Tuple[str, Optional[str]]:
-    #"""
-   # Retorna (content_str, sha) do arquivo no GitHub.
-   # Se não existir, retorna ("", None).
- #   """
-#    repo = st.secrets["GITHUB_REPO"]          # ex: "marcusandre-bot/reserva-sala-ensaios"
-#    branch = st.secrets.get("GITHUB_BRANCH", "main")
-#    path = st.secrets["GITHUB_FILE"]          # ex: "reservas.csv"
 #
- #   url = f"https://api.github.com/repos/{repo}/contents/{path}?ref={branch}"
- #   r = requests.get(url, headers=_gh_headers(), timeout=20)
+# GITHUB_API_URL (opcional) troca o endereço da API — ex.: o servidor
+# falso de bench/servidor_github.py para testes de carga.
 #
-  #  if r.status_code == 404:
-  #      return "", None
+# GITHUB_MODO = "mensal" (opcional): em vez de um reservas.csv inteiro,
+# um arquivo por mês (reservas/2026-03.csv), lido e gravado pela Git Data
+# API — cada reserva só reenvia o mês dela, e não há o limite de 1 MB da
+# Contents API. O reservas.csv que já existir é repartido na primeira gravação.
 #
- #   r.raise_for_status()
- #   data = r.json()
+# GRAVACAO_EM_LOTE = true (opcional, com GitHub): reservas/cancelamentos são
+# confirmados assim que anotados no diário local (DIARIO_GRAVACAO) e gravados
+# no GitHub em segundo plano, vários num único commit.
 #
-#    content_b64 = (data.get("content") or "").replace("\n", "")
-#    sha = data.get("sha")
+# RECURSOS (opcional): mais de um espaço/equipamento no mesmo app, cada um
+# com os seus turnos. Sem isso, só a sala de ensaios. Exemplo:
+# [RECURSOS.sala]
+# nome = "Sala de ensaios"
+# [RECURSOS.salao]
+# nome = "Salão paroquial"
+# semana = ["19h - 22h"]
+# fim_de_semana = ["08h - 12h", "14h - 18h"]
+# Todas as reservas continuam num arquivo só (coluna "recurso"): mais
+# recursos não significam mais requisições ao GitHub.
 #
-#    content = base64.b64decode(content_b64).decode("utf-8") if content_b64 else ""
-  #  return content, sha
+# PIN_KDF (opcional): custo do hash dos PINs (ver senhas.configurar_kdf).
+# O padrão é scrypt (n=16384, r=8, p=1); ex.: [PIN_KDF] kdf = "pbkdf2".
+#
+# ATUALIZAR_A_CADA (opcional, segundos; padrão 20, 0 desliga): de quanto em
+# quanto tempo cada página confere se outra pessoa reservou/cancelou.
+#
+# Sem GitHub (modo local), ARMAZENAMENTO = "sqlite" usa reservas.db
+# (na primeira vez importa o reservas.csv). ARMAZENAMENTO = "log" grava cada
+# reserva/cancelamento como uma linha em reservas.jsonl e reexporta o
+# reservas.csv a cada compactação. O padrão é "csv".
+# =========================================================
+def github_config_ok() -> bool:
+    return all(k in st.secrets for k in ["GITHUB_TOKEN", "GITHUB_REPO", "GITHUB_BRANCH", "GITHUB_FILE"])
 
-def github_get_file() -> Tuple[str, Optional[str]]:
-    """
-    Retorna (content_str, sha) do arquivo no GitHub.
-    Se não existir, retorna ("", None).
-    Se der erro temporário (rede/rate limit), não derruba o app.
-    """
-    repo = st.secrets["GITHUB_REPO"]
-    branch = st.secrets.get("GITHUB_BRANCH", "main")
-    path = st.secrets["GITHUB_FILE"]
+def modo_local() -> str:
+    return str(st.secrets.get("ARMAZENAMENTO", os.environ.get("ARMAZENAMENTO", "csv"))).lower()
 
-    url = f"https://api.github.com/repos/{repo}/contents/{path}?ref={branch}"
+def github_mensal() -> bool:
+    return str(st.secrets.get("GITHUB_MODO", "arquivo")).lower() == "mensal"
 
-    try:
-        r = requests.get(url, headers=_gh_headers(), timeout=20)
+@st.cache_resource(show_spinner=False)
+def _armazenamento_github(token: str, repo: str, branch: str, path: str, api_url: str,
+                          mensal: bool) -> "ArmazenamentoGitHub":
+    """Uma instância (e um cache) por repo/branch/arquivo, compartilhada por todas as sessões."""
+    from armazenamento import ArmazenamentoGitHub, ArmazenamentoGitHubMensal
 
-        if r.status_code == 404:
-            return "", None
+    classe = ArmazenamentoGitHubMensal if mensal else ArmazenamentoGitHub
+    return classe(token, repo, branch, path, avisar=st.warning, api_url=api_url)
 
-        # Em caso de rate limit / instabilidade, não quebrar o app:
-        if r.status_code >= 400:
-            st.warning(f"GitHub temporariamente indisponível (HTTP {r.status_code}). Tente novamente em instantes.")
-            return "", None
+@st.cache_resource(show_spinner=False)
+def _fila_gravacao(_destino: "Armazenamento", chave: str, diario: str) -> "FilaGravacao":
+    """Uma fila (e uma thread de gravação) por destino, por processo."""
+    from fila_gravacao import FilaGravacao
 
-        data = r.json()
-        content_b64 = (data.get("content") or "").replace("\n", "")
-        sha = data.get("sha")
-        content = base64.b64decode(content_b64).decode("utf-8") if content_b64 else ""
-        return content, sha
+    return FilaGravacao(_destino, diario)
 
-    except Exception as e:
-        st.warning(f"Falha temporária ao acessar o GitHub: {e}")
-        return "", None
+def gravacao_em_lote() -> bool:
+    return github_config_ok() and str(st.secrets.get("GRAVACAO_EM_LOTE", "")).lower() in ("1", "true", "sim")
 
-def github_put_file(content_str: str, sha_atual: Optional[str]):
-    """
-    Salva content_str no GitHub (mesmo path). Usa SHA para evitar sobrescrever mudanças.
-    Retorna (status_code, response_text) para debug.
-    """
-    repo = st.secrets["GITHUB_REPO"]
-    branch = st.secrets.get("GITHUB_BRANCH", "main")
-    path = st.secrets["GITHUB_FILE"]
+@st.cache_resource(show_spinner=False)
+def _armazenamento_csv(arquivo: str) -> "ArmazenamentoCSV":
+    from armazenamento import ArmazenamentoCSV
 
-    url = f"https://api.github.com/repos/{repo}/contents/{path}"
+    return ArmazenamentoCSV(arquivo)
 
-    payload = {
-        "message": "Atualiza reservas.csv",
-        "content": base64.b64encode(content_str.encode("utf-8")).decode("utf-8"),
-        "branch": branch,
-    }
-    if sha_atual:
-        payload["sha"] = sha_atual
+@st.cache_resource(show_spinner=False)
+def _armazenamento_sqlite(caminho: str, importar_de: str) -> "ArmazenamentoSQLite":
+    from armazenamento import ArmazenamentoSQLite
 
-    r = requests.put(url, headers=_gh_headers(), json=payload, timeout=20)
+    return ArmazenamentoSQLite(caminho, importar_de=importar_de)
 
-    # 409/422: conflito (alguém gravou antes) ou sha errado
-    if r.status_code in (409, 422):
-        raise RuntimeError(f"CONFLITO_GITHUB:{r.status_code}:{r.text}")
+@st.cache_resource(show_spinner=False)
+def _armazenamento_log(caminho: str, arquivo_csv: str) -> "ArmazenamentoLog":
+    from armazenamento import ArmazenamentoLog
 
-    r.raise_for_status()
-    return r.status_code, r.text
+    return ArmazenamentoLog(caminho, arquivo_csv, importar_de=arquivo_csv)
 
-def carregar_reservas() -> pd.DataFrame:
-    """Carrega do GitHub (Cloud) ou do arquivo local (PC)."""
+def armazenamento() -> "Armazenamento":
+    """Backend de dados conforme a configuração (GitHub > SQLite > log > CSV)."""
     if github_config_ok():
-        content, _sha = github_get_file()
-        if not content.strip():
-            df = pd.DataFrame(columns=COLUNAS)
-        else:
-            try:
-                df = pd.read_csv(StringIO(content), dtype=str)
-            except Exception:
-                df = pd.DataFrame(columns=COLUNAS)
-    else:
-        # --- modo local (secrets não configurado) ---
-        if not os.path.exists(ARQUIVO):
-            df0 = pd.DataFrame(columns=COLUNAS)
-            with portalocker.Lock(ARQUIVO, "w", timeout=5) as f:
-                df0.to_csv(f, index=False)
-            return df0
-
-        with portalocker.Lock(ARQUIVO, "r", timeout=5) as f:
-            try:
-                df = pd.read_csv(f, dtype=str)
-            except Exception:
-                df = pd.DataFrame(columns=COLUNAS)
-
-    # garante colunas
-    for c in COLUNAS:
-        if c not in df.columns:
-            df[c] = ""
-    return df[COLUNAS]
-
-#FUNÇÃO SALVAR RESERVAS NOVA
-def salvar_reservas(df: pd.DataFrame) -> None:
-    """
-    Salva no GitHub (Cloud) ou no arquivo local (PC).
-    Evita erro falso por atraso/cache do GitHub logo após o PUT.
-    """
+        destino = _armazenamento_github(
+            st.secrets["GITHUB_TOKEN"],
+            st.secrets["GITHUB_REPO"],
+            st.secrets.get("GITHUB_BRANCH", "main"),
+            st.secrets["GITHUB_FILE"],
+            st.secrets.get("GITHUB_API_URL", "https://api.github.com"),
+            github_mensal(),
+        )
+        if gravacao_em_lote():
+            chave = f'{st.secrets["GITHUB_REPO"]}@{st.secrets.get("GITHUB_BRANCH", "main")}:{st.secrets["GITHUB_FILE"]}'
+            return _fila_gravacao(destino, chave, st.secrets.get("DIARIO_GRAVACAO", "reservas.diario.jsonl"))
+        return destino
+    if modo_local() == "sqlite":
+        return _armazenamento_sqlite(ARQUIVO_DB, ARQUIVO)
+    if modo_local() == "log":
+        return _armazenamento_log(ARQUIVO_LOG, ARQUIVO)
+    return _armazenamento_csv(ARQUIVO)
+
+def modo_dados() -> str:
     if github_config_ok():
-        try:
-            # pega sha atual
-            _content_atual, sha = github_get_file()
-
-            # grava
-            csv_str = df.to_csv(index=False)
-            github_put_file(csv_str, sha)
-
-            # valida com 3 tentativas curtas (sem quebrar o app)
-            ok = False
-            for _ in range(3):
-                time.sleep(0.4)
-                content_ok, _sha2 = github_get_file()
-
-                if not (content_ok or "").strip():
-                    df_ok = pd.DataFrame(columns=COLUNAS)
-                else:
-                    try:
-                        df_ok = pd.read_csv(StringIO(content_ok), dtype=str)
-                    except Exception:
-                        df_ok = pd.DataFrame(columns=COLUNAS)
-
-                if len(df_ok) == len(df):
-                    ok = True
-                    break
-
-            if not ok:
-                st.warning(
-                    "Reserva/cancelamento foi salvo, mas a leitura imediata ainda não refletiu. "
-                    "Se necessário, atualize a página (F5)."
-                )
+        return "github-mensal" if github_mensal() else "github"
+    return modo_local()
 
-        except Exception as e:
-            st.error(f"Falha ao salvar no GitHub: {e}")
-            raise
-    else:
-        with portalocker.Lock(ARQUIVO, "w", timeout=5) as f:
-            df.to_csv(f, index=False)
-            
-#FUNÇÃO SALVAR RESERVA ANTIGA (INATIVA)
-#def salvar_reservas(df: pd.DataFrame) -> None:
- #   """
-   # Salva no GitHub (Cloud) ou no arquivo local (PC).
- #   IMPORTANTE: valida se a escrita realmente refletiu no GitHub.
-#    """
-#    if github_config_ok():
-  #      try:
-      #      # pega sha atual
-        #    _content_atual, sha = github_get_file()
-
-      #      # grava
-      #     csv_str = df.to_csv(index=False)
-      #      github_put_file(csv_str, sha)
-#
-      #      # valida (recarrega e confere)
-      #      content_ok, _sha2 = github_get_file()
-          #  df_ok = pd.read_csv(StringIO(content_ok), dtype=str) if content_ok.strip() else pd.DataFrame(columns=COLUNAS)
-
-         #   # se não bateu, avisa claramente
-        #    if len(df_ok) != len(df):
-       #         raise RuntimeError("GitHub gravou, mas o arquivo recarregado não conferiu (tamanho diferente).")
-
-       # except Exception as e:
-     #       # Mostra o erro no app (pra você não ficar “no escuro”)
-   #         st.error(f"Falha ao salvar no GitHub: {e}")
-    #        raise
-   # else:
-    #   with portalocker.Lock(ARQUIVO, "w", timeout=5) as f:
-   #         df.to_csv(f, index=False)
+@st.cache_resource(show_spinner=False)
+def _estado(_arm: "Armazenamento", modo: str) -> EstadoReservas:
+    """Snapshot + contador de versão, um por backend, compartilhado pelas sessões."""
+    return EstadoReservas(_arm)
+
+def estado() -> EstadoReservas:
+    return _estado(armazenamento(), modo_dados())
+
+def carregar_historico(ano: int) -> "pd.DataFrame":
+    """Reservas já passadas de um ano (só o calendário de meses passados usa)."""
+    return armazenamento().carregar_historico(ano)
+
+@st.cache_resource(show_spinner=False)
+def _arquivar_passadas(_arm: "Armazenamento", modo: str, dia: date) -> int:
+    """Tira as reservas passadas do arquivo vivo: no máximo uma vez por dia por processo."""
+    return _arm.arquivar(dia)
 
 # Indicador de modo (ajuda MUITO a diagnosticar)
-st.caption("Modo de dados: **Cloud (GitHub)**" if github_config_ok() else "Modo de dados: **Local**")
+if github_config_ok():
+    st.caption("Modo de dados: **Cloud (GitHub, um arquivo por mês)**" if github_mensal()
+               else "Modo de dados: **Cloud (GitHub)**")
+elif modo_local() == "sqlite":
+    st.caption("Modo de dados: **Local (SQLite)**")
+elif modo_local() == "log":
+    st.caption("Modo de dados: **Local (log)**")
+else:
+    st.caption("Modo de dados: **Local**")
+
+
+# o registro deste rerun: configurar_recursos troca o dict do módulo inteiro, nunca o altera
+RECURSOS = configurar_recursos(st.secrets.get("RECURSOS"))
+configurar_kdf(st.secrets.get("PIN_KDF"))
 
 
 # =========================================================
 # Funções auxiliares
 # =========================================================
-def hash_pin(pin: str) -> str:
-    return hashlib.sha256(pin.encode("utf-8")).hexdigest()
+@st.cache_resource(show_spinner=False)
+def verificador_pin() -> VerificadorPin:
+    """Tentativas erradas e acertos recentes, compartilhados pelas sessões do processo."""
+    return VerificadorPin()
 
 
-def turnos_por_data(d: date):
-    # 0=seg ... 6=dom
-    if d.weekday() <= 4:
-        return ["19h - 22h"]
-    return ["08h - 12h", "14h - 18h", "19h - 22h"]
+def admin_pin() -> str:
+    return str(st.secrets.get("ADMIN_PIN", ""))
 
 
 def admin_pin_ok(pin_digitado: str) -> bool:
-    admin_pin = st.secrets.get("ADMIN_PIN", "")
-    return bool(admin_pin) and pin_digitado == admin_pin
+    """Só compara (em tempo constante); quem confere um PIN digitado usa verificador_pin()."""
+    return bool(admin_pin()) and iguais(pin_digitado, admin_pin())
 
 
-def norm_data(d: date) -> str:
-    return d.strftime("%Y-%m-%d")
+def _conferir_pin_metricas() -> None:
+    """on_change do PIN do painel: confere uma vez por valor digitado, não a cada rerun."""
+    pin = st.session_state.get("pin_metricas", "").strip()
+    st.session_state["metricas_liberadas"], st.session_state["metricas_erro"] = False, ""
+    if not pin:
+        return
+    try:
+        if verificador_pin().verificar_admin(pin, admin_pin()):
+            st.session_state["metricas_liberadas"] = True
+        else:
+            st.session_state["metricas_erro"] = "PIN do administrador incorreto."
+    except MuitasTentativas as e:
+        st.session_state["metricas_erro"] = f"Muitas tentativas com PIN errado. Tente de novo em {e.espera:.0f} s."
 
 
 # =========================================================
@@ -362,18 +323,30 @@ if "data_sel" not in st.session_state:
 
 
 # =========================================================
-# Abas (Calendário / Reservar / Cancelar / Lista)
+# Recurso (espaço/equipamento) — só aparece com mais de um
+# =========================================================
+def nome_recurso(chave: str) -> str:
+    r = RECURSOS.get(chave)
+    return r.nome if r is not None else chave
+
+varios_recursos = len(RECURSOS) > 1
+if varios_recursos:
+    recurso_sel = st.selectbox("Espaço / equipamento", list(RECURSOS), format_func=nome_recurso, key="recurso_sel")
+else:
+    recurso_sel = next(iter(RECURSOS), RECURSO_PADRAO)
+
+
+# =========================================================
+# Abas (Calendário / Reservar / Cancelar / Lista / Horários livres)
 # =========================================================
-tab_cal, tab_reservar, tab_cancelar, tab_lista = st.tabs(
-    ["📅 Calendário", "✅ Reservar", "❌ Cancelar", "📋 Reservas realizadas"]
+tab_cal, tab_reservar, tab_cancelar, tab_lista, tab_livres = st.tabs(
+    ["📅 Calendário", "✅ Reservar", "❌ Cancelar", "📋 Reservas realizadas", "🔎 Horários livres"]
 )
 
 # =========================================================
-# TAB 1 — CALENDÁRIO
+# TAB 1 — CALENDÁRIO (casca: desenhada antes de buscar os dados)
 # =========================================================
 with tab_cal:
-    df = carregar_reservas()
-
     col_cal, col_leg = st.columns([1.15, 1])
 
     with col_leg:
@@ -383,6 +356,7 @@ with tab_cal:
         st.markdown("🟥 **Lotado** (3/3 ou 1/1)")
         st.caption("Clique no dia para selecionar a data e depois vá para a aba de Reservar.")
         st.info(f"Data selecionada: **{st.session_state['data_sel'].strftime('%d/%m/%Y')}**")
+        linha_resumo = st.empty()
 
     with col_cal:
         colA, colB = st.columns([1, 2])
@@ -402,67 +376,138 @@ with tab_cal:
             )
         mes = list(calendar.month_name).index(mes_nome)
 
-        cal = calendar.monthcalendar(int(ano), int(mes))
-
-        df_cal = df.copy()
-        if not df_cal.empty:
-            df_cal["data"] = df_cal["data"].astype(str).str[:10]
-
-        ocupados = {}
-        totais = {}
-
-        for semana in cal:
-            for dia in semana:
-                if dia == 0:
-                    continue
-                dt = date(int(ano), int(mes), int(dia))
-                tot = len(turnos_por_data(dt))
-                dt_str = norm_data(dt)
-                occ = int((df_cal["data"] == dt_str).sum()) if tot > 0 else 0
-                ocupados[dt] = occ
-                totais[dt] = tot
-
-        dias_sem = ["Seg", "Ter", "Qua", "Qui", "Sex", "Sáb", "Dom"]
-        cols_head = st.columns(7)
-        for i, dsem in enumerate(dias_sem):
-            cols_head[i].markdown(f"**{dsem}**")
-
-        for semana in cal:
-            cols = st.columns(7)
-            for i, dia in enumerate(semana):
-                if dia == 0:
-                    cols[i].write("")
-                    continue
-
-                dt = date(int(ano), int(mes), int(dia))
-                occ = ocupados.get(dt, 0)
-                tot = totais.get(dt, 0)
-
-                if tot == 0:
-                    emoji = "⬜"
-                    status_txt = "—"
+        # a grade entra aqui quando a ocupação estiver calculada
+        grade = st.empty()
+        grade.caption("⏳ Carregando a ocupação do mês…")
+
+METRICAS.observar("inicio.ate_casca", (time.perf_counter() - _t_inicio) * 1000)
+
+
+# =========================================================
+# Snapshot da execução (lido UMA vez por rerun)
+# As abas só LEEM este DataFrame; os botões de reservar/cancelar
+# recarregam na hora do clique, antes de gravar.
+# =========================================================
+with METRICAS.cronometro("inicio.importar_dados"):
+    # primeira execução: importa o backend (e o pandas dele) só depois da casca
+    arm_atual = armazenamento()
+
+try:
+    _arquivar_passadas(arm_atual, modo_dados(), hoje)
+except Exception as e:
+    # se falhar, tenta de novo no próximo rerun; o app funciona igual
+    st.warning(f"Não foi possível arquivar as reservas passadas agora: {e}")
+try:
+    with METRICAS.cronometro("carregar_reservas"):
+        versao_dados, df_snapshot = estado().atual()
+except GitHubIndisponivel as e:
+    st.error(str(e))
+    st.stop()
+st.session_state["versao_vista"] = versao_dados
+indice_snapshot = arm_atual.indice(df_snapshot)
+METRICAS.observar("inicio.ate_dados", (time.perf_counter() - _t_inicio) * 1000)
+
+
+# =========================================================
+# Atualização ao vivo: um fragmento confere só o número da versão a cada
+# ATUALIZAR_A_CADA segundos (secrets; 0 desliga) e redesenha a página
+# apenas quando alguém gravou. A consulta ao backend é compartilhada por
+# todas as sessões (no GitHub, um GET condicional por intervalo).
+# =========================================================
+ATUALIZAR_A_CADA = float(st.secrets.get("ATUALIZAR_A_CADA", 20))
+
+@st.fragment(run_every=ATUALIZAR_A_CADA or None)
+def _vigiar_versao() -> None:
+    try:
+        versao = estado().conferir()
+    except GitHubIndisponivel:
+        return  # mantém o que está na tela; tenta de novo no próximo intervalo
+    if versao != st.session_state.get("versao_vista"):
+        METRICAS.contar("estado.atualizacoes_ao_vivo")
+        st.rerun()
+
+if ATUALIZAR_A_CADA > 0:
+    _vigiar_versao()
+
+
+# =========================================================
+# TAB 1 — CALENDÁRIO (ocupação)
+# =========================================================
+with grade.container(), METRICAS.cronometro("aba.calendario"):
+    cal = calendar.monthcalendar(int(ano), int(mes))
+
+    # mês com dias passados: junta o histórico do ano (só nesse caso)
+    def _ocupacao() -> dict:
+        do_mes = indice_snapshot.do_mes(int(ano), int(mes))
+        if date(int(ano), int(mes), 1) < hoje:
+            df_hist = carregar_historico(int(ano))
+            if not df_hist.empty:
+                por_id = {r.id: r for r in IndiceReservas.de_df(df_hist).do_mes(int(ano), int(mes))}
+                por_id.update((r.id, r) for r in do_mes)
+                do_mes = list(por_id.values())
+        # ocupação do mês inteiro, de todos os recursos, numa passada só (sem pandas)
+        return ocupacao_mes_registros(do_mes, int(ano), int(mes), list(RECURSOS))
+
+    # recalculada só quando os dados (ou os recursos configurados) mudam: uma vez
+    # por versão, para todas as sessões
+    with METRICAS.cronometro("calendario.ocupacao"):
+        chave_ocupacao = ("ocupacao", int(ano), int(mes), hoje, assinatura_recursos(RECURSOS))
+        ocupacao = estado().memo(versao_dados, chave_ocupacao, _ocupacao)
+    ocupados, totais = ocupacao[recurso_sel]
+
+    data_sel = st.session_state["data_sel"]
+    if varios_recursos and (data_sel.year, data_sel.month) == (int(ano), int(mes)):
+        linha_resumo.caption(" · ".join(
+            f"{nome_recurso(k)}: {occ.get(data_sel, 0)}/{tot.get(data_sel, 0)}" for k, (occ, tot) in ocupacao.items()
+        ))
+    t_grade = time.perf_counter()
+    dia_clicado = None
+
+    cols_head = st.columns(7)
+    for i, dsem in enumerate(DIAS_SEMANA):
+        cols_head[i].markdown(f"**{dsem}**")
+
+    for semana in cal:
+        cols = st.columns(7)
+        for i, dia in enumerate(semana):
+            if dia == 0:
+                cols[i].write("")
+                continue
+
+            dt = date(int(ano), int(mes), int(dia))
+            occ = ocupados.get(dt, 0)
+            tot = totais.get(dt, 0)
+
+            if tot == 0:
+                emoji = "⬜"
+                status_txt = "—"
+            else:
+                if occ == 0:
+                    emoji = "🟩"
+                elif occ < tot:
+                    emoji = "🟨"
                 else:
-                    if occ == 0:
-                        emoji = "🟩"
-                    elif occ < tot:
-                        emoji = "🟨"
-                    else:
-                        emoji = "🟥"
-                    status_txt = f"{occ}/{tot}"
+                    emoji = "🟥"
+                status_txt = f"{occ}/{tot}"
+
+                label = f"{dia} {emoji}\n{status_txt}"
+                key = f"dia_{ano}_{mes}_{dia}"
+
+                # Desabilita datas passadas
+                is_past = dt < hoje
 
-                    label = f"{dia} {emoji}\n{status_txt}"
-                    key = f"dia_{ano}_{mes}_{dia}"
+                if cols[i].button(label, key=key, disabled=is_past):
+                    dia_clicado = dt
 
-                    # Desabilita datas passadas
-                    is_past = dt < hoje
+    METRICAS.observar("calendario.grade", (time.perf_counter() - t_grade) * 1000)
+    if dia_clicado is not None:
+        st.session_state["data_sel"] = dia_clicado
+        st.rerun()
 
-                    if cols[i].button(label, key=key, disabled=is_past):
-                        st.session_state["data_sel"] = dt
-                        st.rerun()
 # =========================================================
 # TAB 2 — RESERVAR
 # =========================================================
-with tab_reservar:
+with tab_reservar, METRICAS.cronometro("aba.reservar"):
     data = st.date_input(
         "Escolha a data",
         st.session_state["data_sel"],
@@ -471,13 +516,9 @@ with tab_reservar:
 
     st.session_state["data_sel"] = data
 
-    df = carregar_reservas()
-
     st.subheader("Fazer reserva")
 
-    turnos = turnos_por_data(data)
-    reservas_dia = df[df["data"] == str(data)]
-    turnos_disponiveis = [t for t in turnos if t not in reservas_dia["turno"].values]
+    turnos_disponiveis = indice_snapshot.turnos_disponiveis(data, recurso_sel)
 
     if turnos_disponiveis:
         turno_escolhido = st.selectbox("Escolha o turno", turnos_disponiveis)
@@ -489,59 +530,139 @@ with tab_reservar:
             help="Ex.: 4 a 8 dígitos. Guarde esse PIN: sem ele não dá para cancelar (exceto o administrador).",
         )
 
+        # Reserva recorrente: todas as datas conferidas contra o índice de uma
+        # vez (interseção de conjuntos) e gravadas numa única transação.
+        repetir = st.checkbox("Repetir esta reserva (toda semana ou a cada 2 semanas)")
+        datas_serie = [data]
+        conflitos_serie = []
+        pular_ocupadas = False
+        if repetir:
+            col_freq, col_ate = st.columns(2)
+            with col_freq:
+                frequencia = st.radio("Frequência", ["Semanal", "Quinzenal"], horizontal=True)
+            with col_ate:
+                ate = st.date_input(
+                    "Repetir até",
+                    data + timedelta(weeks=8),
+                    min_value=data,
+                    max_value=data + timedelta(weeks=MAX_SEMANAS_SERIE),
+                )
+            datas_serie = expandir_recorrencia(data, ate, 1 if frequencia == "Semanal" else 2)
+            conflitos_serie = indice_snapshot.conflitos(
+                Reserva(f"previa-{i}", str(d), turno_escolhido, recurso=recurso_sel) for i, d in enumerate(datas_serie)
+            )
+            livres = len(datas_serie) - len(conflitos_serie)
+            st.caption(f"{len(datas_serie)} data(s) no total: {livres} livre(s), {len(conflitos_serie)} já ocupada(s).")
+            if conflitos_serie:
+                st.warning("Já reservadas: " + ", ".join(
+                    f"{date.fromisoformat(r.data).strftime('%d/%m')}" for r in conflitos_serie
+                ))
+                pular_ocupadas = st.checkbox("Reservar só as datas livres", value=True)
+
         if st.button("Reservar", type="primary"):
             if not nome_grupo.strip():
                 st.error("Digite o nome do grupo.")
             elif not pin.strip():
                 st.error("Crie um PIN para esta reserva.")
             else:
-                # recarrega na hora do clique
-                df_atual = carregar_reservas()
-                ja_existe = ((df_atual["data"] == str(data)) & (df_atual["turno"] == turno_escolhido)).any()
-
-                if ja_existe:
-                    st.warning("Esse turno já foi reservado por outra pessoa. Atualize a página e escolha outro.")
+                # um sal (e uma KDF) por reserva feita: a série inteira usa o mesmo hash
+                pin_hash = gerar_hash(pin.strip())
+                novas = [
+                    {
+                        "id": str(uuid.uuid4())[:8],
+                        "data": str(d),
+                        "turno": turno_escolhido,
+                        "grupo": nome_grupo.strip(),
+                        "pin_hash": pin_hash,
+                        "recurso": recurso_sel,
+                    }
+                    for d in datas_serie
+                ]
+
+                try:
+                    if len(novas) == 1:
+                        armazenamento().inserir(novas[0])
+                        ficaram_de_fora = []
+                    else:
+                        ficaram_de_fora = armazenamento().inserir_lote(novas, pular_ocupadas=pular_ocupadas)
+                except TurnoIndisponivel as e:
+                    if e.conflitos:
+                        st.warning(
+                            f"{len(e.conflitos)} data(s) da série já foram reservadas por outra pessoa; "
+                            "nada foi gravado. Revise as datas e tente de novo."
+                        )
+                    else:
+                        st.warning("Esse turno já foi reservado por outra pessoa. Atualize a página e escolha outro.")
+                except (ConflitoGitHub, GitHubIndisponivel):
+                    st.error("Muitas reservas ao mesmo tempo. Tente novamente em instantes.")
                 else:
-                    nova = pd.DataFrame(
-                        [
-                            {
-                                "id": str(uuid.uuid4())[:8],
-                                "data": str(data),
-                                "turno": turno_escolhido,
-                                "grupo": nome_grupo.strip(),
-                                "pin_hash": hash_pin(pin.strip()),
-                            }
-                        ]
-                    )
-
-                    df_novo = pd.concat([df_atual, nova], ignore_index=True)
-                    salvar_reservas(df_novo)
-
-                    st.success("Reserva realizada com sucesso! ✅")
+                    estado().alterado()
+                    st.success(f"{len(novas) - len(ficaram_de_fora)} reserva(s) realizada(s) com sucesso! ✅")
                     st.info("Guarde seu PIN: ele será necessário para cancelar.")
                     st.rerun()
     else:
         st.warning("Todos os turnos dessa data já estão reservados.")
 
+# =========================================================
+# Consulta paginada (Cancelar / Lista): filtros aplicados no índice
+# ordenado, resultado guardado por versão dos dados; cada rerun só monta
+# a página que aparece.
+# =========================================================
+POR_PAGINA_CANCELAR = 20
+POR_PAGINA_LISTA = 50
+
+def filtros_reservas(prefixo: str) -> tuple:
+    """Campos de busca (grupo, de, até) de uma aba."""
+    col_g, col_de, col_ate = st.columns(3)
+    with col_g:
+        grupo = st.text_input("Grupo (começa com)", key=f"{prefixo}_grupo")
+    with col_de:
+        # só de hoje em diante: as passadas já foram para o histórico (reservas-AAAA.csv)
+        de = st.date_input("De", hoje, min_value=hoje, format="DD/MM/YYYY", key=f"{prefixo}_de")
+    with col_ate:
+        ate = st.date_input("Até", None, min_value=hoje, format="DD/MM/YYYY", key=f"{prefixo}_ate")
+    return grupo.strip(), de, ate
+
+def consultar_reservas(grupo: str, de: date, ate: Optional[date]) -> list:
+    """Reservas filtradas, em ordem: calculadas uma vez por versão dos dados e filtros."""
+    chave = ("consulta", grupo.casefold(), de, ate)
+    return estado().memo(versao_dados, chave, lambda: indice_snapshot.consultar(de, ate, grupo))
+
+def paginar(reservas: list, por_pagina: int, chave: str) -> list:
+    """Fatia da página escolhida (o seletor de página só aparece com mais de uma)."""
+    n_paginas = max(1, -(-len(reservas) // por_pagina))
+    if st.session_state.get(chave, 1) > n_paginas:
+        st.session_state[chave] = n_paginas  # os filtros mudaram e a página antiga não existe mais
+    pagina = 1
+    if n_paginas > 1:
+        pagina = int(st.number_input(f"Página (de {n_paginas})", min_value=1, max_value=n_paginas, step=1, key=chave))
+    inicio = (pagina - 1) * por_pagina
+    st.caption(f"{len(reservas)} reserva(s) · mostrando {inicio + 1}–{min(inicio + por_pagina, len(reservas))}"
+               if reservas else "Nenhuma reserva.")
+    return reservas[inicio:inicio + por_pagina]
+
 # =========================================================
 # TAB 3 — CANCELAR
 # =========================================================
-with tab_cancelar:
+with tab_cancelar, METRICAS.cronometro("aba.cancelar"):
     st.subheader("Cancelar reserva")
 
-    df_cancel = carregar_reservas().copy()
-    df_cancel["data_dt"] = pd.to_datetime(df_cancel["data"], errors="coerce")
-    df_cancel = df_cancel[df_cancel["data_dt"] >= pd.to_datetime(date.today())].copy()
-    df_cancel = df_cancel.sort_values(by=["data_dt", "turno"])
+    grupo_cancel, de_cancel, ate_cancel = filtros_reservas("cancelar")
+    # de hoje em diante: não se cancela o que já passou
+    achadas_cancel = consultar_reservas(grupo_cancel, max(de_cancel, hoje), ate_cancel)
 
-    if df_cancel.empty:
-        st.info("Não há reservas futuras para cancelar.")
+    if not achadas_cancel:
+        st.info("Não há reservas futuras para cancelar." if not grupo_cancel and ate_cancel is None
+                else "Nenhuma reserva futura com esses filtros.")
     else:
-        df_cancel["label"] = df_cancel.apply(
-            lambda r: f'{r["data"]} | {r["turno"]} | {r["grupo"]} | id={r["id"]}',
-            axis=1,
-        )
-        escolha = st.selectbox("Selecione a reserva", df_cancel["label"].tolist())
+        pagina_cancel = {r.id: r for r in paginar(achadas_cancel, POR_PAGINA_CANCELAR, "cancelar_pagina")}
+
+        def _rotulo(id_reserva: str) -> str:
+            r = pagina_cancel[id_reserva]
+            return (f"{nome_recurso(r.recurso)} | " if varios_recursos else "") + f"{r.data} | {r.turno} | {r.grupo}"
+
+        # as opções são os ids (só os da página); o rótulo é só para mostrar
+        id_escolhido = st.selectbox("Selecione a reserva", list(pagina_cancel), format_func=_rotulo)
 
         pin_cancel = st.text_input(
             "Digite o PIN para cancelar (PIN da reserva ou PIN do administrador)",
@@ -552,58 +673,183 @@ with tab_cancelar:
             if not pin_cancel.strip():
                 st.error("Digite um PIN.")
             else:
-                id_escolhido = escolha.split("id=")[-1].strip()
-
-                df_atual = carregar_reservas()
-                linha = df_atual[df_atual["id"] == id_escolhido]
-
-                if linha.empty:
+                pin_digitado = pin_cancel.strip()
+                verificador = verificador_pin()
+                autorizada = {}
+
+                def _autorizar(linha: dict) -> bool:
+                    # a transação pode reconferir a cada tentativa: a partir da
+                    # segunda, o acerto sai do cache do verificador, sem a KDF
+                    ok = verificador.verificar(id_escolhido, pin_digitado, linha["pin_hash"], admin_pin())
+                    autorizada["pin_hash"] = linha["pin_hash"]
+                    return ok
+
+                try:
+                    # confere antes no snapshot: um PIN errado não trava o arquivo/banco
+                    # enquanto a KDF calcula, nem vai ao GitHub
+                    no_snapshot = indice_snapshot.buscar(id_escolhido)
+                    if no_snapshot is not None and not _autorizar(no_snapshot.para_dict()):
+                        raise PinIncorreto()
+                    armazenamento().remover(id_escolhido, _autorizar)
+                except ReservaNaoEncontrada:
                     st.warning("Essa reserva não foi encontrada (talvez alguém já cancelou). Atualize a página.")
+                except PinIncorreto:
+                    st.error("PIN incorreto. Só cancela com o PIN da reserva ou com o PIN do administrador.")
+                except MuitasTentativas as e:
+                    st.error(f"Muitas tentativas com PIN errado. Tente de novo em {e.espera:.0f} s.")
+                except (ConflitoGitHub, GitHubIndisponivel):
+                    st.error("Muitas alterações ao mesmo tempo. Tente novamente em instantes.")
                 else:
-                    pin_ok = hash_pin(pin_cancel.strip()) == linha.iloc[0]["pin_hash"]
-                    admin_ok = admin_pin_ok(pin_cancel.strip())
-
-                    if pin_ok or admin_ok:
-                        df_novo = df_atual[df_atual["id"] != id_escolhido].copy()
-                        salvar_reservas(df_novo)
-                        st.success("Reserva cancelada ✅")
-                        st.rerun()
-                    else:
-                        st.error("PIN incorreto. Só cancela com o PIN da reserva ou com o PIN do administrador.")
+                    # hash antigo (sha256 sem sal): as outras reservas com o mesmo PIN
+                    # (ex.: o resto da série) passam para o formato novo
+                    antigo = autorizada["pin_hash"]
+                    if precisa_migrar(antigo) and not admin_pin_ok(pin_digitado) \
+                            and any(r.pin_hash == antigo and r.id != id_escolhido
+                                    for r in indice_snapshot.por_id.values()):
+                        try:
+                            armazenamento().trocar_pin_hash(antigo, gerar_hash(pin_digitado))
+                        except (ConflitoGitHub, GitHubIndisponivel):
+                            pass  # fica para o próximo cancelamento
+                    estado().alterado()
+                    st.success("Reserva cancelada ✅")
+                    st.rerun()
 
 # =========================================================
 # TAB 4 — LISTA
 # =========================================================
-with tab_lista:
+with tab_lista, METRICAS.cronometro("aba.lista"):
     st.subheader("Reservas REALIZADAS")
 
-    df_view = carregar_reservas().copy()
-    df_view["data_dt"] = pd.to_datetime(df_view["data"], errors="coerce")
-
-    reservas_futuras = df_view[df_view["data_dt"] >= pd.to_datetime(date.today())].copy()
-    reservas_futuras = reservas_futuras.sort_values(by=["data_dt", "turno"])
+    grupo_lista, de_lista, ate_lista = filtros_reservas("lista")
+    achadas_lista = consultar_reservas(grupo_lista, de_lista, ate_lista)
 
-    if reservas_futuras.empty:
-        st.info("Ainda não há reservas futuras.")
+    if not achadas_lista:
+        st.info("Ainda não há reservas futuras." if not grupo_lista and de_lista == hoje and ate_lista is None
+                else "Nenhuma reserva com esses filtros.")
     else:
+        colunas_lista = ["data", "turno", "grupo", "id"]
+        if varios_recursos:
+            colunas_lista = ["recurso"] + colunas_lista
+        # único DataFrame da tela: só a página, só as colunas mostradas
+        tabela = para_dataframe(paginar(achadas_lista, POR_PAGINA_LISTA, "lista_pagina"), colunas_lista)
+        if varios_recursos:
+            tabela["recurso"] = tabela["recurso"].map(nome_recurso)
         st.dataframe(
-            reservas_futuras[["data", "turno", "grupo", "id"]],
+            tabela,
             use_container_width=True,
             hide_index=True,
         )
 
+        st.markdown("**Exportar** estas reservas (todas as páginas, sem os PINs)")
+        est_exp = estado()
+        for col, (formato, rotulo) in zip(st.columns(3), [("ics", "📆 Agenda (.ics)"), ("csv", "CSV"), ("json", "JSON")]):
+            extensao, mime = FORMATOS[formato]
+            # gerado só no clique, a partir dos registros filtrados; o mesmo pedido
+            # na mesma versão dos dados sai do memo (para todas as sessões)
+            chave_exp = ("exportar", formato, grupo_lista.casefold(), de_lista, ate_lista)
 
+            def _arquivo(chave=chave_exp, formato=formato, reservas=achadas_lista, versao=versao_dados) -> bytes:
+                with METRICAS.cronometro("exportar"):
+                    return est_exp.memo(versao, chave, lambda: exportar(formato, reservas, nome_recurso))
 
+            with col:
+                st.download_button(rotulo, data=_arquivo, file_name=f"reservas.{extensao}", mime=mime,
+                                   key=f"exp_{formato}", on_click="ignore", use_container_width=True)
 
+# =========================================================
+# TAB 5 — HORÁRIOS LIVRES (busca em vários meses de uma vez)
+# =========================================================
+with tab_livres, METRICAS.cronometro("aba.livres"):
+    st.subheader("Procurar horários livres")
+
+    rec_sel = RECURSOS.get(recurso_sel)
+    turnos_rec = list(dict.fromkeys(rec_sel.turnos_semana + rec_sel.turnos_fim_de_semana)) if rec_sel else []
+    col_d, col_t = st.columns(2)
+    with col_d:
+        dias_busca = st.multiselect("Dias da semana", list(range(7)), default=[5],
+                                    format_func=DIAS_SEMANA.__getitem__, key="livres_dias")
+    with col_t:
+        turnos_busca = st.multiselect("Turnos", turnos_rec, default=turnos_rec, key="livres_turnos")
+    col_i, col_m, col_n = st.columns(3)
+    with col_i:
+        busca_de = st.date_input("A partir de", hoje, min_value=hoje, format="DD/MM/YYYY", key="livres_de")
+    with col_m:
+        busca_meses = st.number_input("Nos próximos meses", min_value=1, max_value=12, value=3, key="livres_meses")
+    with col_n:
+        busca_qtd = st.number_input("Quantos horários", min_value=1, max_value=100, value=10, key="livres_qtd")
+
+    # olha um inteiro por dia no mapa de bits do índice: não relê nem varre as reservas
+    with METRICAS.cronometro("livres.busca"):
+        achados = indice_snapshot.livres(
+            busca_de,
+            recurso_sel,
+            ate=busca_de + timedelta(days=31 * int(busca_meses)),
+            dias_semana=dias_busca,
+            turnos=turnos_busca,
+            limite=int(busca_qtd),
+        )
 
+    if not dias_busca or not turnos_busca:
+        st.info("Escolha pelo menos um dia da semana e um turno.")
+    elif not achados:
+        st.info("Nenhum horário livre com esses filtros.")
+    else:
+        st.dataframe(
+            [{"data": d.strftime("%d/%m/%Y"), "dia": DIAS_SEMANA[d.weekday()], "turno": t} for d, t in achados],
+            use_container_width=True,
+            hide_index=True,
+        )
+        datas_achadas = list(dict.fromkeys(d for d, _t in achados))
+        col_e, col_b = st.columns([2, 1])
+        with col_e:
+            data_escolhida = st.selectbox("Reservar a data", datas_achadas, key="livres_escolha",
+                                          format_func=lambda d: f"{DIAS_SEMANA[d.weekday()]} {d.strftime('%d/%m/%Y')}")
+        with col_b:
+            if st.button("Usar esta data", key="livres_usar"):
+                st.session_state["data_sel"] = data_escolhida
+                st.rerun()
+        st.caption("A data escolhida já aparece na aba Reservar.")
 
 
-
-
-
-
-
-
-
-
-
+# =========================================================
+# ADMIN — desempenho (só com o PIN do administrador)
+# =========================================================
+with st.expander("🔧 Administração: desempenho"):
+    st.text_input("PIN do administrador", type="password", key="pin_metricas", on_change=_conferir_pin_metricas)
+    if st.session_state.get("metricas_erro"):
+        st.error(st.session_state["metricas_erro"])
+    elif st.session_state.get("metricas_liberadas"):
+        metricas = METRICAS.instantaneo()
+        st.caption(f"Acumulado desde {metricas['desde']} (todas as sessões deste servidor).")
+
+        st.markdown("**Tempos (ms)**")
+        st.dataframe(
+            [{"medida": k, **{c: v for c, v in h.items() if c != "baldes"}} for k, h in metricas["tempos"].items()],
+            use_container_width=True,
+            hide_index=True,
+        )
+        col_c, col_v = st.columns(2)
+        with col_c:
+            st.markdown("**Contadores**")
+            st.json(metricas["contadores"])
+        with col_v:
+            st.markdown("**GitHub / outros**")
+            st.json(metricas["valores"])
+
+        from fila_gravacao import FilaGravacao
+
+        arm = armazenamento()
+        if isinstance(arm, FilaGravacao):
+            st.caption(f"Gravação em lote: {arm.pendentes()} operação(ões) pendente(s), {len(arm.falhas)} descartada(s).")
+            if arm.falhas:
+                st.json(list(arm.falhas))
+
+        st.download_button(
+            "Baixar métricas (JSON)",
+            METRICAS.para_json(),
+            file_name="metricas.json",
+            mime="application/json",
+        )
+        if st.button("Zerar métricas"):
+            METRICAS.zerar()
+            st.rerun()
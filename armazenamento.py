@@ -0,0 +1,1389 @@
+"""
+Armazenamento das reservas.
+
+Todos os backends têm a mesma interface (Armazenamento):
+carregar / salvar / transacao / inserir / remover / trocar_pin_hash.
+
+- ArmazenamentoCSV: arquivo local (PC), protegido por portalocker.
+- ArmazenamentoGitHub: reservas.csv num repositório (Contents API), com cache ETag.
+- ArmazenamentoGitHubMensal: um CSV por mês num diretório do repositório, pela
+  Git Data API (blobs crus, árvore + commit + ref sem force): cada gravação só
+  envia os meses que mudaram.
+- ArmazenamentoLog: log local só de acréscimos (JSON Lines de inserir/cancelar),
+  com snapshot periódico e exportação para o reservas.csv de sempre.
+- ArmazenamentoSQLite: banco local em modo WAL, com índice único em (data, turno):
+  reservar/cancelar é um INSERT/DELETE de uma linha, não reescreve tudo.
+
+As dependências de cada backend (requests para o GitHub, portalocker para os
+arquivos locais) só são importadas quando esse backend é usado.
+
+As reservas passadas saem do arquivo "vivo" para um histórico por ano
+(reservas-2025.csv, ...), lido só quando alguma tela precisa (arquivar /
+carregar_historico).
+"""
+import os
+import csv
+import json
+import base64
+import hashlib
+import random
+import sqlite3
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from io import StringIO
+from datetime import date
+from typing import TYPE_CHECKING, Callable, Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import pandas as pd
+
+from agenda import RECURSO_PADRAO, norm_data
+from erros import (  # noqa: F401 (reexportados: from armazenamento import TurnoIndisponivel)
+    ConflitoGitHub,
+    GitHubIndisponivel,
+    LogCorrompido,
+    PinIncorreto,
+    ReservaNaoEncontrada,
+    TurnoIndisponivel,
+)
+from indice import IndiceReservas, Reserva
+from metricas import METRICAS
+
+if TYPE_CHECKING:
+    import requests
+
+# "recurso" veio depois: arquivos sem a coluna são todos da sala (RECURSO_PADRAO)
+COLUNAS = ["id", "data", "turno", "grupo", "pin_hash", "recurso"]
+
+log = logging.getLogger(__name__)
+
+
+# =========================================================
+# Funções auxiliares
+# =========================================================
+def _portalocker():
+    """portalocker só é carregado nos modos locais que travam arquivo (CSV/log)."""
+    import portalocker
+    return portalocker
+
+def _garantir_colunas(df: pd.DataFrame) -> pd.DataFrame:
+    if list(df.columns) == COLUNAS:
+        return df
+    for c in COLUNAS:
+        if c not in df.columns:
+            df[c] = RECURSO_PADRAO if c == "recurso" else ""
+    return df[COLUNAS]
+
+def _ler_csv(linhas: Iterable[str]) -> pd.DataFrame:
+    """
+    reservas.csv (arquivo aberto ou linhas) -> DataFrame de textos, lido com o
+    módulo csv: até ~10 mil linhas empata ou ganha do pd.read_csv, que custa
+    mais em preparação do que em leitura. Arquivo vazio = sem reservas.
+    """
+    leitor = csv.reader(linhas)
+    cabecalho = next(leitor, None)
+    if not cabecalho:
+        return pd.DataFrame(columns=COLUNAS)
+    return _garantir_colunas(pd.DataFrame([linha for linha in leitor if linha], columns=cabecalho))
+
+def _csv_para_df(content: str) -> pd.DataFrame:
+    return _ler_csv(StringIO(content))
+
+def _marca_arquivo(caminho: str) -> str:
+    """mtime+tamanho do arquivo (vazio se não existe): muda a cada gravação."""
+    try:
+        st_ = os.stat(caminho)
+    except FileNotFoundError:
+        return ""
+    return f"{st_.st_mtime_ns}:{st_.st_size}"
+
+
+def caminho_historico(caminho: str, ano: int) -> str:
+    """reservas.csv -> reservas-2025.csv (arquivo morto de um ano)."""
+    base, ext = os.path.splitext(caminho)
+    return f"{base}-{ano}{ext}"
+
+def separar_passadas(df: pd.DataFrame, hoje: date) -> Dict[int, pd.DataFrame]:
+    """Reservas com data anterior a hoje, agrupadas por ano ({} se não houver)."""
+    datas = df["data"].fillna("").str[:10]
+    passadas = datas.str.match(r"\d{4}-\d{2}-\d{2}$") & (datas < norm_data(hoje))
+    if not passadas.any():
+        return {}
+    antigas = df[passadas]
+    return {int(ano): g for ano, g in antigas.groupby(antigas["data"].str[:4])}
+
+def substituir_pin_hash(df: pd.DataFrame, antigo: str, novo: str) -> pd.DataFrame:
+    """Cópia de df com pin_hash antigo -> novo; o próprio df se nenhuma linha tem o antigo."""
+    alvo = df["pin_hash"] == antigo
+    if not alvo.any():
+        return df
+    df = df.copy()
+    df.loc[alvo, "pin_hash"] = novo
+    return df
+
+def _mesclar(df_antigo: pd.DataFrame, df_novo: pd.DataFrame) -> pd.DataFrame:
+    """Junta reservas sem repetir id (arquivar de novo não duplica nada)."""
+    return pd.concat([df_antigo, df_novo], ignore_index=True).drop_duplicates("id", keep="last")
+
+
+# =========================================================
+# Interface
+# =========================================================
+class Armazenamento:
+    """
+    Interface comum dos backends.
+    inserir/remover têm uma versão genérica (via transacao, sobre o DataFrame
+    inteiro); backends que sabem fazer melhor (SQLite) sobrescrevem.
+    """
+
+    def __init__(self):
+        self._indice_lock = threading.Lock()
+        self._indice: Optional[IndiceReservas] = None
+        self._indice_df: Optional[pd.DataFrame] = None
+
+    def carregar(self, fresco: bool = False) -> pd.DataFrame:
+        """DataFrame com COLUNAS. Pode ser compartilhado: NÃO alterar in-place."""
+        raise NotImplementedError
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        """Substitui todas as reservas por df."""
+        raise NotImplementedError
+
+    def transacao(self, mutacao: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """Lê, aplica mutacao(df_atual) -> df_novo e grava de forma atômica."""
+        raise NotImplementedError
+
+    def versao(self) -> Optional[str]:
+        """
+        Marca barata da versão atual dos dados: muda quando alguém grava.
+        None = o backend não sabe dizer sem carregar tudo.
+        """
+        return None
+
+    # -------------------------
+    # Histórico (arquivo morto por ano)
+    # O arquivo "vivo" só guarda de hoje em diante; o passado vai para um
+    # arquivo por ano, lido só quando alguma tela precisa dele.
+    # -------------------------
+    def carregar_historico(self, ano: int) -> pd.DataFrame:
+        """Reservas já passadas do ano (vazio se não houver)."""
+        return pd.DataFrame(columns=COLUNAS)
+
+    def _gravar_historico(self, ano: int, linhas: pd.DataFrame) -> None:
+        raise NotImplementedError
+
+    def arquivar(self, hoje: date) -> int:
+        """
+        Move as reservas anteriores a hoje para o histórico do ano.
+        Primeiro grava o histórico (mesclando por id), depois tira do arquivo
+        vivo só os ids arquivados: se cair no meio, rodar de novo não duplica.
+        Retorna quantas reservas foram movidas.
+        """
+        por_ano = separar_passadas(self.carregar(fresco=True), hoje)
+        if not por_ano:
+            return 0
+        ids = set()
+        for ano, linhas in por_ano.items():
+            self._gravar_historico(ano, linhas)
+            ids.update(linhas["id"])
+        self.transacao(lambda df_atual: df_atual[~df_atual["id"].isin(ids)])
+        return len(ids)
+
+    # -------------------------
+    # Índice (um por snapshot carregado)
+    # -------------------------
+    def indice(self, df: pd.DataFrame) -> IndiceReservas:
+        """
+        Índice (data, turno)/id do snapshot df. Só é reconstruído quando o
+        DataFrame carregado muda; NÃO alterar o índice devolvido.
+        """
+        with self._indice_lock:
+            if self._indice is None or self._indice_df is not df:
+                self._indice = IndiceReservas.de_df(df)
+                self._indice_df = df
+            return self._indice
+
+    def _indice_avancar(self, df_antigo: pd.DataFrame, df_novo: pd.DataFrame,
+                        atualizar: Callable[[IndiceReservas], None]) -> None:
+        """
+        Depois de gravar: se o índice era o de df_antigo, aplica só a mudança
+        (numa cópia, quem já tem o índice antigo não o vê mudar) e passa a
+        valer para df_novo, sem reconstruir tudo.
+        """
+        with self._indice_lock:
+            if self._indice is not None and self._indice_df is df_antigo:
+                novo = self._indice.copia()
+                atualizar(novo)
+                self._indice, self._indice_df = novo, df_novo
+
+    # -------------------------
+    # Reservar / cancelar
+    # -------------------------
+    def inserir(self, reserva: dict) -> None:
+        """Grava uma reserva nova. TurnoIndisponivel se (recurso, data, turno) já está ocupado."""
+        nova = Reserva.de_dict(reserva)
+        lido = {}
+
+        def _inserir(df_atual: pd.DataFrame) -> pd.DataFrame:
+            # refeito a cada tentativa, sobre os dados mais novos
+            lido["df"] = df_atual
+            ocupante = self.indice(df_atual).ocupante(nova)
+            if ocupante is not None and ocupante.id == nova.id:
+                # é a nossa: uma tentativa anterior gravou e só a resposta se perdeu
+                return df_atual
+            if ocupante is not None:
+                raise TurnoIndisponivel()
+            return pd.concat([df_atual, pd.DataFrame([nova.para_dict()], columns=COLUNAS)], ignore_index=True)
+
+        df_novo = self.transacao(_inserir)
+        self._indice_avancar(lido["df"], df_novo, lambda ind: ind.adicionar(nova))
+
+    def inserir_lote(self, reservas: List[dict], pular_ocupadas: bool = False) -> List[Reserva]:
+        """
+        Grava várias reservas (ex.: uma série semanal) numa única transação.
+        Os conflitos saem de uma interseção com o índice. Com algum conflito:
+        TurnoIndisponivel(conflitos) e nada é gravado — ou, com
+        pular_ocupadas, grava só as livres. Retorna as que ficaram de fora.
+        """
+        novas = [Reserva.de_dict(r) for r in reservas]
+        lido, resultado = {}, {}
+
+        def _inserir(df_atual: pd.DataFrame) -> pd.DataFrame:
+            lido["df"] = df_atual
+            indice = self.indice(df_atual)
+            conflitos = indice.conflitos(novas)
+            if conflitos and not pular_ocupadas:
+                raise TurnoIndisponivel(conflitos)
+            fora = {id(r) for r in conflitos}
+            # as que já estão lá com o mesmo id (tentativa anterior) não entram de novo
+            gravar = [r for r in novas if id(r) not in fora and r.id not in indice.por_id]
+            resultado["conflitos"], resultado["gravadas"] = conflitos, gravar
+            if not gravar:
+                return df_atual
+            return pd.concat([df_atual, pd.DataFrame([r.para_dict() for r in gravar], columns=COLUNAS)],
+                             ignore_index=True)
+
+        df_novo = self.transacao(_inserir)
+
+        def _adicionar(ind: IndiceReservas) -> None:
+            for r in resultado["gravadas"]:
+                ind.adicionar(r)
+
+        self._indice_avancar(lido["df"], df_novo, _adicionar)
+        return resultado["conflitos"]
+
+    def remover(self, id_reserva: str, autorizar: Callable[[dict], bool]) -> None:
+        """
+        Remove a reserva id_reserva se autorizar(linha) for verdadeiro.
+        ReservaNaoEncontrada / PinIncorreto caso contrário.
+        """
+        lido = {}
+
+        def _remover(df_atual: pd.DataFrame) -> pd.DataFrame:
+            lido["df"] = df_atual
+            reserva = self.indice(df_atual).buscar(id_reserva)
+            if reserva is None and lido.get("autorizada"):
+                # uma tentativa anterior já removeu e só a resposta se perdeu
+                return df_atual
+            if reserva is None:
+                raise ReservaNaoEncontrada()
+            if not autorizar(reserva.para_dict()):
+                raise PinIncorreto()
+            lido["autorizada"] = True
+            return df_atual[df_atual["id"] != id_reserva]
+
+        df_novo = self.transacao(_remover)
+        self._indice_avancar(lido["df"], df_novo, lambda ind: ind.remover(id_reserva))
+
+    def trocar_pin_hash(self, antigo: str, novo: str) -> int:
+        """
+        Troca o pin_hash antigo por novo em todas as reservas que o usam (migração
+        dos hashes sem sal, ver senhas.py). Retorna quantas mudaram.
+        """
+        trocadas = {}
+
+        def _trocar(df_atual: pd.DataFrame) -> pd.DataFrame:
+            df_novo = substituir_pin_hash(df_atual, antigo, novo)
+            trocadas["n"] = 0 if df_novo is df_atual else int((df_atual["pin_hash"] == antigo).sum())
+            return df_novo
+
+        self.transacao(_trocar)
+        return trocadas.get("n", 0)
+
+
+# =========================================================
+# CSV local (PC)
+# =========================================================
+class ArmazenamentoCSV(Armazenamento):
+    def __init__(self, arquivo: str = "reservas.csv"):
+        super().__init__()
+        self.arquivo = arquivo
+
+    def carregar(self, fresco: bool = False) -> pd.DataFrame:
+        if not os.path.exists(self.arquivo):
+            df0 = pd.DataFrame(columns=COLUNAS)
+            with _portalocker().Lock(self.arquivo, "w", timeout=5) as f:
+                df0.to_csv(f, index=False)
+            return df0
+
+        with _portalocker().Lock(self.arquivo, "r", timeout=5) as f:
+            # arquivo vazio = sem reservas; qualquer outro erro sobe (não fingir que está vazio)
+            return _ler_csv(f)
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        with _portalocker().Lock(self.arquivo, "w", timeout=5) as f:
+            df.to_csv(f, index=False)
+
+    def versao(self) -> Optional[str]:
+        return _marca_arquivo(self.arquivo)
+
+    def transacao(self, mutacao: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """Leitura + mutação + gravação sob o mesmo lock do arquivo."""
+        if not os.path.exists(self.arquivo):
+            self.carregar()  # cria o arquivo vazio
+        with _portalocker().Lock(self.arquivo, "r+", timeout=5) as f:
+            df_atual = _ler_csv(f)
+            df_novo = mutacao(df_atual)
+            if df_novo is df_atual:
+                return df_atual
+            f.seek(0)
+            f.truncate()
+            df_novo.to_csv(f, index=False)
+        return df_novo
+
+    def carregar_historico(self, ano: int) -> pd.DataFrame:
+        arquivo = caminho_historico(self.arquivo, ano)
+        if not os.path.exists(arquivo):
+            return pd.DataFrame(columns=COLUNAS)
+        return ArmazenamentoCSV(arquivo).carregar()
+
+    def _gravar_historico(self, ano: int, linhas: pd.DataFrame) -> None:
+        ArmazenamentoCSV(caminho_historico(self.arquivo, ano)).transacao(lambda df: _mesclar(df, linhas))
+
+
+# =========================================================
+# GitHub (Contents API)
+# =========================================================
+class ArmazenamentoGitHub(Armazenamento):
+    """
+    reservas.csv num repositório do GitHub.
+
+    Guarda um cache do arquivo (DataFrame já parseado + sha + ETag) para ser
+    compartilhado por todas as sessões (a instância fica em st.cache_resource).
+    Dentro do TTL não faz nenhuma requisição; depois revalida com
+    If-None-Match: um 304 devolve o DataFrame do cache, sem baixar nem
+    reprocessar o CSV (e não conta no rate limit do GitHub).
+    """
+
+    CACHE_TTL = 5  # segundos
+    HISTORICO_TTL = 600  # o histórico quase nunca muda
+    TENTATIVAS = 5
+
+    def __init__(self, token: str, repo: str, branch: str, path: str,
+                 avisar: Callable[[str], None] = log.warning,
+                 api_url: str = "https://api.github.com"):
+        from github_http import SessaoGitHub  # requests só no modo GitHub
+
+        super().__init__()
+        self.api_url = api_url.rstrip("/")
+        self.http = SessaoGitHub(token)
+        self.repo = repo
+        self.branch = branch
+        self.path = path
+        self.avisar = avisar
+        self._lock = threading.Lock()
+        self._df: Optional[pd.DataFrame] = None
+        self._sha: Optional[str] = None
+        self._etag: Optional[str] = None
+        self._lido_em = 0.0
+        self._historico: Dict[int, Tuple[pd.DataFrame, float]] = {}
+
+    def _url(self, path: Optional[str] = None) -> str:
+        return f"{self.api_url}/repos/{self.repo}/contents/{path or self.path}"
+
+    def _get(self, url: str, headers: Optional[dict] = None) -> "requests.Response":
+        with METRICAS.cronometro("github.get"):
+            r = self.http.get(url, params={"ref": self.branch}, headers=headers)
+        self._registrar_resposta(r, "github.get")
+        return r
+
+    @staticmethod
+    def _registrar_resposta(r: "requests.Response", nome: str) -> None:
+        METRICAS.contar(f"{nome}.http_{r.status_code}")
+        METRICAS.contar("github.bytes_recebidos", len(r.content or b""))
+        restante = r.headers.get("X-RateLimit-Remaining")
+        if restante is not None:
+            METRICAS.valor("github.rate_limit_restante", int(restante))
+            METRICAS.valor("github.rate_limit_reset", r.headers.get("X-RateLimit-Reset"))
+
+    def _baixar(self, path: str) -> Tuple[str, Optional[str]]:
+        """(content_str, sha) de um arquivo qualquer do repo, sem cache. ("", None) se não existir."""
+        r = self._get(self._url(path))
+        if r.status_code == 404:
+            return "", None
+        r.raise_for_status()
+        data = r.json()
+        return self._conteudo(data), data.get("sha")
+
+    def _blob_bruto(self, sha: str) -> str:
+        """Blob pela Git Data API, cru (sem base64 e sem o limite de 1 MB da Contents API)."""
+        with METRICAS.cronometro("github.get"):
+            r = self.http.get(f"{self.api_url}/repos/{self.repo}/git/blobs/{sha}",
+                              headers={"Accept": "application/vnd.github.raw"})
+        self._registrar_resposta(r, "github.get")
+        r.raise_for_status()
+        return r.content.decode("utf-8")
+
+    def _conteudo(self, data: dict) -> str:
+        """
+        Texto de uma resposta da Contents API. Acima de 1 MB o GitHub manda
+        "content" vazio (encoding "none"): aí o blob é baixado cru pelo sha —
+        antes isso virava um calendário vazio.
+        """
+        content_b64 = (data.get("content") or "").replace("\n", "")
+        if content_b64:
+            return base64.b64decode(content_b64).decode("utf-8")
+        if data.get("size") and data.get("sha"):
+            METRICAS.contar("github.blob_grande")
+            return self._blob_bruto(data["sha"])
+        return ""
+
+    # -------------------------
+    # Cache
+    # -------------------------
+    def _semear_cache(self, df: pd.DataFrame, sha: Optional[str]) -> pd.DataFrame:
+        """Coloca no cache o que acabou de ser gravado (sem reler do GitHub)."""
+        with self._lock:
+            self._df = _garantir_colunas(df)
+            self._sha = sha
+            self._etag = None
+            self._lido_em = time.monotonic()
+            return self._df
+
+    def invalidar_cache(self) -> None:
+        with self._lock:
+            self._df, self._sha, self._etag, self._lido_em = None, None, None, 0.0
+
+    # -------------------------
+    # Leitura / escrita
+    # -------------------------
+    def ler(self, fresco: bool = False) -> Tuple[pd.DataFrame, Optional[str]]:
+        """
+        Retorna (df, sha) passando pelo cache.
+        fresco=True ignora o TTL (mas ainda usa o ETag: se não mudou, vem 304).
+        Se der erro temporário (rede/rate limit/5xx, já retentado pela sessão),
+        devolve a última versão em cache; sem cache, GitHubIndisponivel.
+        """
+        with self._lock:
+            agora = time.monotonic()
+            if self._df is not None and not fresco and agora - self._lido_em < self.CACHE_TTL:
+                METRICAS.contar("github.cache_ttl")
+                return self._df, self._sha
+
+            headers = {}
+            if self._df is not None and self._etag:
+                headers["If-None-Match"] = self._etag
+
+            try:
+                r = self._get(self._url(), headers)
+                content = self._conteudo(r.json()) if r.status_code == 200 else ""
+            except Exception as e:
+                self.avisar(f"Falha temporária ao acessar o GitHub: {e}")
+                r = None
+
+            if r is not None and r.status_code == 304:
+                METRICAS.contar("github.cache_304")
+                self._lido_em = agora
+                return self._df, self._sha
+
+            if r is not None and r.status_code == 404:
+                self._df, self._sha, self._etag, self._lido_em = pd.DataFrame(columns=COLUNAS), None, None, agora
+                return self._df, None
+
+            if r is None or r.status_code >= 400:
+                if r is not None:
+                    self.avisar(f"GitHub temporariamente indisponível (HTTP {r.status_code}). Tente novamente em instantes.")
+                # melhor mostrar a última versão conhecida do que um calendário vazio
+                if self._df is not None:
+                    return self._df, self._sha
+                # sem cache: NÃO fingir que não há reservas (parece perda de dados)
+                raise GitHubIndisponivel("Não foi possível ler as reservas do GitHub agora. Tente novamente em instantes.")
+
+            with METRICAS.cronometro("github.parse_csv"):
+                self._df = _csv_para_df(content)
+            self._sha = r.json().get("sha")
+            self._etag = r.headers.get("ETag")
+            self._lido_em = agora
+            return self._df, self._sha
+
+    def gravar(self, content_str: str, sha_atual: Optional[str], path: Optional[str] = None) -> Optional[str]:
+        """
+        Salva content_str no GitHub (por padrão no mesmo path). Usa SHA para evitar sobrescrever mudanças.
+        Retorna o sha novo do arquivo (vem na própria resposta do PUT).
+        """
+        path = path or self.path
+        payload = {
+            "message": f"Atualiza {os.path.basename(path)}",
+            "content": base64.b64encode(content_str.encode("utf-8")).decode("utf-8"),
+            "branch": self.branch,
+        }
+        if sha_atual:
+            payload["sha"] = sha_atual
+
+        with METRICAS.cronometro("github.put"):
+            r = self.http.put(self._url(path), json=payload)
+        METRICAS.contar("github.bytes_enviados", len(payload["content"]))
+        self._registrar_resposta(r, "github.put")
+
+        # 409/422: conflito (alguém gravou antes) ou sha errado
+        if r.status_code in (409, 422):
+            raise ConflitoGitHub(f"CONFLITO_GITHUB:{r.status_code}:{r.text}")
+        # 5xx: pode ou não ter gravado; a transação relê e decide
+        if r.status_code >= 500:
+            raise GitHubIndisponivel(f"GitHub respondeu HTTP {r.status_code} ao gravar.")
+
+        r.raise_for_status()
+        return (r.json().get("content") or {}).get("sha")
+
+    # -------------------------
+    # Interface
+    # -------------------------
+    def carregar(self, fresco: bool = False) -> pd.DataFrame:
+        df, _sha = self.ler(fresco=fresco)
+        return df
+
+    def versao(self) -> Optional[str]:
+        """sha do arquivo, pelo cache: no máximo um GET condicional (304) por CACHE_TTL."""
+        return self.ler()[1] or ""
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        """
+        UMA requisição: o PUT usa o sha do cache (quem grava costuma ter acabado
+        de chamar carregar(fresco=True)) e a resposta do PUT já traz o sha novo,
+        que alimenta o cache de leitura — sem reler o arquivo.
+        """
+        _df_atual, sha = self.ler()
+        try:
+            novo_sha = self.gravar(df.to_csv(index=False), sha)
+        except ConflitoGitHub:
+            # o cache está velho, a próxima leitura vai ao GitHub
+            self.invalidar_cache()
+            raise
+        self._semear_cache(df, novo_sha)
+
+    def transacao(self, mutacao: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Compare-and-swap: grava com o MESMO sha que foi lido. Se o GitHub
+        recusar (409/422) ou falhar (5xx), relê e reaplica a mutação — que
+        refaz as verificações (turno livre, PIN...) sobre os dados novos — com
+        backoff curto e número limitado de tentativas. Se a mutação devolver
+        o próprio df_atual, não há o que gravar.
+        """
+        for tentativa in range(self.TENTATIVAS):
+            df_atual, sha = self.ler(fresco=True)
+            df_novo = mutacao(df_atual)
+            if df_novo is df_atual:
+                return df_atual  # nada a gravar
+            try:
+                novo_sha = self.gravar(df_novo.to_csv(index=False), sha)
+            except (ConflitoGitHub, GitHubIndisponivel):
+                self.invalidar_cache()
+                time.sleep(0.1 * (2 ** tentativa) + random.uniform(0, 0.1))
+                continue
+            return self._semear_cache(df_novo, novo_sha)
+        raise ConflitoGitHub("CONFLITO_GITHUB: muitas gravações ao mesmo tempo, tente novamente.")
+
+    def carregar_historico(self, ano: int) -> pd.DataFrame:
+        with self._lock:
+            df, lido_em = self._historico.get(ano, (None, 0.0))
+        if df is not None and time.monotonic() - lido_em < self.HISTORICO_TTL:
+            return df
+        try:
+            content, _sha = self._baixar(caminho_historico(self.path, ano))
+        except Exception as e:
+            self.avisar(f"Falha temporária ao ler o histórico de {ano}: {e}")
+            return df if df is not None else pd.DataFrame(columns=COLUNAS)
+        df = _csv_para_df(content)
+        with self._lock:
+            self._historico[ano] = (df, time.monotonic())
+        return df
+
+    def _gravar_historico(self, ano: int, linhas: pd.DataFrame) -> None:
+        path = caminho_historico(self.path, ano)
+        for tentativa in range(self.TENTATIVAS):
+            content, sha = self._baixar(path)
+            df = _mesclar(_csv_para_df(content), linhas)
+            try:
+                self.gravar(df.to_csv(index=False), sha, path=path)
+            except (ConflitoGitHub, GitHubIndisponivel):
+                time.sleep(0.1 * (2 ** tentativa) + random.uniform(0, 0.1))
+                continue
+            with self._lock:
+                self._historico[ano] = (df, time.monotonic())
+            return
+        raise ConflitoGitHub(f"CONFLITO_GITHUB: não foi possível gravar {path}.")
+
+
+# =========================================================
+# GitHub (Git Data API, um arquivo por mês)
+# =========================================================
+SEM_DATA = "sem-data"  # linhas sem data válida: um arquivo à parte, sempre carregado
+
+def _mes_corte() -> str:
+    """Primeiro mês carregado ("AAAA-MM" de hoje): os anteriores são histórico."""
+    return date.today().strftime("%Y-%m")
+
+def _sha_blob(texto: str) -> str:
+    """sha que o git dá a um blob com esse texto (para saber se um mês mudou sem perguntar)."""
+    dados = texto.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(dados) + dados).hexdigest()
+
+def _por_mes(df: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """{"AAAA-MM": linhas do mês} (SEM_DATA para datas inválidas), na ordem do df."""
+    meses = df["data"].fillna("").str[:7]
+    meses = meses.where(meses.str.match(r"\d{4}-\d{2}$"), SEM_DATA)
+    return {mes: g for mes, g in df.groupby(meses, sort=False)}
+
+
+class _CommitMensal(NamedTuple):
+    """O que foi lido de um commit: o snapshot e o que é preciso para gravar por cima dele."""
+    df: pd.DataFrame
+    sha: str  # commit
+    arvore: str  # árvore raiz do commit (base_tree da próxima gravação)
+    meses: Dict[str, str]  # "AAAA-MM" -> sha do blob, de todos os meses do diretório
+    legado: Optional[str]  # sha do reservas.csv antigo, enquanto não houver o diretório
+    anuais: Dict[int, str]  # ano -> sha do reservas-AAAA.csv (arquivo morto do layout antigo)
+    corte: str  # primeiro mês carregado (_mes_corte() quando o df foi montado)
+    blobs: Dict[str, pd.DataFrame]  # sha -> linhas, dos meses carregados (e do CSV antigo)
+
+
+class ArmazenamentoGitHubMensal(ArmazenamentoGitHub):
+    """
+    Reservas num diretório do repositório, um CSV por mês
+    (reservas.csv -> reservas/2026-03.csv), pela Git Data API.
+
+    Leitura: GET condicional da ref do branch (304 se ninguém gravou); se o
+    commit mudou, a árvore do diretório e só os blobs cujo sha mudou, crus
+    (sem base64 e sem o limite de 1 MB da Contents API). Uma reserva nova
+    faz baixar de novo só o mês dela.
+    Gravação: uma árvore nova (base_tree + o conteúdo dos meses alterados),
+    um commit e a ref movida sem force — se alguém gravou antes, não é
+    fast-forward, o GitHub recusa e a transação relê e refaz a mutação.
+
+    Meses anteriores ao atual não são carregados: são o histórico
+    (carregar_historico), e arquivar não tem nada a mover. Um reservas.csv
+    antigo (sem o diretório) é lido inteiro e, na primeira gravação,
+    repartido por mês e apagado no mesmo commit; os arquivos mortos por ano
+    do layout antigo (reservas-2025.csv) entram no histórico enquanto
+    existirem e, nessa mesma gravação, vão para os meses e são apagados.
+    """
+
+    BAIXAR_JUNTOS = 8  # blobs baixados em paralelo (o pool da SessaoGitHub tem 16 conexões)
+
+    def __init__(self, token: str, repo: str, branch: str, path: str,
+                 avisar: Callable[[str], None] = log.warning,
+                 api_url: str = "https://api.github.com"):
+        super().__init__(token, repo, branch, path, avisar=avisar, api_url=api_url)
+        self.diretorio = os.path.splitext(path)[0]
+        self._atual: Optional[_CommitMensal] = None
+        self._blobs_historico: Dict[str, pd.DataFrame] = {}
+
+    def _git(self, caminho: str) -> str:
+        return f"{self.api_url}/repos/{self.repo}/git/{caminho}"
+
+    def _git_get(self, caminho: str, headers: Optional[dict] = None) -> "requests.Response":
+        with METRICAS.cronometro("github.get"):
+            r = self.http.get(self._git(caminho), headers=headers)
+        self._registrar_resposta(r, "github.get")
+        return r
+
+    def _git_json(self, caminho: str) -> dict:
+        r = self._git_get(caminho)
+        r.raise_for_status()
+        return r.json()
+
+    def _git_enviar(self, metodo: str, caminho: str, corpo: dict) -> dict:
+        dados = json.dumps(corpo)
+        with METRICAS.cronometro(f"github.{metodo}"):
+            r = self.http.request(metodo.upper(), self._git(caminho), data=dados,
+                                  headers={"Content-Type": "application/json"})
+        METRICAS.contar("github.bytes_enviados", len(dados))
+        self._registrar_resposta(r, f"github.{metodo}")
+        # 422 na ref: não é fast-forward (alguém gravou antes)
+        if r.status_code in (409, 422):
+            raise ConflitoGitHub(f"CONFLITO_GITHUB:{r.status_code}:{r.text}")
+        if r.status_code >= 500:
+            raise GitHubIndisponivel(f"GitHub respondeu HTTP {r.status_code} ao gravar.")
+        r.raise_for_status()
+        return r.json()
+
+    def _blob(self, sha: str, cache: Dict[str, pd.DataFrame]) -> pd.DataFrame:
+        df = cache.get(sha)
+        if df is None:
+            METRICAS.contar("github.blobs_baixados")
+            df = _csv_para_df(self._blob_bruto(sha))
+        return df
+
+    # -------------------------
+    # Leitura
+    # -------------------------
+    def _listar(self, arvore: str) -> Tuple[Dict[str, str], Optional[str], Dict[int, str]]:
+        """
+        ({mês: sha do blob}, sha do CSV antigo se ainda não há diretório,
+        {ano: sha} dos arquivos mortos reservas-AAAA.csv do layout antigo) da árvore raiz.
+        """
+        *pastas, nome = self.diretorio.split("/")
+        entradas = self._git_json(f"trees/{arvore}")["tree"]
+        for pasta in pastas:
+            sub = next((e for e in entradas if e["path"] == pasta and e["type"] == "tree"), None)
+            if sub is None:
+                return {}, None, {}
+            entradas = self._git_json(f"trees/{sub['sha']}")["tree"]
+        por_nome = {e["path"]: e for e in entradas}
+        base, ext = os.path.splitext(os.path.basename(self.path))
+        anuais = {}
+        for e in entradas:
+            raiz, ext_e = os.path.splitext(e["path"])
+            ano = raiz[len(base) + 1:]
+            if e["type"] == "blob" and ext_e == ext and raiz == f"{base}-{ano}" and len(ano) == 4 and ano.isdigit():
+                anuais[int(ano)] = e["sha"]
+        pasta = por_nome.get(nome)
+        if pasta is None or pasta["type"] != "tree":
+            legado = por_nome.get(os.path.basename(self.path))
+            return {}, (legado["sha"] if legado is not None and legado["type"] == "blob" else None), anuais
+        meses = {}
+        for e in self._git_json(f"trees/{pasta['sha']}")["tree"]:
+            mes, ext = os.path.splitext(e["path"])
+            if e["type"] == "blob" and ext == ".csv":
+                meses[mes] = e["sha"]
+        return meses, None, anuais
+
+    def _baixar_blobs(self, shas: List[str]) -> Dict[str, pd.DataFrame]:
+        """{sha: linhas}; vários de uma vez em paralelo, pelo pool de conexões da sessão."""
+        METRICAS.contar("github.blobs_baixados", len(shas))
+        if len(shas) <= 1:
+            return {sha: _csv_para_df(self._blob_bruto(sha)) for sha in shas}
+        with ThreadPoolExecutor(max_workers=min(self.BAIXAR_JUNTOS, len(shas))) as executor:
+            return dict(zip(shas, executor.map(lambda sha: _csv_para_df(self._blob_bruto(sha)), shas)))
+
+    def _carregar_commit(self, sha: str, anterior: Optional[_CommitMensal]) -> _CommitMensal:
+        arvore = self._git_json(f"commits/{sha}")["tree"]["sha"]
+        meses, legado, anuais = self._listar(arvore)
+        return self._montar(sha, arvore, meses, legado, anuais, anterior.blobs if anterior is not None else {})
+
+    def _montar(self, sha: str, arvore: str, meses: Dict[str, str], legado: Optional[str],
+                anuais: Dict[int, str], cache: Dict[str, pd.DataFrame]) -> _CommitMensal:
+        """
+        O snapshot de um commit já listado, com o corte de agora: o CSV antigo
+        ou os meses a partir do corte. Só baixa os blobs que não estão em cache.
+        """
+        corte = _mes_corte()
+        shas = ([legado] if legado else []) + [meses[m] for m in sorted(meses) if m >= corte or m == SEM_DATA]
+        with METRICAS.cronometro("github.parse_csv"):
+            blobs = {s: cache[s] for s in shas if s in cache}
+            blobs.update(self._baixar_blobs([s for s in dict.fromkeys(shas) if s not in blobs]))
+            partes = [blobs[s] for s in shas]
+            df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS)
+        return _CommitMensal(df, sha, arvore, meses, legado, anuais, corte, blobs)
+
+    def _ler(self, fresco: bool = False) -> _CommitMensal:
+        """Como ArmazenamentoGitHub.ler, mas a marca é a ref do branch (e o que mudou é baixado por mês)."""
+        with self._lock:
+            agora = time.monotonic()
+            atual = self._atual
+            if atual is not None and atual.corte != _mes_corte():
+                # virou o mês com o commit em cache: o mês que passou sai do df
+                # (vira histórico) sem baixar nada — os meses que ficam já estão em blobs
+                atual = self._atual = self._montar(atual.sha, atual.arvore, atual.meses, atual.legado,
+                                                   atual.anuais, atual.blobs)
+            if atual is not None and not fresco and agora - self._lido_em < self.CACHE_TTL:
+                METRICAS.contar("github.cache_ttl")
+                return atual
+
+            headers = {}
+            if atual is not None and self._etag:
+                headers["If-None-Match"] = self._etag
+
+            try:
+                r = self._git_get(f"ref/heads/{self.branch}", headers)
+                if r.status_code == 200:
+                    sha = r.json()["object"]["sha"]
+                    if atual is None or sha != atual.sha:
+                        atual = self._carregar_commit(sha, atual)
+            except Exception as e:
+                self.avisar(f"Falha temporária ao acessar o GitHub: {e}")
+                r = None
+
+            if r is not None and r.status_code == 304:
+                METRICAS.contar("github.cache_304")
+            elif r is None or r.status_code >= 400:
+                if r is not None:
+                    self.avisar(f"GitHub temporariamente indisponível (HTTP {r.status_code}). Tente novamente em instantes.")
+                if self._atual is not None:
+                    return self._atual
+                raise GitHubIndisponivel("Não foi possível ler as reservas do GitHub agora. Tente novamente em instantes.")
+            else:
+                self._etag = r.headers.get("ETag")
+            self._atual, self._lido_em = atual, agora
+            return atual
+
+    def ler(self, fresco: bool = False) -> Tuple[pd.DataFrame, Optional[str]]:
+        """(df, marca de versao()): o sha do commit e o corte — virar o mês também muda o df."""
+        atual = self._ler(fresco)
+        return atual.df, f"{atual.sha}@{atual.corte}"
+
+    def invalidar_cache(self) -> None:
+        with self._lock:
+            self._atual, self._etag, self._lido_em = None, None, 0.0
+
+    # -------------------------
+    # Gravação
+    # -------------------------
+    def _meses_alterados(self, atual: _CommitMensal,
+                         df_novo: pd.DataFrame) -> Dict[str, Tuple[Optional[str], Optional[pd.DataFrame]]]:
+        """{mês: (csv novo, linhas)} só dos meses que mudaram; (None, None) = apagar o arquivo."""
+        grupos = _por_mes(df_novo)
+        carregados = {m for m in atual.meses if m >= atual.corte or m == SEM_DATA}
+        alterados = {}
+        for mes in sorted(carregados | set(grupos)):
+            linhas = grupos.get(mes)
+            if linhas is None:
+                alterados[mes] = (None, None)
+                continue
+            texto = linhas.to_csv(index=False)
+            if mes in atual.meses and mes not in carregados and _sha_blob(texto) != atual.meses[mes]:
+                # mês do histórico que não veio no df: junta com o que já está lá
+                linhas = _mesclar(self._blob(atual.meses[mes], self._blobs_historico), linhas)
+                texto = linhas.to_csv(index=False)
+            if atual.meses.get(mes) != _sha_blob(texto):
+                alterados[mes] = (texto, linhas)
+        return alterados
+
+    def _repartir_anuais(self, atual: _CommitMensal,
+                         alterados: Dict[str, Tuple[Optional[str], Optional[pd.DataFrame]]]) -> None:
+        """Junta as linhas dos reservas-AAAA.csv antigos aos meses delas (em alterados)."""
+        for ano in sorted(atual.anuais):
+            for mes, linhas in _por_mes(self._blob(atual.anuais[ano], self._blobs_historico)).items():
+                base = alterados.get(mes, (None, None))[1]
+                if base is None and mes in atual.meses:
+                    base = atual.blobs.get(atual.meses[mes])
+                    if base is None:
+                        base = self._blob(atual.meses[mes], self._blobs_historico)
+                linhas = linhas if base is None else _mesclar(linhas, base)
+                alterados[mes] = (linhas.to_csv(index=False), linhas)
+
+    def _commitar(self, atual: _CommitMensal, df_novo: pd.DataFrame) -> _CommitMensal:
+        alterados = self._meses_alterados(atual, df_novo)
+        meses, blobs = dict(atual.meses), dict(atual.blobs)
+        if not alterados and not atual.legado and not atual.anuais:
+            return atual._replace(df=df_novo)
+        mensagem = "Atualiza reservas (" + ", ".join(sorted(alterados)) + ")" if alterados else "Reparte reservas por mês"
+        self._repartir_anuais(atual, alterados)
+
+        entradas = []
+        for mes, (texto, linhas) in alterados.items():
+            entrada = {"path": f"{self.diretorio}/{mes}.csv", "mode": "100644", "type": "blob"}
+            if texto is None:
+                entrada["sha"] = None  # apaga
+                blobs.pop(meses.pop(mes), None)
+            else:
+                entrada["content"] = texto  # o GitHub cria o blob junto com a árvore
+                blobs.pop(meses.get(mes), None)
+                meses[mes] = _sha_blob(texto)
+                blobs[meses[mes]] = linhas
+            entradas.append(entrada)
+        if atual.legado:
+            entradas.append({"path": self.path, "mode": "100644", "type": "blob", "sha": None})
+        for ano in atual.anuais:
+            entradas.append({"path": caminho_historico(self.path, ano), "mode": "100644", "type": "blob", "sha": None})
+
+        with METRICAS.cronometro("github.commit"):
+            arvore = self._git_enviar("post", "trees", {"base_tree": atual.arvore, "tree": entradas})["sha"]
+            commit = self._git_enviar("post", "commits",
+                                      {"message": mensagem, "tree": arvore, "parents": [atual.sha]})["sha"]
+            # sem force: só avança se a ref ainda for o commit lido (fast-forward)
+            self._git_enviar("patch", f"refs/heads/{self.branch}", {"sha": commit, "force": False})
+        METRICAS.contar("github.meses_gravados", len(alterados))
+        blobs = {sha: blobs[sha] for mes, sha in meses.items()
+                 if (mes >= atual.corte or mes == SEM_DATA) and sha in blobs}
+        return _CommitMensal(df_novo, commit, arvore, meses, None, {}, atual.corte, blobs)
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        self.transacao(lambda _df_atual: df)
+
+    def transacao(self, mutacao: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """
+        Compare-and-swap pela ref: o commit novo tem como pai o commit lido e
+        a ref só anda se ainda apontar para ele. Recusado (ou 5xx), relê — um
+        304 se nada mudou, senão só os meses novos — e reaplica a mutação.
+        """
+        for tentativa in range(self.TENTATIVAS):
+            atual = self._ler(fresco=True)
+            df_novo = mutacao(atual.df)
+            if df_novo is atual.df:
+                return atual.df
+            try:
+                novo = self._commitar(atual, df_novo)
+            except (ConflitoGitHub, GitHubIndisponivel):
+                time.sleep(0.1 * (2 ** tentativa) + random.uniform(0, 0.1))
+                continue
+            with self._lock:
+                # o ETag antigo não vale mais; a próxima leitura compara o sha do commit
+                self._atual, self._etag, self._lido_em = novo, None, time.monotonic()
+            return novo.df
+        raise ConflitoGitHub("CONFLITO_GITHUB: muitas gravações ao mesmo tempo, tente novamente.")
+
+    # -------------------------
+    # Histórico: os meses passados já são arquivos à parte
+    # -------------------------
+    def carregar_historico(self, ano: int) -> pd.DataFrame:
+        atual = self._ler()
+        meses = sorted(m for m in atual.meses if m.startswith(f"{ano:04d}-") and m < atual.corte)
+        # o reservas-AAAA.csv antigo, se ainda não foi repartido, vem antes dos meses
+        shas = ([atual.anuais[ano]] if ano in atual.anuais else []) + [atual.meses[m] for m in meses]
+        blobs = {sha: self._blobs_historico[sha] for sha in shas if sha in self._blobs_historico}
+        try:
+            blobs.update(self._baixar_blobs([sha for sha in dict.fromkeys(shas) if sha not in blobs]))
+        except Exception as e:
+            self.avisar(f"Falha temporária ao ler o histórico de {ano}: {e}")
+            return pd.DataFrame(columns=COLUNAS)
+        with self._lock:
+            self._blobs_historico.update(blobs)
+        partes = [blobs[sha] for sha in shas]
+        df = pd.concat(partes, ignore_index=True) if partes else pd.DataFrame(columns=COLUNAS)
+        # uma linha no arquivo antigo e também num mês aparece uma vez só (a do mês)
+        return df.drop_duplicates("id", keep="last") if ano in atual.anuais else df
+
+    def arquivar(self, hoje: date) -> int:
+        """Nada a mover: cada mês já é um arquivo, e os passados não são carregados."""
+        return 0
+
+
+# =========================================================
+# Log de operações (só acréscimos)
+# =========================================================
+class ArmazenamentoLog(Armazenamento):
+    """
+    Cada reserva/cancelamento é UMA linha acrescentada ao log (JSON Lines):
+        {"seq": 12, "op": "inserir", "reserva": {...}}
+        {"seq": 13, "op": "cancelar", "id": "a2619881"}
+        {"seq": 14, "op": "pin", "antigo": "<sha256>", "novo": "scrypt$..."}
+        {"seq": 15, "op": "atualizar", "reserva": {...}}   (mesmo id, outro conteúdo)
+    O estado é o snapshot mais o replay do log. Gravar não reescreve nada, e
+    uma gravação interrompida só deixa uma linha final cortada, que é
+    ignorada (e descartada na próxima gravação) — nunca um arquivo ilegível.
+
+    A compactação é automática: a gravação que leva o log a COMPACTAR_A_CADA
+    operações, ainda sob o lock, transforma o estado em snapshot (troca
+    atômica), zera o log e exporta de novo o reservas.csv (layout COLUNAS).
+    Vários processos podem usar os mesmos arquivos: tudo acontece sob um
+    lock, e cada um só lê do log o que os outros acrescentaram.
+    """
+
+    COMPACTAR_A_CADA = 500
+
+    def __init__(self, caminho: str = "reservas.jsonl", arquivo_csv: str = "reservas.csv",
+                 importar_de: Optional[str] = None):
+        super().__init__()
+        self.caminho = caminho
+        self.arquivo_csv = arquivo_csv
+        self.caminho_snapshot = os.path.splitext(caminho)[0] + ".snapshot.json"
+        self._lock_arquivo = caminho + ".lock"
+        self._lock = threading.RLock()
+        self._estado = IndiceReservas()
+        self._seq = 0
+        self._offset = 0
+        self._ops_no_log = 0
+        self._geracao_lida = None
+        self._df: Optional[pd.DataFrame] = None
+        self._df_seq = -1
+        novo = not os.path.exists(caminho) and not os.path.exists(self.caminho_snapshot)
+        if novo and importar_de and os.path.exists(importar_de):
+            df = ArmazenamentoCSV(importar_de).carregar()
+            self.transacao(lambda _df: df)
+
+    @contextmanager
+    def _travado(self):
+        """Lock entre threads e entre processos, já sincronizado com o disco."""
+        with self._lock, _portalocker().Lock(self._lock_arquivo, "a", timeout=5):
+            self._sincronizar()
+            yield
+
+    # -------------------------
+    # Replay
+    # -------------------------
+    def _geracao(self):
+        try:
+            st_ = os.stat(self.caminho_snapshot)
+            return st_.st_mtime_ns, st_.st_size
+        except FileNotFoundError:
+            return None
+
+    def _aplicar(self, op: dict) -> None:
+        if op["seq"] <= self._seq:
+            return  # já está no snapshot
+        if op["op"] == "inserir":
+            self._estado.adicionar(Reserva.de_dict(op["reserva"]))
+        elif op["op"] == "cancelar":
+            self._estado.remover(op["id"])
+        elif op["op"] == "atualizar":
+            self._estado.remover(op["reserva"]["id"])
+            self._estado.adicionar(Reserva.de_dict(op["reserva"]))
+        elif op["op"] == "pin":
+            for r in [r for r in self._estado.por_id.values() if r.pin_hash == op["antigo"]]:
+                self._estado.remover(r.id)
+                self._estado.adicionar(Reserva(r.id, r.data, r.turno, r.grupo, op["novo"], r.recurso))
+        self._seq = op["seq"]
+
+    def _recarregar_tudo(self) -> None:
+        self._estado, self._seq, self._offset, self._ops_no_log = IndiceReservas(), 0, 0, 0
+        self._geracao_lida = self._geracao()
+        if self._geracao_lida is not None:
+            with open(self.caminho_snapshot, encoding="utf-8") as f:
+                snap = json.load(f)
+            for r in snap["reservas"]:
+                self._estado.adicionar(Reserva.de_dict(r))
+            self._seq = snap["seq"]
+        self._ler_log()
+
+    def _ler_log(self) -> None:
+        """Aplica as linhas completas do log a partir de self._offset."""
+        if not os.path.exists(self.caminho):
+            return
+        with open(self.caminho, "rb") as f:
+            f.seek(self._offset)
+            dados = f.read()
+        fim = dados.rfind(b"\n") + 1  # depois disso, só uma linha cortada
+        pos = 0
+        while pos < fim:
+            quebra = dados.index(b"\n", pos)
+            try:
+                op = json.loads(dados[pos:quebra])
+            except ValueError:
+                raise LogCorrompido(f"{self.caminho}: linha inválida no byte {self._offset + pos}") from None
+            self._aplicar(op)
+            self._ops_no_log += 1
+            pos = quebra + 1
+        self._offset += fim
+
+    def _sincronizar(self) -> None:
+        tamanho = os.path.getsize(self.caminho) if os.path.exists(self.caminho) else 0
+        if self._geracao() != self._geracao_lida or tamanho < self._offset:
+            self._recarregar_tudo()  # outro processo compactou
+        elif tamanho > self._offset:
+            self._ler_log()
+
+    # -------------------------
+    # Escrita
+    # -------------------------
+    def _acrescentar(self, ops: List[dict]) -> None:
+        """Acrescenta ops ao log (com fsync) e aplica no estado. Chamar travado."""
+        if not ops:
+            return
+        for i, op in enumerate(ops, 1):
+            op["seq"] = self._seq + i
+        linhas = [json.dumps(op, ensure_ascii=False) for op in ops]
+        with open(self.caminho, "ab") as f:
+            f.truncate(self._offset)  # descarta uma linha final cortada, se houver
+            f.write(("\n".join(linhas) + "\n").encode("utf-8"))
+            f.flush()
+            os.fsync(f.fileno())
+            self._offset = f.tell()
+        for op in ops:
+            self._aplicar(op)
+        self._ops_no_log += len(ops)
+        METRICAS.contar("log.operacoes", len(ops))
+        if self._ops_no_log >= self.COMPACTAR_A_CADA:
+            self._compactar()
+
+    def _compactar(self) -> None:
+        tmp = self.caminho_snapshot + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"seq": self._seq, "reservas": [r.para_dict() for r in self._estado.por_id.values()]},
+                      f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.caminho_snapshot)
+        # se cair aqui, o replay pula as linhas com seq <= snapshot
+        open(self.caminho, "wb").close()
+        self._offset, self._ops_no_log = 0, 0
+        self._geracao_lida = self._geracao()
+        self.exportar_csv()
+        METRICAS.contar("log.compactacoes")
+
+    def exportar_csv(self, destino: Optional[str] = None) -> str:
+        """Escreve o estado atual no layout COLUNAS (troca atômica). Retorna o caminho."""
+        destino = destino or self.arquivo_csv
+        with self._lock:
+            df = self._para_df()
+        tmp = destino + ".tmp"
+        df.to_csv(tmp, index=False)
+        os.replace(tmp, destino)
+        return destino
+
+    # -------------------------
+    # Interface
+    # -------------------------
+    def _para_df(self) -> pd.DataFrame:
+        if self._df is None or self._df_seq != self._seq:
+            self._df = pd.DataFrame([r.para_dict() for r in self._estado.por_id.values()], columns=COLUNAS)
+            self._df_seq = self._seq
+        return self._df
+
+    def carregar(self, fresco: bool = False) -> pd.DataFrame:
+        with self._travado():
+            return self._para_df()
+
+    def versao(self) -> Optional[str]:
+        return f"{_marca_arquivo(self.caminho_snapshot)}|{_marca_arquivo(self.caminho)}"
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        self.transacao(lambda _df: df)
+
+    def transacao(self, mutacao: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        """Genérico: traduz a diferença entre antes e depois em operações do log."""
+        with self._travado():
+            df_atual = self._para_df()
+            df_novo = mutacao(df_atual)
+            if df_novo is df_atual:
+                return df_atual
+            depois = IndiceReservas.de_df(df_novo)
+            ops = [{"op": "cancelar", "id": i} for i in self._estado.por_id if i not in depois.por_id]
+            # mesmo id com outro conteúdo (ex.: salvar com o grupo corrigido): uma linha só,
+            # para a troca não ficar pela metade se o processo cair no meio
+            ops += [{"op": "atualizar", "reserva": r.para_dict()} for i, r in depois.por_id.items()
+                    if i in self._estado.por_id and self._estado.por_id[i].para_dict() != r.para_dict()]
+            ops += [{"op": "inserir", "reserva": r.para_dict()} for i, r in depois.por_id.items()
+                    if i not in self._estado.por_id]
+            self._acrescentar(ops)
+            return self._para_df()
+
+    def inserir(self, reserva: dict) -> None:
+        nova = Reserva.de_dict(reserva)
+        with self._travado():
+            if self._estado.ocupante(nova) is not None:
+                raise TurnoIndisponivel()
+            self._acrescentar([{"op": "inserir", "reserva": nova.para_dict()}])
+
+    def inserir_lote(self, reservas: List[dict], pular_ocupadas: bool = False) -> List[Reserva]:
+        novas = [Reserva.de_dict(r) for r in reservas]
+        with self._travado():
+            conflitos = self._estado.conflitos(novas)
+            if conflitos and not pular_ocupadas:
+                raise TurnoIndisponivel(conflitos)
+            fora = {id(r) for r in conflitos}
+            self._acrescentar([{"op": "inserir", "reserva": r.para_dict()} for r in novas
+                               if id(r) not in fora and r.id not in self._estado.por_id])
+            return conflitos
+
+    def remover(self, id_reserva: str, autorizar: Callable[[dict], bool]) -> None:
+        with self._travado():
+            reserva = self._estado.buscar(id_reserva)
+            if reserva is None:
+                raise ReservaNaoEncontrada()
+            if not autorizar(reserva.para_dict()):
+                raise PinIncorreto()
+            self._acrescentar([{"op": "cancelar", "id": id_reserva}])
+
+    def trocar_pin_hash(self, antigo: str, novo: str) -> int:
+        # uma linha só: a troca é atômica mesmo que o processo caia no meio
+        with self._travado():
+            n = sum(1 for r in self._estado.por_id.values() if r.pin_hash == antigo)
+            if n:
+                self._acrescentar([{"op": "pin", "antigo": antigo, "novo": novo}])
+            return n
+
+    def carregar_historico(self, ano: int) -> pd.DataFrame:
+        return ArmazenamentoCSV(self.arquivo_csv).carregar_historico(ano)
+
+    def _gravar_historico(self, ano: int, linhas: pd.DataFrame) -> None:
+        ArmazenamentoCSV(self.arquivo_csv)._gravar_historico(ano, linhas)
+
+
+# =========================================================
+# SQLite local
+# =========================================================
+_SQL_ESQUEMA = f"""
+CREATE TABLE IF NOT EXISTS reservas (
+    id       TEXT NOT NULL,
+    data     TEXT NOT NULL,
+    turno    TEXT NOT NULL,
+    grupo    TEXT NOT NULL DEFAULT '',
+    pin_hash TEXT NOT NULL DEFAULT '',
+    recurso  TEXT NOT NULL DEFAULT '{RECURSO_PADRAO}'
+);
+CREATE TABLE IF NOT EXISTS reservas_historico (
+    id       TEXT NOT NULL,
+    data     TEXT NOT NULL,
+    turno    TEXT NOT NULL,
+    grupo    TEXT NOT NULL DEFAULT '',
+    pin_hash TEXT NOT NULL DEFAULT '',
+    recurso  TEXT NOT NULL DEFAULT '{RECURSO_PADRAO}'
+);
+"""
+
+_SQL_INDICES = """
+DROP INDEX IF EXISTS ux_reservas_data_turno;
+CREATE UNIQUE INDEX IF NOT EXISTS ux_reservas_recurso_data_turno ON reservas (recurso, data, turno);
+CREATE INDEX IF NOT EXISTS ix_reservas_id ON reservas (id);
+CREATE INDEX IF NOT EXISTS ix_historico_data ON reservas_historico (data);
+"""
+
+_SQL_COLUNAS = ", ".join(COLUNAS)
+_SQL_INSERIR = f"INSERT INTO reservas ({_SQL_COLUNAS}) VALUES ({', '.join('?' * len(COLUNAS))})"
+
+
+def _linhas_sql(df: pd.DataFrame):
+    """Tuplas na ordem de COLUNAS, sem NaN e com o recurso preenchido."""
+    df = _garantir_colunas(df).fillna("")
+    return df.assign(recurso=df["recurso"].replace("", RECURSO_PADRAO)).itertuples(index=False, name=None)
+
+class ArmazenamentoSQLite(Armazenamento):
+    """
+    Banco SQLite (WAL: leitores não bloqueiam quem grava).
+    O índice único em (recurso, data, turno) é quem impede reserva dupla; reservar e
+    cancelar custam uma linha, não importa o tamanho do histórico.
+    """
+
+    def __init__(self, caminho: str = "reservas.db", importar_de: Optional[str] = None):
+        super().__init__()
+        self.caminho = caminho
+        novo = not os.path.exists(caminho)
+        with self._conexao() as con:
+            con.execute("PRAGMA journal_mode=WAL")
+            con.executescript(_SQL_ESQUEMA)
+            self._migrar(con)
+            con.executescript(_SQL_INDICES)
+        # importação única: só quando o banco acabou de ser criado
+        if novo and importar_de and os.path.exists(importar_de):
+            self.importar_csv(importar_de)
+
+    @contextmanager
+    def _conexao(self):
+        con = sqlite3.connect(self.caminho, timeout=5, isolation_level=None)
+        try:
+            yield con
+        finally:
+            con.close()
+
+    @contextmanager
+    def _transacao_sql(self):
+        """BEGIN IMMEDIATE ... COMMIT (ROLLBACK se der exceção)."""
+        with self._conexao() as con:
+            con.execute("BEGIN IMMEDIATE")
+            try:
+                yield con
+            except BaseException:
+                con.execute("ROLLBACK")
+                raise
+            con.execute("COMMIT")
+
+    @staticmethod
+    def _migrar(con: sqlite3.Connection) -> None:
+        """Bancos de antes da coluna recurso: tudo o que já existe é da sala."""
+        for tabela in ("reservas", "reservas_historico"):
+            colunas = {linha[1] for linha in con.execute(f"PRAGMA table_info({tabela})")}
+            if "recurso" not in colunas:
+                con.execute(f"ALTER TABLE {tabela} ADD COLUMN recurso TEXT NOT NULL DEFAULT '{RECURSO_PADRAO}'")
+
+    @staticmethod
+    def _ler(con: sqlite3.Connection) -> pd.DataFrame:
+        linhas = con.execute(f"SELECT {_SQL_COLUNAS} FROM reservas ORDER BY rowid").fetchall()
+        return pd.DataFrame(linhas, columns=COLUNAS, dtype=str)
+
+    @staticmethod
+    def _substituir(con: sqlite3.Connection, df: pd.DataFrame) -> None:
+        con.execute("DELETE FROM reservas")
+        con.executemany(_SQL_INSERIR, _linhas_sql(df))
+
+    def importar_csv(self, arquivo_csv: str) -> Tuple[int, int]:
+        """
+        Copia um reservas.csv para o banco. Linhas repetidas em (recurso, data, turno)
+        são ignoradas. Retorna (importadas, ignoradas).
+        """
+        df = ArmazenamentoCSV(arquivo_csv).carregar()
+        with self._transacao_sql() as con:
+            antes = con.total_changes
+            con.executemany(_SQL_INSERIR.replace("INSERT", "INSERT OR IGNORE", 1), _linhas_sql(df))
+            importadas = con.total_changes - antes
+        return importadas, len(df) - importadas
+
+    def carregar(self, fresco: bool = False) -> pd.DataFrame:
+        with self._conexao() as con:
+            return self._ler(con)
+
+    def versao(self) -> Optional[str]:
+        # em WAL, um commit mexe no -wal; o checkpoint, no arquivo principal
+        return f"{_marca_arquivo(self.caminho)}|{_marca_arquivo(self.caminho + '-wal')}"
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        with self._transacao_sql() as con:
+            self._substituir(con, df)
+
+    def transacao(self, mutacao: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        with self._transacao_sql() as con:
+            df_novo = mutacao(self._ler(con))
+            self._substituir(con, df_novo)
+        return df_novo
+
+    def inserir(self, reserva: dict) -> None:
+        try:
+            with self._conexao() as con:
+                con.execute(_SQL_INSERIR, tuple(Reserva.de_dict(reserva).para_dict().values()))
+        except sqlite3.IntegrityError:
+            raise TurnoIndisponivel() from None
+
+    def inserir_lote(self, reservas: List[dict], pular_ocupadas: bool = False) -> List[Reserva]:
+        novas = [Reserva.de_dict(r) for r in reservas]
+        if not novas:
+            return []
+        with self._transacao_sql() as con:
+            marcas = ", ".join("?" * len(novas))
+            ocupadas = {
+                (recurso, data, turno): id_
+                for id_, recurso, data, turno in con.execute(
+                    f"SELECT id, recurso, data, turno FROM reservas WHERE data IN ({marcas})",
+                    [r.data for r in novas],
+                )
+            }
+            conflitos = [r for r in novas if ocupadas.get(r.chave, r.id) != r.id]
+            if conflitos and not pular_ocupadas:
+                raise TurnoIndisponivel(conflitos)
+            fora = {id(r) for r in conflitos}
+            con.executemany(_SQL_INSERIR, [tuple(r.para_dict().values()) for r in novas
+                                           if id(r) not in fora and r.chave not in ocupadas])
+        return conflitos
+
+    def remover(self, id_reserva: str, autorizar: Callable[[dict], bool]) -> None:
+        with self._transacao_sql() as con:
+            linha = con.execute(f"SELECT {_SQL_COLUNAS} FROM reservas WHERE id = ?", (id_reserva,)).fetchone()
+            if linha is None:
+                raise ReservaNaoEncontrada()
+            if not autorizar(dict(zip(COLUNAS, linha))):
+                raise PinIncorreto()
+            con.execute("DELETE FROM reservas WHERE id = ?", (id_reserva,))
+
+    def trocar_pin_hash(self, antigo: str, novo: str) -> int:
+        with self._transacao_sql() as con:
+            return con.execute("UPDATE reservas SET pin_hash = ? WHERE pin_hash = ?", (novo, antigo)).rowcount
+
+    def carregar_historico(self, ano: int) -> pd.DataFrame:
+        with self._conexao() as con:
+            linhas = con.execute(
+                f"SELECT {_SQL_COLUNAS} FROM reservas_historico"
+                " WHERE data >= ? AND data < ? ORDER BY data, turno",
+                (f"{ano:04d}-", f"{ano + 1:04d}-"),
+            ).fetchall()
+        return pd.DataFrame(linhas, columns=COLUNAS, dtype=str)
+
+    def arquivar(self, hoje: date) -> int:
+        """Move para reservas_historico, numa transação só."""
+        filtro = "data GLOB '[0-9][0-9][0-9][0-9]-[0-9][0-9]-[0-9][0-9]*' AND data < ?"
+        with self._transacao_sql() as con:
+            con.execute(
+                f"INSERT INTO reservas_historico ({_SQL_COLUNAS}) SELECT {_SQL_COLUNAS} FROM reservas WHERE {filtro}",
+                (norm_data(hoje),),
+            )
+            return con.execute(f"DELETE FROM reservas WHERE {filtro}", (norm_data(hoje),)).rowcount
@@ -0,0 +1,177 @@
+"""
+Benchmarks do armazenamento e do calendário.
+
+    python -m bench.benchmark                              # 1k e 10k linhas
+    python -m bench.benchmark --linhas 1000 100000 1000000 --saida bench.json
+    python -m bench.benchmark --backends csv sqlite --repeticoes 20
+
+Para cada tamanho gera um reservas.csv sintético e mede, por backend, o que
+está por trás das leituras e gravações do app: carregar (frio e
+quente), salvar, ocupacao_mes_registros do calendário, a busca de horários livres e o
+fluxo reservar + cancelar.
+O backend GitHub roda contra o servidor falso (bench/servidor_github.py), nos
+dois modos: "github" (um reservas.csv, Contents API) e "github_mensal" (um
+arquivo por mês, Git Data API) — compare requisicoes_por_op e bytes_por_op.
+
+O resultado é uma lista de medições em JSON (--saida), para comparar versões.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from typing import Callable, List, Optional
+
+from agenda import ocupacao_mes_registros
+from armazenamento import (
+    Armazenamento,
+    ArmazenamentoCSV,
+    ArmazenamentoGitHub,
+    ArmazenamentoGitHubMensal,
+    ArmazenamentoSQLite,
+)
+from bench import sintetico
+from bench.servidor_github import ServidorGitHubFalso
+
+REPO = "bench/reservas"
+INICIO = date(2030, 1, 1)
+# datas livres para o fluxo reservar/cancelar: bem depois dos dados gerados
+LIVRES = date(9000, 1, 1)
+
+
+def medir(func: Callable[[], object], repeticoes: int,
+          preparar: Optional[Callable[[], None]] = None) -> dict:
+    """Tempos em ms de func(); preparar() roda antes de cada chamada, fora do tempo."""
+    tempos = []
+    for _ in range(repeticoes):
+        if preparar:
+            preparar()
+        t0 = time.perf_counter()
+        func()
+        tempos.append((time.perf_counter() - t0) * 1000)
+    tempos.sort()
+    return {
+        "repeticoes": repeticoes,
+        "media_ms": round(statistics.fmean(tempos), 3),
+        "p50_ms": round(statistics.median(tempos), 3),
+        "min_ms": round(tempos[0], 3),
+        "max_ms": round(tempos[-1], 3),
+    }
+
+
+def fluxo_reservar_cancelar(arm: Armazenamento) -> Callable[[], None]:
+    """Reserva um turno livre e cancela em seguida (uma data nova a cada chamada)."""
+    contador = {"i": 0}
+
+    def _fluxo() -> None:
+        d = LIVRES + timedelta(days=contador["i"])
+        contador["i"] += 1
+        id_ = f"b{contador['i']:07d}"
+        arm.inserir({"id": id_, "data": str(d), "turno": "19h - 22h", "grupo": "BENCH", "pin_hash": "x"})
+        arm.remover(id_, lambda linha: True)
+
+    return _fluxo
+
+
+def rodar_backend(nome: str, arm: Armazenamento, n: int, rep: int,
+                  invalidar: Optional[Callable[[], None]] = None,
+                  servidor: Optional[ServidorGitHubFalso] = None) -> List[dict]:
+    resultados = []
+
+    def registrar(cenario: str, medida: dict) -> None:
+        medida.update(cenario=cenario, backend=nome, linhas=n)
+        if servidor is not None:
+            with servidor.lock:
+                c = dict(servidor.contadores)
+            medida["requisicoes_por_op"] = round((c["get"] + c["put"] + c["post"] + c["patch"]) / medida["repeticoes"], 2)
+            medida["bytes_por_op"] = round((c["bytes_enviados"] + c["bytes_recebidos"]) / medida["repeticoes"])
+            servidor.zerar_contadores()
+        resultados.append(medida)
+        print(f"  {nome:13s} {cenario:22s} p50={medida['p50_ms']:10.2f} ms  média={medida['media_ms']:10.2f} ms",
+              file=sys.stderr)
+
+    if servidor is not None:
+        servidor.zerar_contadores()
+
+    registrar("carregar_frio", medir(lambda: arm.carregar(fresco=True), rep, preparar=invalidar))
+    df = arm.carregar(fresco=True)
+    if servidor is not None:
+        servidor.zerar_contadores()
+    registrar("carregar_quente", medir(lambda: arm.carregar(fresco=True), rep))
+    registrar("indice", medir(lambda: arm.indice(df.copy(deep=False)), rep))
+    # como o calendário: os registros do mês no índice, contados sem pandas
+    registrar("ocupacao_mes", medir(lambda: ocupacao_mes_registros(arm.indice(df).do_mes(INICIO.year, INICIO.month),
+                                                                    INICIO.year, INICIO.month), rep))
+    # sábados livres nos próximos 3 meses (o mapa de bits é montado na primeira busca)
+    registrar("livres_sabados", medir(lambda: arm.indice(df).livres(INICIO, ate=INICIO + timedelta(days=92),
+                                                                      dias_semana=[5], limite=20), rep))
+    registrar("salvar", medir(lambda: arm.salvar(df), rep))
+    registrar("reservar_cancelar", medir(fluxo_reservar_cancelar(arm), rep))
+    return resultados
+
+
+def rodar(tamanhos: List[int], backends: List[str], rep: int, latencia: float) -> List[dict]:
+    resultados = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in tamanhos:
+            print(f"{n} linhas", file=sys.stderr)
+            csv_path = os.path.join(tmp, f"reservas-{n}.csv")
+            sintetico.gerar_csv(csv_path, n, INICIO)
+            reps = max(1, rep if n <= 100_000 else rep // 5)
+
+            if "csv" in backends:
+                resultados += rodar_backend("csv", ArmazenamentoCSV(csv_path), n, reps)
+
+            if "sqlite" in backends:
+                db_path = os.path.join(tmp, f"reservas-{n}.db")
+                t0 = time.perf_counter()
+                arm = ArmazenamentoSQLite(db_path, importar_de=csv_path)
+                resultados.append({"cenario": "importar_csv", "backend": "sqlite", "linhas": n, "repeticoes": 1,
+                                   "media_ms": round((time.perf_counter() - t0) * 1000, 3)})
+                resultados += rodar_backend("sqlite", arm, n, reps)
+
+            for nome, classe in (("github", ArmazenamentoGitHub), ("github_mensal", ArmazenamentoGitHubMensal)):
+                if nome not in backends:
+                    continue
+                with ServidorGitHubFalso(latencia=latencia) as srv:
+                    with open(csv_path, "rb") as f:
+                        srv.colocar(REPO, "reservas.csv", f.read())
+                    arm = classe("token", REPO, "main", "reservas.csv", api_url=srv.url)
+                    if nome == "github_mensal":
+                        # uma gravação de verdade (outro df) reparte o reservas.csv por mês antes de medir
+                        arm.salvar(arm.carregar().copy())
+                    resultados += rodar_backend(nome, arm, n, reps, invalidar=arm.invalidar_cache, servidor=srv)
+    return resultados
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--linhas", type=int, nargs="+", default=[1_000, 10_000])
+    ap.add_argument("--backends", nargs="+", default=["csv", "sqlite", "github", "github_mensal"],
+                    choices=["csv", "sqlite", "github", "github_mensal"])
+    ap.add_argument("--repeticoes", type=int, default=10)
+    ap.add_argument("--latencia", type=float, default=0.0, help="latência do GitHub falso, em segundos")
+    ap.add_argument("--saida", help="arquivo JSON (padrão: stdout)")
+    args = ap.parse_args(argv)
+
+    relatorio = {
+        "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "latencia_github_s": args.latencia,
+        "resultados": rodar(args.linhas, args.backends, args.repeticoes, args.latencia),
+    }
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
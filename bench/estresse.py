@@ -0,0 +1,327 @@
+"""
+Teste de estresse de reservar/cancelar sob disputa (reserva dupla, cancelamento perdido).
+
+    python -m bench.estresse
+    python -m bench.estresse --backends csv github --cenarios 1x16 4x4 --operacoes 100 --saida estresse.json
+    python -m bench.estresse --backends github --latencia 0.02 --erro-5xx 0.05
+
+Cada cenário "PxT" sobe P processos com T threads cada. As threads de um
+processo dividem UMA instância do backend (como as sessões de um servidor
+Streamlit, via st.cache_resource); processos diferentes têm instâncias
+próprias e só se encontram no arquivo/banco/GitHub (como réplicas do app).
+Todas começam juntas e disputam poucos turnos (--datas sábados x 3 turnos):
+cada operação tenta reservar um turno sorteado (Armazenamento.inserir, que
+reconfere o turno sobre os dados mais novos) ou cancela uma reserva que a
+própria thread fez (Armazenamento.remover, com o PIN conferido pelo
+VerificadorPin). O GitHub é o servidor falso (bench/servidor_github.py).
+
+No fim, relê tudo com uma instância nova do backend e confere:
+  duplicadas:             duas reservas no mesmo (recurso, data, turno);
+  cancelamentos_perdidos: remover() retornou ok e a reserva continua lá;
+  reservas_perdidas:      inserir() retornou ok, ninguém cancelou e ela sumiu.
+Operações com resultado incerto (ex.: GitHub fora do ar no meio da gravação)
+não entram na conferência. As leituras fora das operações (a de antes da
+largada e a da conferência) também são retentadas; se mesmo assim falharem,
+entram no relatório (erro.leitura_inicial / conferencia_falhou) em vez de
+derrubar o teste. Sai com código 1 se houver alguma violação.
+
+Mede vazão (operações/s), p50/p99 da latência de reservar e cancelar,
+recusas (turno já ocupado: o esperado sob disputa), desistências (ConflitoGitHub
+depois de todas as retentativas, lock que não saiu) e, no GitHub, quantas
+gravações o servidor recusou por sha/ref velho (cada uma vira uma releitura e
+uma nova tentativa).
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, List, Optional, Tuple
+
+from agenda import RECURSO_PADRAO, norm_data, turnos_por_data
+from armazenamento import (
+    Armazenamento,
+    ArmazenamentoCSV,
+    ArmazenamentoGitHub,
+    ArmazenamentoGitHubMensal,
+    ArmazenamentoLog,
+    ArmazenamentoSQLite,
+)
+from bench.servidor_github import ServidorGitHubFalso
+from erros import ConflitoGitHub, ReservaNaoEncontrada, TurnoIndisponivel
+from senhas import VerificadorPin, gerar_hash
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+REPO = "bench/estresse"
+BACKENDS = ["csv", "sqlite", "log", "github", "github_mensal"]
+CABECALHO = b"id,data,turno,grupo,pin_hash,recurso\n"
+PIN = "4321"
+# sábados bem no futuro: nada de arquivar no meio do teste
+INICIO = date(9100, 1, 6)
+# leituras fora das operações (largada, conferência): com --erro-5xx também falham
+TENTATIVAS_LEITURA = 8
+
+
+def criar_backend(nome: str, destino: str) -> Armazenamento:
+    """destino: pasta dos arquivos locais ou URL do GitHub falso."""
+    if nome == "csv":
+        return ArmazenamentoCSV(os.path.join(destino, "reservas.csv"))
+    if nome == "sqlite":
+        return ArmazenamentoSQLite(os.path.join(destino, "reservas.db"))
+    if nome == "log":
+        return ArmazenamentoLog(os.path.join(destino, "reservas.jsonl"), os.path.join(destino, "reservas.csv"))
+    classe = ArmazenamentoGitHubMensal if nome == "github_mensal" else ArmazenamentoGitHub
+    return classe("token", REPO, "main", "reservas.csv", api_url=destino)
+
+
+def carregar_com_retentativas(arm: Armazenamento, fresco: bool = False) -> Tuple[Optional["pd.DataFrame"], str]:
+    """(df, "") ou (None, motivo) depois de TENTATIVAS_LEITURA falhas seguidas."""
+    motivo = ""
+    for tentativa in range(TENTATIVAS_LEITURA):
+        try:
+            return arm.carregar(fresco=fresco), ""
+        except Exception as e:
+            motivo = f"{type(e).__name__}: {e}"
+            time.sleep(0.05 * 2 ** min(tentativa, 4))
+    return None, motivo
+
+
+def turnos_disputados(n_datas: int) -> List[Tuple[str, str]]:
+    return [(norm_data(d), t) for d in (INICIO + timedelta(weeks=i) for i in range(n_datas))
+            for t in turnos_por_data(d)]
+
+
+def _percentil(valores: List[float], p: float) -> Optional[float]:
+    """Percentil pelo posto mais próximo (None se não houver valores)."""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return round(ordenados[min(len(ordenados) - 1, max(0, round(p / 100 * len(ordenados)) - 1))], 3)
+
+
+# =========================================================
+# Trabalho (roda nos processos filhos)
+# =========================================================
+def _thread(arm: Armazenamento, verificador: VerificadorPin, pin_hash: str, nome: str,
+            turnos: List[Tuple[str, str]], operacoes: int, cancelar: float, semente: int, res: dict) -> None:
+    rng = random.Random(semente)
+    minhas: List[str] = []
+    lat = {"reservar": [], "cancelar": []}
+    c = Counter()
+    inseridas, canceladas, incertas = [], [], []
+
+    def _autorizar(linha: dict) -> bool:
+        return verificador.verificar(linha["id"], PIN, linha["pin_hash"])
+
+    for i in range(operacoes):
+        if minhas and rng.random() < cancelar:
+            id_ = minhas.pop(rng.randrange(len(minhas)))
+            t0 = time.perf_counter()
+            try:
+                arm.remover(id_, _autorizar)
+                canceladas.append(id_)
+                c["canceladas"] += 1
+            except ReservaNaoEncontrada:
+                c["cancelar_nao_encontrada"] += 1  # a reserva desta thread sumiu: vai aparecer na conferência
+            except ConflitoGitHub:
+                c["desistencias"] += 1
+                minhas.append(id_)
+            except Exception as e:
+                c[f"erro.{type(e).__name__}"] += 1
+                incertas.append(id_)
+            lat["cancelar"].append((time.perf_counter() - t0) * 1000)
+        else:
+            data, turno = rng.choice(turnos)
+            id_ = f"{nome}-{i}"
+            t0 = time.perf_counter()
+            try:
+                arm.inserir({"id": id_, "data": data, "turno": turno, "grupo": nome, "pin_hash": pin_hash,
+                             "recurso": RECURSO_PADRAO})
+                inseridas.append(id_)
+                minhas.append(id_)
+                c["reservadas"] += 1
+            except TurnoIndisponivel:
+                c["recusadas"] += 1
+            except ConflitoGitHub:
+                c["desistencias"] += 1
+            except Exception as e:
+                c[f"erro.{type(e).__name__}"] += 1
+                incertas.append(id_)
+            lat["reservar"].append((time.perf_counter() - t0) * 1000)
+
+    with res["lock"]:
+        for k, v in lat.items():
+            res["latencias"][k].extend(v)
+        res["contagens"].update(c)
+        res["inseridas"] += inseridas
+        res["canceladas"] += canceladas
+        res["incertas"] += incertas
+
+
+def _processo(p: int, backend: str, destino: str, threads: int, turnos: List[Tuple[str, str]],
+              operacoes: int, cancelar: float, semente: int, partida: float) -> dict:
+    """Um processo do cenário: T threads sobre a mesma instância do backend."""
+    arm = criar_backend(backend, destino)
+    verificador = VerificadorPin()
+    pin_hash = gerar_hash(PIN)
+    res = {"lock": threading.Lock(), "latencias": {"reservar": [], "cancelar": []}, "contagens": Counter(),
+           "inseridas": [], "canceladas": [], "incertas": []}
+    # conexão/cache prontos antes da largada; se não der, as operações leem sozinhas
+    if carregar_com_retentativas(arm)[0] is None:
+        res["contagens"]["erro.leitura_inicial"] += 1
+    ts = [threading.Thread(target=_thread, args=(arm, verificador, pin_hash, f"p{p}t{t}", turnos, operacoes,
+                                                 cancelar, semente * 1000 + p * 100 + t, res))
+          for t in range(threads)]
+    time.sleep(max(0.0, partida - time.time()))  # todos os processos largam juntos
+    inicio = time.time()
+    for t in ts:
+        t.start()
+    for t in ts:
+        t.join()
+    del res["lock"]
+    res.update(inicio=inicio, fim=time.time(), contagens=dict(res["contagens"]))
+    return res
+
+
+# =========================================================
+# Cenário (processo principal)
+# =========================================================
+def conferir(backend: str, destino: str, inseridas: set, canceladas: set, incertas: set) -> dict:
+    """Invariantes sobre o estado final, lido por uma instância nova do backend."""
+    df, motivo = carregar_com_retentativas(criar_backend(backend, destino), fresco=True)
+    if df is None:
+        # sem o estado final não há o que conferir: conta como violação (código 1)
+        return {"duplicadas": [], "cancelamentos_perdidos": [], "reservas_perdidas": [],
+                "conferencia_falhou": [motivo]}
+    por_turno = df.groupby(["recurso", "data", "turno"])["id"].apply(list)
+    duplicadas = [{"recurso": r, "data": d, "turno": t, "ids": ids}
+                  for (r, d, t), ids in por_turno.items() if len(ids) > 1]
+    presentes = set(df["id"])
+    return {
+        "duplicadas": duplicadas,
+        "cancelamentos_perdidos": sorted((canceladas - incertas) & presentes),
+        "reservas_perdidas": sorted(inseridas - canceladas - incertas - presentes),
+    }
+
+
+def rodar_cenario(backend: str, processos: int, threads: int, args: argparse.Namespace, tmp: str) -> dict:
+    pasta = tempfile.mkdtemp(dir=tmp)
+    srv = None
+    if backend.startswith("github"):
+        srv = ServidorGitHubFalso(latencia=args.latencia, erro_5xx=args.erro_5xx).iniciar()
+        srv.colocar(REPO, "reservas.csv", CABECALHO)
+        destino = srv.url
+    else:
+        destino = pasta
+        criar_backend(backend, destino).carregar()  # cria os arquivos (e o esquema) antes da largada
+    try:
+        turnos = turnos_disputados(args.datas)
+        partida = time.time() + 1.0 + 0.5 * processos  # tempo para os filhos subirem
+        trabalho = (backend, destino, threads, turnos, args.operacoes, args.cancelar, args.semente, partida)
+        if processos == 1:
+            partes = [_processo(0, *trabalho)]
+        else:
+            with multiprocessing.get_context("spawn").Pool(processos) as pool:
+                partes = pool.starmap(_processo, [(p, *trabalho) for p in range(processos)])
+
+        latencias = {"reservar": [], "cancelar": []}
+        contagens = Counter()
+        inseridas, canceladas, incertas = set(), set(), set()
+        for parte in partes:
+            for k, v in parte["latencias"].items():
+                latencias[k] += v
+            contagens.update(parte["contagens"])
+            inseridas.update(parte["inseridas"])
+            canceladas.update(parte["canceladas"])
+            incertas.update(parte["incertas"])
+        duracao = max(p["fim"] for p in partes) - min(p["inicio"] for p in partes)
+        total = sum(len(v) for v in latencias.values())
+        violacoes = conferir(backend, destino, inseridas, canceladas, incertas)
+
+        resultado = {
+            "backend": backend,
+            "processos": processos,
+            "threads": threads,
+            "turnos_disputados": len(turnos),
+            "operacoes": total,
+            "duracao_s": round(duracao, 3),
+            "vazao_ops_s": round(total / duracao, 1) if duracao > 0 else None,
+            "latencia_ms": {k: {"n": len(v), "p50": _percentil(v, 50), "p99": _percentil(v, 99),
+                                "max": round(max(v), 3) if v else None} for k, v in latencias.items()},
+            "contagens": dict(sorted(contagens.items())),
+            "incertas": len(incertas),
+            "violacoes": violacoes,
+        }
+        if srv is not None:
+            with srv.lock:
+                # cada recusa por sha/ref velho é uma releitura + nova tentativa no cliente
+                resultado["recusas_cas"] = srv.contadores["409"] + srv.contadores["422"]
+                resultado["erros_5xx"] = srv.contadores["502"]
+                resultado["requisicoes"] = sum(srv.contadores[k] for k in ("get", "put", "post", "patch"))
+        n_viol = sum(len(v) for v in violacoes.values())
+        print(f"  {backend:13s} {processos}x{threads:<3d} {resultado['vazao_ops_s'] or 0:8.1f} op/s  "
+              f"reservar p50={resultado['latencia_ms']['reservar']['p50'] or 0:8.1f} "
+              f"p99={resultado['latencia_ms']['reservar']['p99'] or 0:8.1f} ms  "
+              f"recusadas={contagens['recusadas']:4d} desistências={contagens['desistencias']:3d}  "
+              f"violações={n_viol}", file=sys.stderr)
+        return resultado
+    finally:
+        if srv is not None:
+            srv.parar()
+
+
+def _cenario(texto: str) -> Tuple[int, int]:
+    try:
+        p, t = (int(x) for x in texto.lower().split("x"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"cenário inválido: {texto!r} (use PxT, ex.: 4x8)") from None
+    if p < 1 or t < 1:
+        raise argparse.ArgumentTypeError(f"cenário inválido: {texto!r}")
+    return p, t
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--backends", nargs="+", default=["csv", "github"], choices=BACKENDS)
+    ap.add_argument("--cenarios", type=_cenario, nargs="+", default=[(1, 8), (4, 4)],
+                    help="PxT: P processos com T threads cada (padrão: 1x8 4x4)")
+    ap.add_argument("--operacoes", type=int, default=40, help="operações por thread")
+    ap.add_argument("--datas", type=int, default=4, help="sábados disputados (3 turnos cada)")
+    ap.add_argument("--cancelar", type=float, default=0.3, help="chance de uma operação ser um cancelamento")
+    ap.add_argument("--latencia", type=float, default=0.005, help="latência do GitHub falso, em segundos")
+    ap.add_argument("--erro-5xx", type=float, default=0.0, help="fração de respostas 502 do GitHub falso")
+    ap.add_argument("--semente", type=int, default=1)
+    ap.add_argument("--saida", help="arquivo JSON (padrão: stdout)")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        resultados = [rodar_cenario(b, p, t, args, tmp) for b in args.backends for p, t in args.cenarios]
+
+    relatorio = {
+        "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "parametros": {k: v for k, v in vars(args).items() if k != "saida"},
+        "resultados": resultados,
+    }
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+    if any(v for r in resultados for v in r["violacoes"].values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Modelo de dados das telas: caminho pandas x registros Reserva.
+
+    python -m bench.modelo_dados
+    python -m bench.modelo_dados --linhas 200 1000 10000 --repeticoes 50 --saida modelo.json
+
+Para cada tamanho gera um reservas.csv sintético e mede, dos dois jeitos:
+  leitura: o que roda uma vez por versão dos dados —
+           pd.read_csv x csv.DictReader + registros Reserva + IndiceReservas;
+  rerun:   o que as abas fazem a cada rerun sobre o snapshot carregado —
+           pandas: copy + to_datetime + filtro + sort_values + apply
+           (rótulos do cancelar) + ocupação do calendário com value_counts
+           (ocupacao_mes_pandas, o cálculo que o app fazia antes);
+           registros: a_partir_de (busca binária nas ordenadas) + rótulos
+           + para_dataframe (só a lista) + ocupacao_mes_registros.
+Além do tempo, mede o pico de memória alocada (tracemalloc) de uma chamada.
+"""
+import argparse
+import calendar
+import csv
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from agenda import RECURSO_PADRAO, RECURSOS, ocupacao_mes_registros, recurso
+from bench import sintetico
+from bench.benchmark import medir
+from indice import IndiceReservas, Reserva, para_dataframe
+
+INICIO = date(2030, 1, 1)
+COLUNAS_LISTA = ["data", "turno", "grupo", "id"]
+
+
+def ler_pandas(caminho: str) -> pd.DataFrame:
+    return pd.read_csv(caminho, dtype=str).fillna("")
+
+
+def ler_registros(caminho: str) -> IndiceReservas:
+    indice = IndiceReservas()
+    with open(caminho, newline="", encoding="utf-8") as f:
+        for linha in csv.DictReader(f):
+            r = Reserva.de_dict(linha)
+            indice.por_turno[r.chave] = r
+            indice.por_id[r.id] = r
+    return indice
+
+
+def ocupacao_mes_pandas(df: pd.DataFrame, ano: int, mes: int,
+                        chaves: Optional[Iterable[str]] = None) -> Dict[str, Tuple[Dict[date, int], Dict[date, int]]]:
+    """
+    Como agenda.ocupacao_mes_registros, sobre o DataFrame: as linhas do mês
+    pelo prefixo "AAAA-MM", contadas por (recurso, dia) num único value_counts.
+    """
+    chaves = list(RECURSOS) if chaves is None else list(chaves)
+    n_dias = calendar.monthrange(ano, mes)[1]
+    dias = pd.date_range(date(ano, mes, 1), periods=n_dias, freq="D")
+
+    col = df["data"]
+    do_mes = col.str.startswith(f"{ano:04d}-{mes:02d}", na=False)
+    if "recurso" in df.columns:
+        recursos = df["recurso"][do_mes].fillna("").replace("", RECURSO_PADRAO).to_numpy()
+    else:
+        recursos = RECURSO_PADRAO
+    contagem = pd.DataFrame({"recurso": recursos, "data": col[do_mes].str[:10].to_numpy()}).value_counts()
+    por_recurso: Dict[str, Dict[str, int]] = {}
+    for (chave, dia), n in contagem.items():
+        por_recurso.setdefault(chave, {})[dia] = int(n)
+
+    resultado = {}
+    for chave in chaves:
+        rec = recurso(chave)
+        totais = np.where(dias.weekday <= 4, len(rec.turnos_semana), len(rec.turnos_fim_de_semana))
+        contados = por_recurso.get(chave, {})
+        resultado[chave] = (
+            {date(ano, mes, dia): contados.get(rotulo, 0)
+             for dia, rotulo in zip(range(1, n_dias + 1), dias.strftime("%Y-%m-%d"))},
+            {date(ano, mes, dia): int(tot) for dia, tot in zip(range(1, n_dias + 1), totais)},
+        )
+    return resultado
+
+
+def rerun_pandas(df: pd.DataFrame, hoje: date) -> None:
+    futuras = df.copy()
+    futuras["data_dt"] = pd.to_datetime(futuras["data"], errors="coerce")
+    futuras = futuras[futuras["data_dt"] >= pd.to_datetime(hoje)].copy()
+    futuras = futuras.sort_values(by=["data_dt", "turno"])
+    if not futuras.empty:
+        futuras.apply(lambda r: f'{r["data"]} | {r["turno"]} | {r["grupo"]} | id={r["id"]}', axis=1).tolist()
+        futuras[COLUNAS_LISTA]
+    ocupacao_mes_pandas(df, hoje.year, hoje.month)
+
+
+def rerun_registros(indice: IndiceReservas, hoje: date) -> None:
+    futuras = indice.a_partir_de(hoje)
+    if futuras:
+        [f"{r.data} | {r.turno} | {r.grupo} | id={r.id}" for r in futuras]
+        para_dataframe(futuras, COLUNAS_LISTA)
+    ocupacao_mes_registros(indice.do_mes(hoje.year, hoje.month), hoje.year, hoje.month)
+
+
+def pico_kib(func: Callable[[], None]) -> float:
+    tracemalloc.start()
+    try:
+        func()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def medir_tamanho(n: int, repeticoes: int, tmp: str) -> List[dict]:
+    caminho = os.path.join(tmp, f"reservas_{n}.csv")
+    sintetico.gerar_csv(caminho, n, INICIO)
+    # "hoje" no meio dos dados: metade das reservas ainda é futura
+    with open(caminho, encoding="utf-8") as f:
+        datas = [linha.split(",")[1] for linha in f][1:]
+    hoje = date.fromisoformat(datas[len(datas) // 2])
+
+    resultados = []
+    for caminho_dados, ler, rerun in (("pandas", ler_pandas, rerun_pandas),
+                                      ("registros", ler_registros, rerun_registros)):
+        dados = ler(caminho)  # aquece imports e caches do sistema de arquivos
+        rerun(dados, hoje)
+        cenarios = {
+            # uma vez por versão dos dados (o snapshot é compartilhado)
+            "leitura": lambda: ler(caminho),
+            # a cada rerun de cada sessão, sobre o snapshot já carregado
+            "rerun": lambda: rerun(dados, hoje),
+        }
+        for cenario, func in cenarios.items():
+            r = medir(func, repeticoes)
+            r.update(linhas=n, caminho=caminho_dados, cenario=cenario, pico_memoria_kib=pico_kib(func))
+            resultados.append(r)
+            print(f"  {n:>8d} linhas  {caminho_dados:9s} {cenario:7s} p50={r['p50_ms']:8.2f} ms  "
+                  f"pico={r['pico_memoria_kib']:9.1f} KiB", file=sys.stderr)
+    return resultados
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--linhas", type=int, nargs="+", default=[200, 1_000, 10_000])
+    ap.add_argument("--repeticoes", type=int, default=30)
+    ap.add_argument("--saida", help="arquivo JSON (padrão: stdout)")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        medicoes = [m for n in args.linhas for m in medir_tamanho(n, args.repeticoes, tmp)]
+
+    relatorio = {
+        "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "plataforma": platform.platform(),
+        "medicoes": medicoes,
+    }
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
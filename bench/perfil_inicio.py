@@ -0,0 +1,131 @@
+"""
+Perfil da partida a frio (cold start) do app, por modo de dados.
+
+    python -m bench.perfil_inicio
+    python -m bench.perfil_inicio --modos csv github --linhas 5000 --saida inicio.json
+
+Cada modo roda num processo Python novo (como um container que acabou de
+acordar), com -X importtime, em duas fases:
+  casca: streamlit + os módulos leves que o app importa no topo
+         (o bastante para desenhar cabeçalho, abas e calendário vazio);
+  dados: pandas + armazenamento + dependências do backend do modo, e a
+         primeira leitura das reservas (o GitHub é o servidor falso).
+Mostra o tempo de cada fase e os imports que mais pesaram.
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date
+from typing import List, Optional
+
+from bench import sintetico
+from bench.servidor_github import ServidorGitHubFalso
+
+REPO = "bench/reservas"
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# roda no processo filho: argv = modo, caminho do csv, url do GitHub falso
+_FILHO = r"""
+import json, sys, time
+t0 = time.perf_counter()
+import streamlit
+import erros, agenda, estado, exportar, indice, metricas, senhas
+t_casca = time.perf_counter()
+import pandas
+import armazenamento as a
+modo, csv, url = sys.argv[1:4]
+if modo == "github":
+    arm = a.ArmazenamentoGitHub("token", "%s", "main", "reservas.csv", api_url=url)
+elif modo == "sqlite":
+    arm = a.ArmazenamentoSQLite(csv + ".db", importar_de=csv)
+elif modo == "log":
+    arm = a.ArmazenamentoLog(csv + ".jsonl", csv, importar_de=csv)
+else:
+    arm = a.ArmazenamentoCSV(csv)
+t_backend = time.perf_counter()
+n = len(arm.carregar())
+t_dados = time.perf_counter()
+print(json.dumps({
+    "casca_ms": (t_casca - t0) * 1000,
+    "backend_ms": (t_backend - t_casca) * 1000,
+    "primeira_leitura_ms": (t_dados - t_backend) * 1000,
+    "total_ms": (t_dados - t0) * 1000,
+    "linhas": n,
+    "modulos_carregados": sorted(m for m in ("pandas", "numpy", "requests", "portalocker", "sqlite3")
+                                 if m in sys.modules),
+}))
+""" % REPO
+
+_IMPORTTIME = re.compile(r"import time:\s+(\d+)\s+\|\s+(\d+)\s+\| (\s*)(\S+)")
+
+
+def _mais_pesados(stderr: str, n: int) -> List[dict]:
+    """Imports de primeiro nível (os que o código pediu) por tempo acumulado."""
+    topo = []
+    for linha in stderr.splitlines():
+        m = _IMPORTTIME.match(linha)
+        if m and not m.group(3):
+            topo.append({"modulo": m.group(4), "acumulado_ms": round(int(m.group(2)) / 1000, 1)})
+    topo.sort(key=lambda x: -x["acumulado_ms"])
+    return topo[:n]
+
+
+def perfil_modo(modo: str, csv_path: str, url: str, top: int) -> dict:
+    if modo == "sqlite" and os.path.exists(csv_path + ".db"):
+        os.remove(csv_path + ".db")
+    t0 = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", _FILHO, modo, csv_path, url],
+        cwd=RAIZ, capture_output=True, text=True, check=True,
+    )
+    resultado = json.loads(proc.stdout.strip().splitlines()[-1])
+    resultado = {k: (round(v, 1) if isinstance(v, float) else v) for k, v in resultado.items()}
+    resultado.update(
+        modo=modo,
+        processo_ms=round((time.perf_counter() - t0) * 1000, 1),
+        imports_mais_pesados=_mais_pesados(proc.stderr, top),
+    )
+    print(f"  {modo:7s} casca={resultado['casca_ms']:8.1f} ms  backend={resultado['backend_ms']:8.1f} ms  "
+          f"1a leitura={resultado['primeira_leitura_ms']:8.1f} ms", file=sys.stderr)
+    return resultado
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--modos", nargs="+", default=["csv", "sqlite", "log", "github"],
+                    choices=["csv", "sqlite", "log", "github"])
+    ap.add_argument("--linhas", type=int, default=1_000)
+    ap.add_argument("--top", type=int, default=10, help="quantos imports pesados listar por modo")
+    ap.add_argument("--saida", help="arquivo JSON (padrão: stdout)")
+    args = ap.parse_args(argv)
+
+    with tempfile.TemporaryDirectory() as tmp, ServidorGitHubFalso() as srv:
+        csv_path = os.path.join(tmp, "reservas.csv")
+        sintetico.gerar_csv(csv_path, args.linhas, date(2030, 1, 1))
+        with open(csv_path, "rb") as f:
+            srv.colocar(REPO, "reservas.csv", f.read())
+        resultados = [perfil_modo(m, csv_path, srv.url, args.top) for m in args.modos]
+
+    relatorio = {
+        "quando": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "plataforma": platform.platform(),
+        "linhas": args.linhas,
+        "resultados": resultados,
+    }
+    texto = json.dumps(relatorio, ensure_ascii=False, indent=2)
+    if args.saida:
+        with open(args.saida, "w", encoding="utf-8") as f:
+            f.write(texto + "\n")
+    else:
+        print(texto)
+
+
+if __name__ == "__main__":
+    main()
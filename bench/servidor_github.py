@@ -0,0 +1,457 @@
+"""
+Servidor falso da API do GitHub (Contents + Git Data), para benchmarks e testes de carga.
+
+Implementa só o que o app usa:
+  GET /repos/{dono}/{repo}/contents/{path}?ref=...   (ETag / If-None-Match -> 304;
+                                                      acima de 1 MB vem sem "content", como no GitHub)
+  PUT /repos/{dono}/{repo}/contents/{path}           (sha velho -> 409, sem sha -> 422)
+  GET /repos/{dono}/{repo}/git/ref/heads/{branch}    (ETag / If-None-Match -> 304)
+  GET /repos/{dono}/{repo}/git/commits/{sha}, .../git/trees/{sha}
+  GET /repos/{dono}/{repo}/git/blobs/{sha}           (Accept: application/vnd.github.raw -> bytes)
+  POST /repos/{dono}/{repo}/git/blobs, .../git/trees (base_tree; "content" inline; sha null apaga)
+  POST /repos/{dono}/{repo}/git/commits
+  PATCH /repos/{dono}/{repo}/git/refs/heads/{branch} (sem force e sem fast-forward -> 422)
+
+Os dois lados veem os mesmos arquivos: cada PUT da Contents API vira um
+commit, e mover a ref troca os arquivos servidos pela Contents API.
+
+Opções: latência artificial por requisição, limite de requisições por janela
+(403 + X-RateLimit-* + Retry-After, como o GitHub), uma fração de respostas
+502 para simular instabilidade e contadores de uso (inclusive de conexões
+TCP abertas, para conferir o keep-alive).
+
+Uso avulso:
+    python -m bench.servidor_github --porta 8765 --latencia 0.05
+e, no .streamlit/secrets.toml:
+    GITHUB_API_URL = "http://127.0.0.1:8765"
+"""
+import argparse
+import base64
+import hashlib
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+
+def sha_blob(conteudo: bytes) -> str:
+    """Mesmo sha que o git dá para um blob."""
+    return hashlib.sha1(b"blob %d\0" % len(conteudo) + conteudo).hexdigest()
+
+
+def _sha_objeto(obj) -> str:
+    return hashlib.sha1(json.dumps(obj, sort_keys=True).encode()).hexdigest()
+
+
+class ServidorGitHubFalso:
+    """
+    Uso:
+        with ServidorGitHubFalso(latencia=0.02) as srv:
+            srv.colocar("o/r", "reservas.csv", b"id,data,...")
+            ArmazenamentoGitHub("t", "o/r", "main", "reservas.csv", api_url=srv.url)
+    """
+
+    LIMITE_CONTENTS = 1024 * 1024  # acima disso a Contents API não manda o conteúdo
+
+    def __init__(self, porta: int = 0, latencia: float = 0.0,
+                 limite: Optional[int] = None, janela: float = 3600.0, erro_5xx: float = 0.0,
+                 limite_contents: int = LIMITE_CONTENTS):
+        self.latencia = latencia
+        self.limite_contents = limite_contents
+        self.erro_5xx = erro_5xx
+        self.limite = limite
+        self.janela = janela
+        self.lock = threading.Lock()
+        self.arquivos: Dict[Tuple[str, str], bytes] = {}
+        # objetos git (compartilhados entre repos, como num servidor de verdade)
+        self.blobs: Dict[str, bytes] = {}
+        self.arvores: Dict[str, List[dict]] = {}
+        self.raizes: Dict[str, Dict[str, bytes]] = {}  # sha da árvore raiz -> {path: conteúdo}
+        self.commits: Dict[str, dict] = {}
+        self._heads: Dict[str, str] = {}
+        self._sujos = set()  # repos com PUT/colocar ainda sem commit
+        self.contadores = {"get": 0, "put": 0, "post": 0, "patch": 0, "304": 0, "409": 0, "422": 0,
+                           "403": 0, "502": 0, "conexoes": 0, "bytes_enviados": 0, "bytes_recebidos": 0}
+        self._janela_inicio = time.time()
+        self._usadas = 0
+        self._httpd = ThreadingHTTPServer(("127.0.0.1", porta), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, porta = self._httpd.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    # -------------------------
+    # Ciclo de vida
+    # -------------------------
+    def iniciar(self) -> "ServidorGitHubFalso":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def parar(self) -> None:
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self) -> "ServidorGitHubFalso":
+        return self.iniciar()
+
+    def __exit__(self, *exc) -> None:
+        self.parar()
+
+    # -------------------------
+    # Dados
+    # -------------------------
+    def colocar(self, repo: str, path: str, conteudo: bytes) -> str:
+        with self.lock:
+            self.arquivos[(repo, path)] = conteudo
+            self._sujos.add(repo)
+        return sha_blob(conteudo)
+
+    def listar(self, repo: str) -> List[str]:
+        with self.lock:
+            return sorted(p for r, p in self.arquivos if r == repo)
+
+    def ler(self, repo: str, path: str) -> Optional[bytes]:
+        with self.lock:
+            return self.arquivos.get((repo, path))
+
+    def zerar_contadores(self) -> None:
+        with self.lock:
+            for k in self.contadores:
+                self.contadores[k] = 0
+
+    # -------------------------
+    # Objetos git (chamar com self.lock)
+    # -------------------------
+    def _gravar_arvore(self, arquivos: Dict[str, bytes]) -> str:
+        """Grava a árvore (e as subárvores) de {path: conteúdo}; retorna o sha da raiz."""
+        filhos: Dict[str, Dict[str, bytes]] = {}
+        entradas = []
+        for path, conteudo in arquivos.items():
+            nome, _, resto = path.partition("/")
+            if resto:
+                filhos.setdefault(nome, {})[resto] = conteudo
+            else:
+                sha = sha_blob(conteudo)
+                self.blobs[sha] = conteudo
+                entradas.append({"path": nome, "mode": "100644", "type": "blob", "sha": sha, "size": len(conteudo)})
+        for nome, sub in filhos.items():
+            entradas.append({"path": nome, "mode": "040000", "type": "tree", "sha": self._gravar_arvore(sub)})
+        entradas.sort(key=lambda e: e["path"])
+        sha = _sha_objeto(entradas)
+        self.arvores[sha] = entradas
+        return sha
+
+    def _nova_raiz(self, arquivos: Dict[str, bytes]) -> str:
+        sha = self._gravar_arvore(arquivos)
+        self.raizes[sha] = dict(arquivos)
+        return sha
+
+    def _head(self, repo: str) -> str:
+        """Commit atual do repo; um PUT/colocar pendente vira commit aqui."""
+        if repo in self._sujos or repo not in self._heads:
+            arvore = self._nova_raiz({p: c for (r, p), c in self.arquivos.items() if r == repo})
+            pais = [self._heads[repo]] if repo in self._heads else []
+            sha = _sha_objeto({"tree": arvore, "parents": pais, "t": time.time_ns()})
+            self.commits[sha] = {"tree": arvore, "parents": pais}
+            self._heads[repo] = sha
+            self._sujos.discard(repo)
+        return self._heads[repo]
+
+    def _descende(self, commit: str, ancestral: str) -> bool:
+        pendentes = [commit]
+        while pendentes:
+            sha = pendentes.pop()
+            if sha == ancestral:
+                return True
+            pendentes.extend(self.commits.get(sha, {}).get("parents", []))
+        return False
+
+    def _consumir_cota(self) -> Tuple[bool, dict]:
+        """(permitido, cabeçalhos X-RateLimit-*)."""
+        with self.lock:
+            agora = time.time()
+            if agora - self._janela_inicio >= self.janela:
+                self._janela_inicio, self._usadas = agora, 0
+            reset = int(self._janela_inicio + self.janela)
+            if self.limite is None:
+                return True, {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "5000",
+                              "X-RateLimit-Reset": str(reset)}
+            permitido = self._usadas < self.limite
+            if permitido:
+                self._usadas += 1
+            restante = max(self.limite - self._usadas, 0)
+            cab = {"X-RateLimit-Limit": str(self.limite), "X-RateLimit-Remaining": str(restante),
+                   "X-RateLimit-Reset": str(reset)}
+            if not permitido:
+                cab["Retry-After"] = str(max(int(reset - agora), 1))
+            return permitido, cab
+
+    # -------------------------
+    # HTTP
+    # -------------------------
+    def _handler(self):
+        srv = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def setup(self):
+                super().setup()
+                with srv.lock:
+                    srv.contadores["conexoes"] += 1
+
+            def _rota(self) -> Optional[Tuple[str, str, str]]:
+                """(api, repo, resto): repos/{dono}/{repo}/contents/{path...} ou .../git/{...}."""
+                partes = urlsplit(self.path).path.strip("/").split("/")
+                if len(partes) < 5 or partes[0] != "repos" or partes[3] not in ("contents", "git"):
+                    return None
+                return partes[3], f"{partes[1]}/{partes[2]}", "/".join(partes[4:])
+
+            def _responder(self, status: int, corpo: Optional[dict] = None, cab: Optional[dict] = None,
+                           bruto: Optional[bytes] = None):
+                dados = bruto if bruto is not None else json.dumps(corpo).encode() if corpo is not None else b""
+                self.send_response(status)
+                self.send_header("Content-Type", "application/octet-stream" if bruto is not None else "application/json")
+                self.send_header("Content-Length", str(len(dados)))
+                for k, v in (cab or {}).items():
+                    self.send_header(k, v)
+                self.end_headers()
+                self.wfile.write(dados)
+                with srv.lock:
+                    srv.contadores["bytes_enviados"] += len(dados)
+
+            def _inicio(self) -> Optional[Tuple[Tuple[str, str, str], dict]]:
+                if srv.latencia:
+                    time.sleep(srv.latencia)
+                permitido, cab = srv._consumir_cota()
+                if not permitido:
+                    with srv.lock:
+                        srv.contadores["403"] += 1
+                    self._responder(403, {"message": "API rate limit exceeded"}, cab)
+                    return None
+                if srv.erro_5xx and random.random() < srv.erro_5xx:
+                    with srv.lock:
+                        srv.contadores["502"] += 1
+                    self._responder(502, {"message": "Server Error"}, cab)
+                    return None
+                rota = self._rota()
+                if rota is None:
+                    self._responder(404, {"message": "Not Found"}, cab)
+                    return None
+                return rota, cab
+
+            def do_GET(self):
+                inicio = self._inicio()
+                if inicio is None:
+                    return
+                (api, repo, resto), cab = inicio
+                with srv.lock:
+                    srv.contadores["get"] += 1
+                if api == "git":
+                    return self._git_get(repo, resto, cab)
+                with srv.lock:
+                    conteudo = srv.arquivos.get((repo, resto))
+                if conteudo is None:
+                    return self._responder(404, {"message": "Not Found"}, cab)
+                sha = sha_blob(conteudo)
+                if self._nao_mudou(sha, cab):
+                    return self._responder(304, None, cab)
+                grande = len(conteudo) > srv.limite_contents
+                self._responder(200, {
+                    "type": "file",
+                    "path": resto,
+                    "sha": sha,
+                    "size": len(conteudo),
+                    "encoding": "none" if grande else "base64",
+                    "content": "" if grande else base64.encodebytes(conteudo).decode(),
+                }, cab)
+
+            def _nao_mudou(self, sha: str, cab: dict) -> bool:
+                cab["ETag"] = f'W/"{sha}"'
+                if self.headers.get("If-None-Match") != cab["ETag"]:
+                    return False
+                with srv.lock:
+                    srv.contadores["304"] += 1
+                return True
+
+            def _git_get(self, repo: str, resto: str, cab: dict):
+                tipo, _, chave = resto.partition("/")
+                corpo = None
+                with srv.lock:
+                    head = srv._head(repo)  # um PUT da Contents API também vira objeto git
+                    if tipo == "ref" and chave.startswith("heads/"):
+                        corpo = {"ref": f"refs/{chave}", "object": {"type": "commit", "sha": head}}
+                    elif tipo == "commits" and chave in srv.commits:
+                        c = srv.commits[chave]
+                        corpo = {"sha": chave, "tree": {"sha": c["tree"]},
+                                 "parents": [{"sha": p} for p in c["parents"]]}
+                    elif tipo == "trees" and chave in srv.arvores:
+                        corpo = {"sha": chave, "tree": srv.arvores[chave], "truncated": False}
+                    elif tipo == "blobs":
+                        corpo = srv.blobs.get(chave)
+                if corpo is None:
+                    return self._responder(404, {"message": "Not Found"}, cab)
+                if tipo == "ref" and self._nao_mudou(corpo["object"]["sha"], cab):
+                    return self._responder(304, None, cab)
+                if tipo == "blobs":
+                    if "raw" in (self.headers.get("Accept") or ""):
+                        return self._responder(200, cab=cab, bruto=corpo)
+                    corpo = {"sha": chave, "size": len(corpo), "encoding": "base64",
+                             "content": base64.encodebytes(corpo).decode()}
+                self._responder(200, corpo, cab)
+
+            def _ler_corpo(self) -> dict:
+                tamanho = int(self.headers.get("Content-Length") or 0)
+                corpo = json.loads(self.rfile.read(tamanho) or b"{}")
+                with srv.lock:
+                    srv.contadores["bytes_recebidos"] += tamanho
+                return corpo
+
+            def do_POST(self):
+                corpo = self._ler_corpo()
+                inicio = self._inicio()
+                if inicio is None:
+                    return
+                (api, repo, resto), cab = inicio
+                with srv.lock:
+                    srv.contadores["post"] += 1
+                    if api != "git":
+                        resposta = None
+                    elif resto == "blobs":
+                        conteudo = corpo.get("content", "").encode()
+                        if corpo.get("encoding") == "base64":
+                            conteudo = base64.b64decode(conteudo)
+                        sha = sha_blob(conteudo)
+                        srv.blobs[sha] = conteudo
+                        resposta = {"sha": sha}
+                    elif resto == "trees":
+                        resposta = self._criar_arvore(corpo)
+                    elif resto == "commits":
+                        sha = _sha_objeto({"tree": corpo["tree"], "parents": corpo.get("parents", []),
+                                           "message": corpo.get("message"), "t": time.time_ns()})
+                        srv.commits[sha] = {"tree": corpo["tree"], "parents": list(corpo.get("parents", []))}
+                        resposta = {"sha": sha, "tree": {"sha": corpo["tree"]}}
+                    else:
+                        resposta = None
+                if resposta is None:
+                    return self._responder(404, {"message": "Not Found"}, cab)
+                if "message" in resposta:
+                    return self._responder(422, resposta, cab)
+                self._responder(201, resposta, cab)
+
+            def _criar_arvore(self, corpo: dict) -> dict:
+                arquivos = dict(srv.raizes.get(corpo.get("base_tree"), {}))
+                if corpo.get("base_tree") and corpo["base_tree"] not in srv.raizes:
+                    return {"message": "base_tree não encontrada"}
+                for e in corpo.get("tree", []):
+                    if "content" in e:
+                        arquivos[e["path"]] = e["content"].encode()
+                    elif e.get("sha") is None:
+                        arquivos.pop(e["path"], None)
+                    elif e["sha"] in srv.blobs:
+                        arquivos[e["path"]] = srv.blobs[e["sha"]]
+                    else:
+                        return {"message": f"blob {e['sha']} não encontrado"}
+                sha = srv._nova_raiz(arquivos)
+                return {"sha": sha, "tree": srv.arvores[sha]}
+
+            def do_PATCH(self):
+                corpo = self._ler_corpo()
+                inicio = self._inicio()
+                if inicio is None:
+                    return
+                (api, repo, resto), cab = inicio
+                if api != "git" or not resto.startswith("refs/heads/"):
+                    return self._responder(404, {"message": "Not Found"}, cab)
+                with srv.lock:
+                    srv.contadores["patch"] += 1
+                    novo, atual = corpo.get("sha"), srv._head(repo)
+                    if novo not in srv.commits:
+                        status, msg = 422, "Object does not exist"
+                    elif not corpo.get("force") and not srv._descende(novo, atual):
+                        srv.contadores["422"] += 1
+                        status, msg = 422, "Update is not a fast forward"
+                    else:
+                        status, msg = 200, None
+                        srv._heads[repo] = novo
+                        for chave in [k for k in srv.arquivos if k[0] == repo]:
+                            del srv.arquivos[chave]
+                        for path, conteudo in srv.raizes[srv.commits[novo]["tree"]].items():
+                            srv.arquivos[(repo, path)] = conteudo
+                if msg:
+                    return self._responder(status, {"message": msg}, cab)
+                self._responder(200, {"ref": resto, "object": {"type": "commit", "sha": novo}}, cab)
+
+            def do_PUT(self):
+                corpo = self._ler_corpo()
+                inicio = self._inicio()
+                if inicio is None:
+                    return
+                (api, repo, resto), cab = inicio
+                if api != "contents":
+                    return self._responder(404, {"message": "Not Found"}, cab)
+                rota = (repo, resto)
+                novo = base64.b64decode(corpo.get("content", ""))
+                with srv.lock:
+                    srv.contadores["put"] += 1
+                    atual = srv.arquivos.get(rota)
+                    if atual is not None and "sha" not in corpo:
+                        srv.contadores["422"] += 1
+                        status = 422
+                    elif atual is not None and corpo["sha"] != sha_blob(atual):
+                        srv.contadores["409"] += 1
+                        status = 409
+                    else:
+                        srv.arquivos[rota] = novo
+                        srv._sujos.add(repo)
+                        status = 200 if atual is not None else 201
+                if status in (409, 422):
+                    msg = "sha wasn't supplied" if status == 422 else f"{rota[1]} does not match"
+                    return self._responder(status, {"message": msg}, cab)
+                sha = sha_blob(novo)
+                self._responder(status, {
+                    "content": {"path": rota[1], "sha": sha, "size": len(novo)},
+                    "commit": {"sha": hashlib.sha1(sha.encode() + str(time.time()).encode()).hexdigest()},
+                }, cab)
+
+        return Handler
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--porta", type=int, default=8765)
+    ap.add_argument("--latencia", type=float, default=0.0, help="segundos por requisição")
+    ap.add_argument("--limite", type=int, default=None, help="requisições por janela (padrão: sem limite)")
+    ap.add_argument("--janela", type=float, default=3600.0, help="tamanho da janela do limite, em segundos")
+    ap.add_argument("--erro-5xx", type=float, default=0.0, help="fração de respostas 502 (0 a 1)")
+    ap.add_argument("--repo", default="o/r")
+    ap.add_argument("--arquivo", default="reservas.csv", help="CSV local para semear o servidor")
+    args = ap.parse_args()
+
+    srv = ServidorGitHubFalso(args.porta, args.latencia, args.limite, args.janela, args.erro_5xx)
+    try:
+        with open(args.arquivo, "rb") as f:
+            srv.colocar(args.repo, "reservas.csv", f.read())
+    except FileNotFoundError:
+        pass
+    srv.iniciar()
+    print(f"GitHub falso em {srv.url} (repo {args.repo}). Ctrl+C para sair.")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        srv.parar()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,31 @@
+"""Geração de reservas.csv sintéticos para os benchmarks."""
+import csv
+import hashlib
+from datetime import date, timedelta
+from typing import Iterator, List
+
+from agenda import norm_data, turnos_por_data
+
+COLUNAS = ["id", "data", "turno", "grupo", "pin_hash"]
+GRUPOS = ["CURSO DE AUDIO PAROQUIAL", "MINISTÉRIO DE MÚSICA", "CORAL", "GRUPO DE JOVENS", "CATEQUESE"]
+PIN_HASH = hashlib.sha256(b"1234").hexdigest()
+
+
+def linhas(n: int, inicio: date) -> Iterator[List[str]]:
+    """n reservas sem repetir (data, turno), ocupando todos os turnos a partir de inicio."""
+    d = inicio
+    i = 0
+    while True:
+        for turno in turnos_por_data(d):
+            if i >= n:
+                return
+            yield [f"{i:08x}", norm_data(d), turno, GRUPOS[i % len(GRUPOS)], PIN_HASH]
+            i += 1
+        d += timedelta(days=1)
+
+
+def gerar_csv(caminho: str, n: int, inicio: date) -> None:
+    with open(caminho, "w", newline="", encoding="utf-8") as f:
+        w = csv.writer(f, lineterminator="\n")
+        w.writerow(COLUNAS)
+        w.writerows(linhas(n, inicio))
@@ -0,0 +1,38 @@
+"""
+Erros do armazenamento. Ficam num módulo leve (sem pandas/requests) para o
+app poder tratá-los sem carregar nenhum backend.
+"""
+from typing import TYPE_CHECKING, List, Optional
+
+if TYPE_CHECKING:
+    from indice import Reserva
+
+
+class ConflitoGitHub(RuntimeError):
+    """PUT recusado (409/422): alguém gravou antes, o sha enviado está velho."""
+
+class GitHubIndisponivel(RuntimeError):
+    """GitHub fora do ar (mesmo depois das retentativas) e nada em cache para mostrar."""
+
+class TurnoIndisponivel(Exception):
+    """O turno escolhido já está reservado (num lote: conflitos = as que bateram)."""
+
+    def __init__(self, conflitos: Optional[List["Reserva"]] = None):
+        super().__init__()
+        self.conflitos = conflitos or []
+
+class ReservaNaoEncontrada(Exception):
+    """A reserva não existe mais (talvez alguém já cancelou)."""
+
+class PinIncorreto(Exception):
+    """PIN não confere com o da reserva nem com o do administrador."""
+
+class LogCorrompido(RuntimeError):
+    """Linha inválida no meio do log de operações (não é só um final cortado)."""
+
+class MuitasTentativas(Exception):
+    """PIN errado vezes demais nesta reserva: espere `espera` segundos."""
+
+    def __init__(self, espera: float):
+        super().__init__(f"tente de novo em {espera:.0f} s")
+        self.espera = espera
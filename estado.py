@@ -0,0 +1,95 @@
+"""
+Snapshot das reservas compartilhado por todas as sessões do processo.
+
+Antes cada rerun de cada sessão relia (ou baixava do GitHub) o arquivo
+inteiro. O EstadoReservas guarda o último DataFrame carregado e um contador
+de versão: no máximo uma vez por `intervalo` ele pergunta ao backend se os
+dados mudaram (Armazenamento.versao(): um stat local ou um GET condicional
+no GitHub) e só recarrega quando mudaram. Cada sessão guarda o número da
+versão que já mostrou e só precisa redesenhar quando ele muda.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import TYPE_CHECKING, Callable, Hashable, Optional, Tuple, TypeVar
+
+from metricas import METRICAS
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+    from armazenamento import Armazenamento
+
+T = TypeVar("T")
+
+
+class EstadoReservas:
+    """
+    Uso:
+        versao, df = estado.atual()
+        ocupacao = estado.memo(versao, ("ocupacao", ano, mes), lambda: calcular_ocupacao(df, ano, mes))
+    """
+
+    INTERVALO = 2.0  # segundos entre consultas ao backend
+    MAX_MEMO = 64
+
+    def __init__(self, arm: "Armazenamento", intervalo: float = INTERVALO):
+        self.arm = arm
+        self.intervalo = intervalo
+        self.versao = 0
+        self._lock = threading.RLock()
+        self._df: Optional["pd.DataFrame"] = None
+        self._marca: Optional[str] = None
+        self._conferido_em = 0.0
+        self._memo: "OrderedDict[Hashable, Tuple[int, object]]" = OrderedDict()
+
+    def conferir(self) -> int:
+        """Recarrega se o backend mudou (no máximo uma consulta por intervalo). Retorna a versão."""
+        with self._lock:
+            agora = time.monotonic()
+            if self._df is not None and agora - self._conferido_em < self.intervalo:
+                return self.versao
+            # a marca vem ANTES da leitura: se mudar no meio, a próxima conferência pega
+            marca = self.arm.versao()
+            if self._df is None or marca is None or marca != self._marca:
+                df = self.arm.carregar()
+                if df is not self._df:
+                    self._df = df
+                    self.versao += 1
+                    self._memo.clear()
+                    METRICAS.contar("estado.recargas")
+                self._marca = marca
+            self._conferido_em = agora
+            return self.versao
+
+    def atual(self) -> Tuple[int, "pd.DataFrame"]:
+        """(versão, df) — o df é compartilhado: NÃO alterar in-place."""
+        with self._lock:
+            self.conferir()
+            return self.versao, self._df
+
+    def alterado(self) -> None:
+        """Este processo acabou de gravar: a próxima conferência vai ao backend."""
+        with self._lock:
+            self._conferido_em = 0.0
+
+    def memo(self, versao: int, chave: Hashable, calcular: Callable[[], T]) -> T:
+        """
+        Resultado derivado do snapshot da `versao` que o chamador leu em atual(),
+        calculado uma vez por versão. calcular() usa esse snapshot: se outra
+        sessão já trouxe uma versão nova, o valor é devolvido mas não guardado
+        (nunca fica guardado sob a versão nova um cálculo sobre a velha).
+        """
+        with self._lock:
+            guardado = self._memo.get(chave)
+            if guardado is not None and guardado[0] == versao:
+                self._memo.move_to_end(chave)
+                METRICAS.contar("estado.memo_acertos")
+                return guardado[1]
+        valor = calcular()
+        with self._lock:
+            if self.versao == versao:
+                self._memo[chave] = (versao, valor)
+                while len(self._memo) > self.MAX_MEMO:
+                    self._memo.popitem(last=False)
+        return valor
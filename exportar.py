@@ -0,0 +1,136 @@
+"""
+Exportação das reservas (iCalendar, CSV e JSON) para os coordenadores
+levarem para as suas agendas.
+
+Cada formato é um gerador de pedaços de texto sobre os registros Reserva já
+ordenados do índice (IndiceReservas.consultar): nada de DataFrame nem de lista
+intermediária. O pin_hash nunca sai — só as colunas de EXPORTADAS.
+"""
+import csv
+import json
+import re
+from datetime import date, datetime, timedelta, timezone
+from io import StringIO
+from typing import Callable, Iterable, Iterator, Optional, Tuple
+
+from indice import Reserva
+
+EXPORTADAS = ["recurso", "data", "turno", "grupo", "id"]
+
+FORMATOS = {
+    # formato: (extensão, mime)
+    "ics": ("ics", "text/calendar"),
+    "csv": ("csv", "text/csv"),
+    "json": ("json", "application/json"),
+}
+
+_HORARIO = re.compile(r"(\d{1,2})h(\d{2})?\s*-\s*(\d{1,2})h(\d{2})?")
+
+
+# =========================================================
+# CSV / JSON
+# =========================================================
+def gerar_csv(reservas: Iterable[Reserva], nome_recurso: Callable[[str], str] = str) -> Iterator[str]:
+    buf = StringIO()
+    w = csv.writer(buf, lineterminator="\n")
+
+    def _linha(valores) -> str:
+        w.writerow(valores)
+        texto = buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+        return texto
+
+    yield _linha(EXPORTADAS)
+    for r in reservas:
+        yield _linha([nome_recurso(r.recurso), r.data, r.turno, r.grupo, r.id])
+
+
+def gerar_json(reservas: Iterable[Reserva], nome_recurso: Callable[[str], str] = str) -> Iterator[str]:
+    yield "["
+    separador = "\n"
+    for r in reservas:
+        registro = {"recurso": nome_recurso(r.recurso), "data": r.data, "turno": r.turno,
+                    "grupo": r.grupo, "id": r.id}
+        yield separador + json.dumps(registro, ensure_ascii=False)
+        separador = ",\n"
+    yield "\n]\n"
+
+
+# =========================================================
+# iCalendar (RFC 5545)
+# =========================================================
+def _escapar(texto: str) -> str:
+    return (texto.replace("\\", "\\\\").replace(";", "\\;").replace(",", "\\,")
+            .replace("\r\n", "\\n").replace("\n", "\\n"))
+
+
+def _dobrar(linha: str) -> str:
+    """Linhas de no máximo 75 octetos; as continuações começam com um espaço."""
+    partes, atual, tamanho = [], [], 0
+    for c in linha:
+        n = len(c.encode("utf-8"))
+        if tamanho + n > 75:
+            partes.append("".join(atual))
+            atual, tamanho = [" "], 1
+        atual.append(c)
+        tamanho += n
+    partes.append("".join(atual))
+    return "\r\n".join(partes) + "\r\n"
+
+
+def horario(turno: str) -> Optional[Tuple[int, int, int, int]]:
+    """"08h - 12h" -> (8, 0, 12, 0); None se o turno não tiver esse formato."""
+    m = _HORARIO.fullmatch(turno.strip())
+    if m is None:
+        return None
+    h1, m1, h2, m2 = m.groups()
+    return int(h1), int(m1 or 0), int(h2), int(m2 or 0)
+
+
+def _evento(r: Reserva, nome_recurso: Callable[[str], str], carimbo: str, dominio: str) -> Iterator[str]:
+    try:
+        d = date.fromisoformat(r.data)
+    except ValueError:
+        return  # data impossível (ex.: 2030-02-30): não vira evento
+    yield "BEGIN:VEVENT\r\n"
+    yield _dobrar(f"UID:{r.id}@{dominio}")
+    yield f"DTSTAMP:{carimbo}\r\n"
+    h = horario(r.turno)
+    if h is None:
+        # turno fora do padrão "HHh - HHh": evento de dia inteiro
+        yield f"DTSTART;VALUE=DATE:{d:%Y%m%d}\r\n"
+        yield f"DTEND;VALUE=DATE:{d + timedelta(days=1):%Y%m%d}\r\n"
+    else:
+        # hora "flutuante" (sem fuso): a agenda mostra no horário local de quem importa
+        inicio = datetime(d.year, d.month, d.day, h[0], h[1])
+        fim = datetime(d.year, d.month, d.day, h[2], h[3])
+        if fim <= inicio:
+            fim += timedelta(days=1)
+        yield f"DTSTART:{inicio:%Y%m%dT%H%M%S}\r\n"
+        yield f"DTEND:{fim:%Y%m%dT%H%M%S}\r\n"
+    yield _dobrar("SUMMARY:" + _escapar(f"{r.grupo} — {nome_recurso(r.recurso)}"))
+    yield _dobrar("LOCATION:" + _escapar(nome_recurso(r.recurso)))
+    yield _dobrar("DESCRIPTION:" + _escapar(f"Turno {r.turno} (reserva {r.id})"))
+    yield "END:VEVENT\r\n"
+
+
+def gerar_ics(reservas: Iterable[Reserva], nome_recurso: Callable[[str], str] = str,
+              nome_agenda: str = "Reservas", dominio: str = "reserva-sala-ensaios") -> Iterator[str]:
+    carimbo = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    yield "BEGIN:VCALENDAR\r\n"
+    yield "VERSION:2.0\r\n"
+    yield _dobrar(f"PRODID:-//{dominio}//Reservas//PT-BR")
+    yield "CALSCALE:GREGORIAN\r\n"
+    yield _dobrar("X-WR-CALNAME:" + _escapar(nome_agenda))
+    for r in reservas:
+        yield from _evento(r, nome_recurso, carimbo, dominio)
+    yield "END:VCALENDAR\r\n"
+
+
+GERADORES = {"ics": gerar_ics, "csv": gerar_csv, "json": gerar_json}
+
+
+def exportar(formato: str, reservas: Iterable[Reserva], nome_recurso: Callable[[str], str] = str) -> bytes:
+    """O arquivo inteiro (para o st.download_button), montado direto dos pedaços do gerador."""
+    return "".join(GERADORES[formato](reservas, nome_recurso)).encode("utf-8")
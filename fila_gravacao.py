@@ -0,0 +1,276 @@
+"""
+Gravação em segundo plano (write-behind) com diário local.
+
+Reservar/cancelar deixa de esperar o GitHub: a operação é validada contra o
+estado em memória (dados carregados + operações ainda pendentes), anotada
+num diário local (JSON Lines, com fsync) e confirmada ao usuário. Uma thread
+junta tudo o que chegar numa janela curta e grava num único commit, via
+transacao() do backend de destino (que revalida cada operação sobre os dados
+mais novos).
+
+Se o processo cair antes de gravar, o diário é reaplicado na próxima subida.
+Obs.: no Streamlit Cloud o disco não sobrevive a um redeploy do container.
+"""
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from datetime import date
+from typing import Callable, List, Optional, Tuple
+
+import pandas as pd
+
+from armazenamento import (
+    COLUNAS,
+    Armazenamento,
+    PinIncorreto,
+    ReservaNaoEncontrada,
+    TurnoIndisponivel,
+    substituir_pin_hash,
+)
+from indice import Reserva
+from metricas import METRICAS
+
+log = logging.getLogger(__name__)
+
+
+class FilaGravacao(Armazenamento):
+    """
+    Envolve outro Armazenamento (normalmente o do GitHub).
+    inserir/remover só anotam; a thread "fila-gravacao" descarrega em lote.
+    """
+
+    JANELA = 1.5  # segundos juntando operações antes de gravar
+    ESPERA_ERRO = 5.0
+
+    def __init__(self, destino: Armazenamento, diario: str, janela: float = JANELA):
+        super().__init__()
+        self.destino = destino
+        self.diario = diario
+        self.janela = janela
+        self._cond = threading.Condition(threading.RLock())
+        self._gravando = threading.Lock()
+        self._pendentes: List[dict] = []
+        self._seq = 0
+        self._sobreposto: Optional[Tuple[pd.DataFrame, int, pd.DataFrame]] = None
+        # operações que não puderam ser aplicadas na hora de gravar (ex.: outro
+        # servidor gravou o mesmo turno antes)
+        self.falhas = deque(maxlen=100)
+        self._recuperar()
+        self._thread = threading.Thread(target=self._laco, name="fila-gravacao", daemon=True)
+        self._thread.start()
+
+    # -------------------------
+    # Diário
+    # -------------------------
+    def _recuperar(self) -> None:
+        if not os.path.exists(self.diario):
+            return
+        with open(self.diario, encoding="utf-8") as f:
+            for linha in f:
+                try:
+                    op = json.loads(linha)
+                except ValueError:
+                    continue  # última linha cortada no meio
+                self._pendentes.append(op)
+                self._seq = max(self._seq, op["seq"])
+        if self._pendentes:
+            log.warning("fila de gravação: %d operações do diário serão reaplicadas", len(self._pendentes))
+
+    def _anotar(self, ops: List[dict]) -> None:
+        with open(self.diario, "a", encoding="utf-8") as f:
+            f.write("".join(json.dumps(op, ensure_ascii=False) + "\n" for op in ops))
+            f.flush()
+            os.fsync(f.fileno())
+
+    def _reescrever_diario(self) -> None:
+        tmp = self.diario + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for op in self._pendentes:
+                f.write(json.dumps(op, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.diario)
+
+    # -------------------------
+    # Leitura (dados do destino + pendentes)
+    # -------------------------
+    def pendentes(self) -> int:
+        with self._cond:
+            return len(self._pendentes)
+
+    def carregar(self, fresco: bool = False) -> pd.DataFrame:
+        df = self.destino.carregar(fresco=fresco)
+        with self._cond:
+            if not self._pendentes:
+                return df
+            seq = self._pendentes[-1]["seq"]
+            if self._sobreposto is not None and self._sobreposto[0] is df and self._sobreposto[1] == seq:
+                return self._sobreposto[2]  # mesmo objeto: o índice não é reconstruído
+            pendentes = list(self._pendentes)
+        removidos = {op["id"] for op in pendentes if op["op"] == "remover"}
+        novos = [op["reserva"] for op in pendentes if op["op"] == "inserir" and op["reserva"]["id"] not in removidos]
+        if novos:
+            # logo depois de um commit o destino já pode ter algumas delas
+            ja_gravados = set(df["id"][df["id"].isin([r["id"] for r in novos])])
+            novos = [r for r in novos if r["id"] not in ja_gravados]
+        base = df[~df["id"].isin(removidos)] if removidos else df
+        sobreposto = pd.concat([base, pd.DataFrame(novos, columns=COLUNAS)], ignore_index=True) if novos else base
+        for op in pendentes:
+            if op["op"] == "pin":
+                sobreposto = substituir_pin_hash(sobreposto, op["antigo"], op["novo"])
+        with self._cond:
+            self._sobreposto = (df, seq, sobreposto)
+        return sobreposto
+
+    def versao(self) -> Optional[str]:
+        marca = self.destino.versao()
+        if marca is None:
+            return None
+        with self._cond:
+            return f"{marca}+{self._pendentes[-1]['seq'] if self._pendentes else 0}"
+
+    def carregar_historico(self, ano: int) -> pd.DataFrame:
+        return self.destino.carregar_historico(ano)
+
+    # -------------------------
+    # Escrita
+    # -------------------------
+    def _enfileirar(self, *ops: dict) -> None:
+        for op in ops:
+            self._seq += 1
+            op["seq"] = self._seq
+        self._anotar(list(ops))  # confirmado só depois de estar no disco (um fsync por lote)
+        self._pendentes.extend(ops)
+        METRICAS.contar("fila.enfileiradas", len(ops))
+        self._cond.notify()
+
+    def inserir(self, reserva: dict) -> None:
+        nova = Reserva.de_dict(reserva)
+        with self._cond:
+            if self.indice(self.carregar()).ocupante(nova) is not None:
+                raise TurnoIndisponivel()
+            self._enfileirar({"op": "inserir", "reserva": nova.para_dict()})
+
+    def inserir_lote(self, reservas: List[dict], pular_ocupadas: bool = False) -> List[Reserva]:
+        novas = [Reserva.de_dict(r) for r in reservas]
+        with self._cond:
+            indice = self.indice(self.carregar())
+            conflitos = indice.conflitos(novas)
+            if conflitos and not pular_ocupadas:
+                raise TurnoIndisponivel(conflitos)
+            fora = {id(r) for r in conflitos}
+            ops = [{"op": "inserir", "reserva": r.para_dict()} for r in novas
+                   if id(r) not in fora and r.id not in indice.por_id]
+            if ops:
+                self._enfileirar(*ops)
+            return conflitos
+
+    def remover(self, id_reserva: str, autorizar: Callable[[dict], bool]) -> None:
+        with self._cond:
+            reserva = self.indice(self.carregar()).buscar(id_reserva)
+            if reserva is None:
+                raise ReservaNaoEncontrada()
+            if not autorizar(reserva.para_dict()):
+                raise PinIncorreto()
+            self._enfileirar({"op": "remover", "id": id_reserva})
+
+    def trocar_pin_hash(self, antigo: str, novo: str) -> int:
+        with self._cond:
+            df = self.carregar()
+            n = int((df["pin_hash"] == antigo).sum())
+            if n:
+                self._enfileirar({"op": "pin", "antigo": antigo, "novo": novo})
+            return n
+
+    def salvar(self, df: pd.DataFrame) -> None:
+        self.descarregar()
+        self.destino.salvar(df)
+
+    def transacao(self, mutacao: Callable[[pd.DataFrame], pd.DataFrame]) -> pd.DataFrame:
+        self.descarregar()
+        return self.destino.transacao(mutacao)
+
+    def arquivar(self, hoje: date) -> int:
+        self.descarregar()
+        return self.destino.arquivar(hoje)
+
+    # -------------------------
+    # Descarga em lote
+    # -------------------------
+    def descarregar(self) -> int:
+        """
+        Grava TODAS as operações pendentes num único commit.
+        Retorna quantas foram aplicadas; se a gravação falhar, elas continuam
+        pendentes (e no diário) para a próxima tentativa.
+        """
+        with self._gravando:
+            with self._cond:
+                lote = list(self._pendentes)
+            if not lote:
+                return 0
+
+            resultado = {}
+
+            def _aplicar(df_atual: pd.DataFrame) -> pd.DataFrame:
+                # refeito a cada tentativa da transação, sobre os dados mais novos
+                indice = self.destino.indice(df_atual).copia()
+                remover, novos, falhas, pins = set(), [], [], []
+                for op in lote:
+                    if op["op"] == "pin":
+                        pins.append(op)
+                    elif op["op"] == "inserir":
+                        r = Reserva.de_dict(op["reserva"])
+                        ocupante = indice.ocupante(r)
+                        if ocupante is None:
+                            indice.adicionar(r)
+                            novos.append(r)
+                        elif ocupante.id != r.id:
+                            falhas.append(op)
+                    else:
+                        r = indice.remover(op["id"])
+                        if r is not None:
+                            if r in novos:
+                                novos.remove(r)
+                            else:
+                                remover.add(op["id"])
+                resultado["falhas"] = falhas
+                df_novo = df_atual[~df_atual["id"].isin(remover)] if remover else df_atual
+                if novos:
+                    df_novo = pd.concat([df_novo, pd.DataFrame([r.para_dict() for r in novos], columns=COLUNAS)],
+                                        ignore_index=True)
+                for op in pins:
+                    df_novo = substituir_pin_hash(df_novo, op["antigo"], op["novo"])
+                return df_novo
+
+            t0 = time.perf_counter()
+            self.destino.transacao(_aplicar)
+            METRICAS.observar("fila.descarregar", (time.perf_counter() - t0) * 1000)
+            METRICAS.contar("fila.commits")
+            METRICAS.contar("fila.operacoes_gravadas", len(lote))
+
+            for op in resultado.get("falhas", []):
+                METRICAS.contar("fila.falhas")
+                log.warning("fila de gravação: operação descartada (turno já ocupado): %s", op)
+                self.falhas.append(op)
+
+            ultimo = lote[-1]["seq"]
+            with self._cond:
+                self._pendentes = [op for op in self._pendentes if op["seq"] > ultimo]
+                self._reescrever_diario()
+            return len(lote)
+
+    def _laco(self) -> None:
+        while True:
+            with self._cond:
+                while not self._pendentes:
+                    self._cond.wait()
+            time.sleep(self.janela)  # junta o que chegar nessa janela num commit só
+            try:
+                self.descarregar()
+            except Exception:
+                METRICAS.contar("fila.erros")
+                log.exception("fila de gravação: falha ao gravar; nova tentativa em %.0fs", self.ESPERA_ERRO)
+                time.sleep(self.ESPERA_ERRO)
@@ -0,0 +1,143 @@
+"""
+Cliente HTTP do GitHub: uma requests.Session por processo (pool de conexões,
+keep-alive), timeouts separados de conexão/leitura e retentativas que
+respeitam Retry-After / X-RateLimit-Reset, limitadas por um orçamento global.
+"""
+import random
+import threading
+import time
+from typing import Optional
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metricas import METRICAS
+
+# (conectar, ler) em segundos — antes era um timeout único de 20 s
+TIMEOUT = (3.05, 15)
+
+# 5xx que valem nova tentativa (instabilidade do GitHub)
+STATUS_TRANSITORIOS = {500, 502, 503, 504}
+
+
+class OrcamentoRetentativas:
+    """
+    Balde de fichas compartilhado: no máximo `capacidade` retentativas de
+    uma vez, repostas a `por_segundo`. Evita que, com o GitHub fora do ar,
+    todas as sessões fiquem retentando juntas.
+    """
+
+    def __init__(self, capacidade: float = 20, por_segundo: float = 0.5):
+        self.capacidade = capacidade
+        self.por_segundo = por_segundo
+        self._fichas = capacidade
+        self._quando = time.monotonic()
+        self._lock = threading.Lock()
+
+    def gastar(self) -> bool:
+        with self._lock:
+            agora = time.monotonic()
+            self._fichas = min(self.capacidade, self._fichas + (agora - self._quando) * self.por_segundo)
+            self._quando = agora
+            if self._fichas < 1:
+                return False
+            self._fichas -= 1
+            return True
+
+
+ORCAMENTO = OrcamentoRetentativas()
+
+
+def _espera_limite(r: requests.Response) -> Optional[float]:
+    """Segundos pedidos pelo GitHub num 403/429 de rate limit (None se não for rate limit)."""
+    if r.status_code not in (403, 429):
+        return None
+    retry_after = r.headers.get("Retry-After")
+    if retry_after is not None:
+        try:
+            return max(float(retry_after), 0.0)
+        except ValueError:
+            return None
+    if r.headers.get("X-RateLimit-Remaining") == "0":
+        try:
+            return max(float(r.headers["X-RateLimit-Reset"]) - time.time(), 0.0)
+        except (KeyError, ValueError):
+            return None
+    return None
+
+
+class SessaoGitHub:
+    """
+    Session com pool/keep-alive: um handshake TLS por conexão, reaproveitada
+    entre leituras e gravações de todas as sessões do Streamlit.
+
+    Retentativas (até `tentativas`, se o orçamento global deixar):
+    - erro de conexão/timeout: no GET sempre; no PUT/POST/PATCH só se nem conectou
+      (depois de enviado, pode ter gravado);
+    - rate limit (403/429): espera o Retry-After / X-RateLimit-Reset, se for
+      no máximo `espera_max` segundos;
+    - 5xx transitório: só em métodos idempotentes (GET). Um PUT que voltou 502
+      pode ter gravado; repetir daria um 409 falso — quem decide é a transação.
+    """
+
+    def __init__(self, token: str, tentativas: int = 3, espera_max: float = 10.0,
+                 orcamento: OrcamentoRetentativas = ORCAMENTO):
+        self.tentativas = tentativas
+        self.espera_max = espera_max
+        self.orcamento = orcamento
+        self.sessao = requests.Session()
+        adaptador = HTTPAdapter(pool_connections=4, pool_maxsize=16, max_retries=0)
+        self.sessao.mount("https://", adaptador)
+        self.sessao.mount("http://", adaptador)
+        self.sessao.headers.update({
+            "Authorization": f"token {token}",
+            "Accept": "application/vnd.github+json",
+        })
+
+    def _pode_repetir(self, tentativa: int) -> bool:
+        if tentativa >= self.tentativas:
+            return False
+        if not self.orcamento.gastar():
+            METRICAS.contar("github.retentativas_sem_orcamento")
+            return False
+        METRICAS.contar("github.retentativas")
+        return True
+
+    @staticmethod
+    def _backoff(tentativa: int) -> float:
+        return min(0.25 * (2 ** tentativa), 4.0) + random.uniform(0, 0.25)
+
+    def request(self, metodo: str, url: str, **kwargs) -> requests.Response:
+        kwargs.setdefault("timeout", TIMEOUT)
+        idempotente = metodo.upper() in ("GET", "HEAD")
+        tentativa = 0
+        while True:
+            try:
+                r = self.sessao.request(metodo, url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                seguro = idempotente or isinstance(e, requests.ConnectTimeout)
+                if not seguro or not self._pode_repetir(tentativa):
+                    raise
+                time.sleep(self._backoff(tentativa))
+                tentativa += 1
+                continue
+
+            espera = _espera_limite(r)
+            if espera is None and idempotente and r.status_code in STATUS_TRANSITORIOS:
+                espera = self._backoff(tentativa)
+            if espera is None or espera > self.espera_max or not self._pode_repetir(tentativa):
+                return r
+            time.sleep(espera)
+            tentativa += 1
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def put(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PUT", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def patch(self, url: str, **kwargs) -> requests.Response:
+        return self.request("PATCH", url, **kwargs)
@@ -0,0 +1,289 @@
+"""
+Índice em memória das reservas de um snapshot carregado.
+
+Troca as varreduras do DataFrame (df[df["data"] == ...], df[df["id"] == ...])
+por consultas O(1) em dicionários: (recurso, data, turno) -> Reserva e
+id -> Reserva.
+
+As telas trabalham com registros Reserva (com __slots__) ordenados uma vez
+por (data, turno), sem pandas: filtrar as futuras é uma busca binária, e o
+DataFrame só é montado (para_dataframe) onde o Streamlit precisa de um, no
+st.dataframe da lista.
+"""
+import re
+from bisect import bisect_left
+from datetime import date, timedelta
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from agenda import RECURSO_PADRAO, recurso as recurso_por_chave, turnos_por_data
+
+if TYPE_CHECKING:
+    import pandas as pd
+
+
+def _texto(v) -> str:
+    # células vazias do CSV chegam como NaN
+    return v if isinstance(v, str) else ""
+
+_DATA_VALIDA = re.compile(r"\d{4}-\d{2}-\d{2}$").match
+
+HORIZONTE_BUSCA = 366  # dias olhados por IndiceReservas.livres sem data final
+
+def _bit(r: "Reserva") -> int:
+    """Bit do turno da reserva na lista turnos_por_data do dia (0 se a data/turno não existem)."""
+    try:
+        turnos = turnos_por_data(date.fromisoformat(r.data), r.recurso)
+    except ValueError:
+        return 0
+    return 1 << turnos.index(r.turno) if r.turno in turnos else 0
+
+
+class Reserva:
+    __slots__ = ("id", "data", "turno", "grupo", "pin_hash", "recurso")
+
+    def __init__(self, id: str, data: str, turno: str, grupo: str = "", pin_hash: str = "",
+                 recurso: str = RECURSO_PADRAO):
+        self.id = id
+        self.data = data
+        self.turno = turno
+        self.grupo = grupo
+        self.pin_hash = pin_hash
+        self.recurso = recurso or RECURSO_PADRAO
+
+    @property
+    def chave(self) -> Tuple[str, str, str]:
+        """(recurso, data, turno): o que não pode ter duas reservas."""
+        return (self.recurso, self.data, self.turno)
+
+    @classmethod
+    def de_dict(cls, d: dict) -> "Reserva":
+        return cls(
+            _texto(d.get("id")),
+            _texto(d.get("data"))[:10],
+            _texto(d.get("turno")),
+            _texto(d.get("grupo")),
+            _texto(d.get("pin_hash")),
+            _texto(d.get("recurso")),
+        )
+
+    def para_dict(self) -> dict:
+        return {c: getattr(self, c) for c in self.__slots__}
+
+    def ordem(self) -> Tuple[str, str, str]:
+        """Chave de ordenação das telas: (data, turno, recurso)."""
+        return (self.data, self.turno, self.recurso)
+
+    def __repr__(self) -> str:
+        return f"Reserva({self.recurso} {self.data} {self.turno} {self.grupo!r} id={self.id})"
+
+
+class IndiceReservas:
+    """
+    por_turno: (recurso, data "AAAA-MM-DD", turno) -> Reserva
+    por_id:    id -> Reserva
+    Construído uma vez por snapshot e atualizado incrementalmente
+    (adicionar/remover) depois de cada gravação.
+
+    Para a busca de horários livres há também um mapa de bits
+    (recurso, data) -> turnos ocupados (bit i = i-ésimo de turnos_por_data),
+    montado na primeira busca e mantido por adicionar/remover.
+    """
+
+    __slots__ = ("por_turno", "por_id", "_ordenadas", "_datas", "_por_grupo", "_grupos", "_ocupados")
+
+    def __init__(self):
+        self.por_turno: Dict[Tuple[str, str, str], Reserva] = {}
+        self.por_id: Dict[str, Reserva] = {}
+        self._ordenadas: Optional[List[Reserva]] = None
+        self._datas: List[str] = []
+        self._por_grupo: Optional[List[Reserva]] = None
+        self._grupos: List[str] = []
+        self._ocupados: Optional[Dict[Tuple[str, str], int]] = None
+
+    @classmethod
+    def de_df(cls, df: "pd.DataFrame") -> "IndiceReservas":
+        indice = cls()
+        recursos = df["recurso"] if "recurso" in df.columns else [RECURSO_PADRAO] * len(df)
+        for id_, data, turno, grupo, pin_hash, recurso in zip(
+            df["id"], df["data"], df["turno"], df["grupo"], df["pin_hash"], recursos
+        ):
+            r = Reserva(_texto(id_), _texto(data)[:10], _texto(turno), _texto(grupo), _texto(pin_hash), _texto(recurso))
+            indice.por_turno[r.chave] = r
+            indice.por_id[r.id] = r
+        return indice
+
+    def copia(self) -> "IndiceReservas":
+        """Cópia rasa (os dicionários são novos, os registros são os mesmos)."""
+        novo = IndiceReservas()
+        novo.por_turno = dict(self.por_turno)
+        novo.por_id = dict(self.por_id)
+        if self._ocupados is not None:
+            novo._ocupados = dict(self._ocupados)
+        return novo
+
+    def __len__(self) -> int:
+        return len(self.por_id)
+
+    # -------------------------
+    # Consultas
+    # -------------------------
+    def ocupante(self, reserva: Reserva) -> Optional[Reserva]:
+        """Quem já está no (recurso, data, turno) da reserva, se alguém."""
+        return self.por_turno.get(reserva.chave)
+
+    def conflitos(self, reservas: Iterable[Reserva]) -> List[Reserva]:
+        """
+        As reservas (de um lote) cujo (recurso, data, turno) já está ocupado por
+        OUTRA reserva — uma interseção de conjuntos, não uma busca por item.
+        """
+        reservas = list(reservas)
+        comuns = {r.chave for r in reservas} & self.por_turno.keys()
+        if not comuns:
+            return []
+        return [r for r in reservas if r.chave in comuns and self.por_turno[r.chave].id != r.id]
+
+    def ordenadas(self) -> List[Reserva]:
+        """Todas as reservas por (data, turno) — ordenadas uma vez por índice."""
+        if self._ordenadas is None:
+            ordenadas = sorted(self.por_id.values(), key=Reserva.ordem)
+            self._datas = [r.data for r in ordenadas]
+            self._ordenadas = ordenadas
+        return self._ordenadas
+
+    def entre(self, inicio: str, fim: Optional[str] = None) -> List[Reserva]:
+        """Reservas com inicio <= data < fim ("AAAA-MM-DD"; sem fim, até o final), por busca binária."""
+        ordenadas = self.ordenadas()
+        i = bisect_left(self._datas, inicio)
+        j = len(ordenadas) if fim is None else bisect_left(self._datas, fim, i)
+        return [r for r in ordenadas[i:j] if _DATA_VALIDA(r.data)]
+
+    def _ordenadas_por_grupo(self) -> List[Reserva]:
+        """Todas as reservas por (grupo sem maiúsculas, data, turno) — para buscar por prefixo."""
+        if self._por_grupo is None:
+            por_grupo = sorted(self.por_id.values(), key=lambda r: (r.grupo.casefold(), r.ordem()))
+            self._grupos = [r.grupo.casefold() for r in por_grupo]
+            self._por_grupo = por_grupo
+        return self._por_grupo
+
+    def consultar(self, de: Optional[date] = None, ate: Optional[date] = None,
+                  prefixo_grupo: str = "") -> List[Reserva]:
+        """
+        Reservas entre de e ate (inclusive) cujo grupo começa com
+        prefixo_grupo (sem diferenciar maiúsculas), por (data, turno). Sem prefixo é uma
+        fatia das ordenadas; com prefixo, uma fatia da lista por grupo.
+        """
+        inicio = str(de) if de is not None else ""
+        fim = str(ate + timedelta(days=1)) if ate is not None else None
+        prefixo = prefixo_grupo.strip().casefold()
+        if not prefixo:
+            return self.entre(inicio, fim)
+        por_grupo = self._ordenadas_por_grupo()
+        i = bisect_left(self._grupos, prefixo)
+        j = bisect_left(self._grupos, prefixo + "\U0010ffff", i)
+        achadas = [r for r in por_grupo[i:j]
+                   if inicio <= r.data and (fim is None or r.data < fim) and _DATA_VALIDA(r.data)]
+        achadas.sort(key=Reserva.ordem)
+        return achadas
+
+    def a_partir_de(self, d: date) -> List[Reserva]:
+        """Reservas de d em diante (as "futuras" das telas), já ordenadas."""
+        return self.entre(str(d))
+
+    def do_mes(self, ano: int, mes: int) -> List[Reserva]:
+        proximo = f"{ano + mes // 12:04d}-{mes % 12 + 1:02d}"
+        return self.entre(f"{ano:04d}-{mes:02d}", proximo)
+
+    def turnos_disponiveis(self, d: date, recurso: str = RECURSO_PADRAO) -> List[str]:
+        data = str(d)
+        return [t for t in turnos_por_data(d, recurso) if (recurso, data, t) not in self.por_turno]
+
+    def ocupados(self) -> Dict[Tuple[str, str], int]:
+        """(recurso, data) -> bits dos turnos ocupados; montado uma vez, depois incremental."""
+        if self._ocupados is None:
+            ocupados: Dict[Tuple[str, str], int] = {}
+            for r in self.por_turno.values():
+                bit = _bit(r)
+                if bit:
+                    k = (r.recurso, r.data)
+                    ocupados[k] = ocupados.get(k, 0) | bit
+            self._ocupados = ocupados
+        return self._ocupados
+
+    def livres(self, inicio: date, recurso: str = RECURSO_PADRAO, ate: Optional[date] = None,
+               dias_semana: Optional[Iterable[int]] = None, turnos: Optional[Iterable[str]] = None,
+               limite: int = 10) -> List[Tuple[date, str]]:
+        """
+        Os próximos `limite` (data, turno) livres de inicio até ate (inclusive;
+        sem ate, HORIZONTE_BUSCA dias), só nos dias da semana (0=seg) e
+        turnos pedidos. Anda pelos dias olhando um inteiro por dia no mapa de
+        bits — não percorre as reservas.
+        """
+        ocupados = self.ocupados()
+        rec = recurso_por_chave(recurso)
+        ate = ate or inicio + timedelta(days=HORIZONTE_BUSCA - 1)
+        dias = set(range(7) if dias_semana is None else dias_semana)
+        filtro = None if turnos is None else set(turnos)
+        # por dia da semana: (turnos do dia, bits dos turnos pedidos)
+        por_dia = {}
+        for i in range(7):
+            lista = rec.turnos(inicio + timedelta(days=i))
+            desejados = sum(1 << j for j, t in enumerate(lista) if filtro is None or t in filtro)
+            por_dia[(inicio.weekday() + i) % 7] = (lista, desejados)
+
+        achados: List[Tuple[date, str]] = []
+        d = inicio
+        while d <= ate and len(achados) < limite:
+            dia = d.weekday()
+            if dia in dias:
+                lista, desejados = por_dia[dia]
+                livres = desejados & ~ocupados.get((recurso, str(d)), 0)
+                j = 0
+                while livres and len(achados) < limite:
+                    if livres & 1:
+                        achados.append((d, lista[j]))
+                    livres >>= 1
+                    j += 1
+            d += timedelta(days=1)
+        return achados
+
+    def buscar(self, id_reserva: str) -> Optional[Reserva]:
+        return self.por_id.get(id_reserva)
+
+    # -------------------------
+    # Atualização incremental
+    # -------------------------
+    def adicionar(self, reserva: Reserva) -> None:
+        self.por_turno[reserva.chave] = reserva
+        self.por_id[reserva.id] = reserva
+        self._ordenadas = self._por_grupo = None
+        bit = _bit(reserva) if self._ocupados is not None else 0
+        if bit:
+            k = (reserva.recurso, reserva.data)
+            self._ocupados[k] = self._ocupados.get(k, 0) | bit
+
+    def remover(self, id_reserva: str) -> Optional[Reserva]:
+        r = self.por_id.pop(id_reserva, None)
+        if r is not None and self.por_turno.get(r.chave) is r:
+            del self.por_turno[r.chave]
+            if self._ocupados is not None:
+                k = (r.recurso, r.data)
+                bits = self._ocupados.get(k, 0) & ~_bit(r)
+                if bits:
+                    self._ocupados[k] = bits
+                else:
+                    self._ocupados.pop(k, None)
+        if r is not None:
+            self._ordenadas = self._por_grupo = None
+        return r
+
+
+# =========================================================
+# Sem pandas: adaptador para st.dataframe
+# =========================================================
+def para_dataframe(reservas: Iterable[Reserva], colunas: Sequence[str]) -> "pd.DataFrame":
+    """DataFrame só com as colunas pedidas (para o st.dataframe)."""
+    import pandas as pd
+
+    return pd.DataFrame.from_records(
+        [tuple(getattr(r, c) for c in colunas) for r in reservas], columns=list(colunas)
+    )
@@ -0,0 +1,128 @@
+"""
+Métricas do processo: contadores, valores (último visto) e histogramas de tempo.
+
+    from metricas import METRICAS
+
+    with METRICAS.cronometro("github.get"):
+        ...
+    METRICAS.contar("github.cache_304")
+    METRICAS.valor("github.rate_limit_restante", 4999)
+
+O registro é único por processo (todas as sessões somam nele). Com a variável
+de ambiente METRICAS_LOG=1 cada evento também vai para o logger "metricas"
+como uma linha JSON.
+"""
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict
+
+# limites superiores dos baldes do histograma, em ms
+BALDES_MS = [1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, float("inf")]
+
+log = logging.getLogger("metricas")
+
+
+class _Histograma:
+    __slots__ = ("baldes", "n", "soma", "minimo", "maximo", "recentes")
+
+    def __init__(self):
+        self.baldes = [0] * len(BALDES_MS)
+        self.n = 0
+        self.soma = 0.0
+        self.minimo = float("inf")
+        self.maximo = 0.0
+        self.recentes = deque(maxlen=512)  # para p50/p95 recentes
+
+    def observar(self, ms: float) -> None:
+        self.baldes[bisect.bisect_left(BALDES_MS, ms)] += 1
+        self.n += 1
+        self.soma += ms
+        self.minimo = min(self.minimo, ms)
+        self.maximo = max(self.maximo, ms)
+        self.recentes.append(ms)
+
+    def resumo(self) -> dict:
+        ordenados = sorted(self.recentes)
+
+        def pct(p: float) -> float:
+            return round(ordenados[min(int(p * len(ordenados)), len(ordenados) - 1)], 3) if ordenados else 0.0
+
+        return {
+            "n": self.n,
+            "media_ms": round(self.soma / self.n, 3) if self.n else 0.0,
+            "min_ms": round(self.minimo, 3) if self.n else 0.0,
+            "max_ms": round(self.maximo, 3),
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "baldes": {("+inf" if b == float("inf") else f"<={b:g}ms"): c
+                       for b, c in zip(BALDES_MS, self.baldes) if c},
+        }
+
+
+class Metricas:
+    def __init__(self, registrar_log: bool = False):
+        self.registrar_log = registrar_log
+        self._lock = threading.Lock()
+        self._contadores: Dict[str, float] = {}
+        self._valores: Dict[str, object] = {}
+        self._histogramas: Dict[str, _Histograma] = {}
+        self._desde = time.time()
+
+    def _log(self, tipo: str, nome: str, valor) -> None:
+        if self.registrar_log:
+            log.info(json.dumps({"t": round(time.time(), 3), "tipo": tipo, "nome": nome, "valor": valor}))
+
+    def contar(self, nome: str, n: float = 1) -> None:
+        with self._lock:
+            self._contadores[nome] = self._contadores.get(nome, 0) + n
+        self._log("contador", nome, n)
+
+    def valor(self, nome: str, v) -> None:
+        with self._lock:
+            self._valores[nome] = v
+        self._log("valor", nome, v)
+
+    def observar(self, nome: str, ms: float) -> None:
+        with self._lock:
+            h = self._histogramas.get(nome)
+            if h is None:
+                h = self._histogramas[nome] = _Histograma()
+            h.observar(ms)
+        self._log("tempo_ms", nome, round(ms, 3))
+
+    @contextmanager
+    def cronometro(self, nome: str):
+        """Mede o bloco (mesmo se der exceção) no histograma nome."""
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(nome, (time.perf_counter() - t0) * 1000)
+
+    def instantaneo(self) -> dict:
+        with self._lock:
+            return {
+                "desde": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._desde)),
+                "contadores": dict(sorted(self._contadores.items())),
+                "valores": dict(sorted(self._valores.items())),
+                "tempos": {k: h.resumo() for k, h in sorted(self._histogramas.items())},
+            }
+
+    def para_json(self) -> str:
+        return json.dumps(self.instantaneo(), ensure_ascii=False, indent=2)
+
+    def zerar(self) -> None:
+        with self._lock:
+            self._contadores.clear()
+            self._valores.clear()
+            self._histogramas.clear()
+            self._desde = time.time()
+
+
+METRICAS = Metricas(registrar_log=os.environ.get("METRICAS_LOG", "") not in ("", "0"))
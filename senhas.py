@@ -0,0 +1,252 @@
+"""
+PINs das reservas: hash com sal e KDF lenta, verificação em tempo constante,
+limite de tentativas (por reserva, e um global para o PIN do administrador)
+e cache das verificações que deram certo.
+
+O pin_hash fica no CSV (num repositório público, no modo GitHub). Com o
+sha256 puro de antes, testar todos os PINs de 4 a 8 dígitos levava
+milissegundos; com sal por reserva e scrypt, cada palpite custa dezenas de
+milissegundos e não serve para nenhuma outra reserva. Não faz milagre com um
+PIN de 4 dígitos, mas tira a tabela pronta e a força bruta em massa.
+
+Formatos aceitos no pin_hash:
+    scrypt$<n>$<r>$<p>$<sal hex>$<hash hex>
+    pbkdf2_sha256$<iterações>$<sal hex>$<hash hex>
+    <64 hex>  legado: sha256(pin) sem sal; conferido em tempo constante e
+              trocado pelo formato atual no próximo cancelamento com o PIN.
+Não depende do Streamlit.
+"""
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Mapping, Optional, Tuple
+
+from erros import MuitasTentativas
+
+_LEGADO = re.compile(r"[0-9a-f]{64}")
+
+# custo padrão da KDF; trocado por configurar_kdf (secrets PIN_KDF)
+KDF: Dict[str, object] = {"kdf": "scrypt", "n": 2 ** 14, "r": 8, "p": 1, "iteracoes": 600_000}
+TAMANHO_SAL = 16
+TAMANHO_HASH = 32
+
+
+def configurar_kdf(cfg: Optional[Mapping]) -> Dict[str, object]:
+    """
+    Ajusta a KDF conforme a configuração (secrets PIN_KDF), por ex.:
+        [PIN_KDF]
+        kdf = "scrypt"       # ou "pbkdf2"
+        n = 16384            # scrypt: custo (potência de 2), r, p
+        iteracoes = 600000   # pbkdf2
+    Sem scrypt no OpenSSL do Python, usa PBKDF2. Só vale para hashes novos:
+    os antigos continuam conferindo com os parâmetros gravados neles.
+    """
+    KDF.update(cfg or {})
+    if KDF["kdf"] == "scrypt" and not hasattr(hashlib, "scrypt"):
+        KDF["kdf"] = "pbkdf2"
+    return KDF
+
+
+def _scrypt(pin: str, sal: bytes, n: int, r: int, p: int) -> bytes:
+    return hashlib.scrypt(pin.encode("utf-8"), salt=sal, n=n, r=r, p=p,
+                          maxmem=128 * r * (n + p + 2) + 1024 * 1024, dklen=TAMANHO_HASH)
+
+
+def _pbkdf2(pin: str, sal: bytes, iteracoes: int) -> bytes:
+    return hashlib.pbkdf2_hmac("sha256", pin.encode("utf-8"), sal, iteracoes, dklen=TAMANHO_HASH)
+
+
+def gerar_hash(pin: str) -> str:
+    """pin_hash de um PIN novo, com sal aleatório e a KDF configurada."""
+    sal = os.urandom(TAMANHO_SAL)
+    if KDF["kdf"] == "scrypt":
+        n, r, p = int(KDF["n"]), int(KDF["r"]), int(KDF["p"])
+        return f"scrypt${n}${r}${p}${sal.hex()}${_scrypt(pin, sal, n, r, p).hex()}"
+    iteracoes = int(KDF["iteracoes"])
+    return f"pbkdf2_sha256${iteracoes}${sal.hex()}${_pbkdf2(pin, sal, iteracoes).hex()}"
+
+
+def _derivar(pin: str, pin_hash: str) -> Optional[Tuple[bytes, bytes]]:
+    """(hash calculado, hash gravado) conforme o formato; None se o formato é desconhecido."""
+    partes = pin_hash.split("$")
+    try:
+        if partes[0] == "scrypt" and len(partes) == 6:
+            n, r, p = int(partes[1]), int(partes[2]), int(partes[3])
+            return _scrypt(pin, bytes.fromhex(partes[4]), n, r, p), bytes.fromhex(partes[5])
+        if partes[0] == "pbkdf2_sha256" and len(partes) == 4:
+            return _pbkdf2(pin, bytes.fromhex(partes[2]), int(partes[1])), bytes.fromhex(partes[3])
+    except ValueError:
+        return None  # parâmetros ou hex inválidos
+    if _LEGADO.fullmatch(pin_hash):
+        return hashlib.sha256(pin.encode("utf-8")).digest(), bytes.fromhex(pin_hash)
+    return None
+
+
+def pin_confere(pin: str, pin_hash: str) -> bool:
+    """O PIN confere com o pin_hash (comparação em tempo constante)."""
+    derivado = _derivar(pin, pin_hash or "")
+    return derivado is not None and hmac.compare_digest(*derivado)
+
+
+def precisa_migrar(pin_hash: str) -> bool:
+    """
+    Hash legado (sha256 sem sal) ou feito com outra KDF/custo que não o
+    configurado. Formato desconhecido (ou vazio) não migra: não há PIN que confira.
+    """
+    if _LEGADO.fullmatch(pin_hash or ""):
+        return True
+    partes = (pin_hash or "").split("$")
+    if partes[0] not in ("scrypt", "pbkdf2_sha256"):
+        return False
+    if KDF["kdf"] == "scrypt":
+        return partes[:4] != ["scrypt", str(KDF["n"]), str(KDF["r"]), str(KDF["p"])]
+    return partes[:2] != ["pbkdf2_sha256", str(KDF["iteracoes"])]
+
+
+def iguais(a: str, b: str) -> bool:
+    """Comparação de textos em tempo constante (ex.: o PIN do administrador)."""
+    return hmac.compare_digest(a.encode("utf-8"), b.encode("utf-8"))
+
+
+class VerificadorPin:
+    """
+    Verificação de PIN por reserva, compartilhada pelas sessões do processo.
+
+    - Limite de tentativas: depois de max_tentativas erros seguidos numa
+      reserva, ela fica bloqueada por `bloqueio` segundos, dobrando a cada
+      novo erro; os erros são esquecidos depois de `janela` segundos sem
+      tentativa, ou no primeiro acerto. MuitasTentativas(espera) enquanto
+      bloqueada — sem nem calcular a KDF.
+    - O PIN do administrador é um segredo só para o app inteiro: tem um
+      contador global (max_tentativas_admin), fora do de cada reserva. O PIN
+      certo nunca é recusado (nem com a reserva ou o contador bloqueados);
+      o contador só conta os palpites que nenhum contador de reserva já
+      contou — errar o PIN de uma reserva não bloqueia o administrador.
+    - Cache LRU (tamanho_cache) dos acertos recentes: repetir a mesma
+      verificação (a transação que relê e reconfere, outra reserva da mesma
+      série) não paga a KDF de novo. A chave é um HMAC com segredo do
+      processo de (pin_hash, PIN): o PIN não fica guardado em memória.
+    """
+
+    # chave do contador do administrador (nenhum id de reserva começa com \0)
+    ADMIN = "\0admin"
+
+    def __init__(self, max_tentativas: int = 5, bloqueio: float = 30.0, janela: float = 900.0,
+                 tamanho_cache: int = 256, max_tentativas_admin: int = 20,
+                 relogio: Callable[[], float] = time.monotonic):
+        self.max_tentativas = max_tentativas
+        self.max_tentativas_admin = max_tentativas_admin
+        self.bloqueio = bloqueio
+        self.janela = janela
+        self.tamanho_cache = tamanho_cache
+        self._relogio = relogio
+        self._lock = threading.Lock()
+        self._segredo = os.urandom(32)
+        self._acertos: "OrderedDict[bytes, None]" = OrderedDict()
+        # chave -> (erros seguidos, último erro, bloqueada até)
+        self._erros: Dict[str, Tuple[int, float, float]] = {}
+        # chave -> verificações calculando a KDF agora (contam como possíveis
+        # erros: muitas tentativas em paralelo não furam o limite)
+        self._em_curso: Dict[str, int] = {}
+
+    def _limite(self, chave: str) -> int:
+        return self.max_tentativas_admin if chave == self.ADMIN else self.max_tentativas
+
+    def _chave_cache(self, pin: str, pin_hash: str) -> bytes:
+        return hmac.new(self._segredo, f"{pin_hash}\0{pin}".encode("utf-8"), hashlib.sha256).digest()
+
+    def _conferir_bloqueio(self, chave: str, agora: float) -> None:
+        erros = self._erros.get(chave)
+        if erros is not None and agora - erros[1] > self.janela:
+            del self._erros[chave]
+        elif erros is not None and agora < erros[2]:
+            raise MuitasTentativas(erros[2] - agora)
+        em_curso = self._em_curso.get(chave, 0)
+        if em_curso and self._erros.get(chave, (0,))[0] + em_curso >= self._limite(chave):
+            raise MuitasTentativas(self.bloqueio)
+
+    def _registrar_erro(self, chave: str, agora: float) -> None:
+        n = self._erros.get(chave, (0, 0.0, 0.0))[0] + 1
+        limite = self._limite(chave)
+        ate = agora + self.bloqueio * 2 ** (n - limite) if n >= limite else 0.0
+        self._erros[chave] = (n, agora, ate)
+        if len(self._erros) > 4 * self.tamanho_cache:
+            # não deixa o dicionário crescer com reservas que ninguém mais tenta
+            for k in [k for k, e in self._erros.items() if agora - e[1] > self.janela and k != self.ADMIN]:
+                del self._erros[k]
+
+    def verificar_admin(self, pin: str, pin_admin: str, contar: bool = True) -> bool:
+        """
+        O PIN é o do administrador? Com contar, um erro vai para o contador
+        global (o painel de métricas); bloqueado, MuitasTentativas — mas só
+        depois de comparar: o PIN certo passa sempre.
+        """
+        if not pin_admin:
+            return False
+        with self._lock:
+            if iguais(pin, pin_admin):
+                self._erros.pop(self.ADMIN, None)
+                return True
+            if contar:
+                agora = self._relogio()
+                self._conferir_bloqueio(self.ADMIN, agora)
+                self._registrar_erro(self.ADMIN, agora)
+        return False
+
+    def _verificar_reserva(self, chave: str, pin: str, pin_hash: str) -> bool:
+        with self._lock:
+            agora = self._relogio()
+            self._conferir_bloqueio(chave, agora)
+            cache = self._chave_cache(pin, pin_hash)
+            if cache in self._acertos:
+                self._acertos.move_to_end(cache)
+                self._erros.pop(chave, None)
+                return True
+            self._em_curso[chave] = self._em_curso.get(chave, 0) + 1
+        # a KDF roda fora do lock: verificações de reservas diferentes não se esperam
+        try:
+            ok = pin_confere(pin, pin_hash)
+        finally:
+            with self._lock:
+                n = self._em_curso.pop(chave) - 1
+                if n:
+                    self._em_curso[chave] = n
+        with self._lock:
+            agora = self._relogio()
+            if not ok:
+                self._registrar_erro(chave, agora)
+                return False
+            self._erros.pop(chave, None)
+            self._acertos[cache] = None
+            self._acertos.move_to_end(cache)
+            while len(self._acertos) > self.tamanho_cache:
+                self._acertos.popitem(last=False)
+        return True
+
+    def verificar(self, chave: str, pin: str, pin_hash: str, pin_admin: str = "") -> bool:
+        """
+        O PIN confere com o pin_hash da reserva `chave`, ou é o PIN do
+        administrador (se informado)? O PIN do administrador vale mesmo com a
+        reserva bloqueada. Um erro conta na reserva; só com ela bloqueada (o
+        palpite não foi contado em lugar nenhum) conta no contador global.
+        MuitasTentativas se nenhum dos dois conferiu e algum está bloqueado.
+        """
+        bloqueada = None
+        try:
+            if self._verificar_reserva(chave, pin, pin_hash):
+                return True
+        except MuitasTentativas as e:
+            bloqueada = e
+        # um PIN de outro tamanho não pode ser o do administrador: nem compara
+        if pin_admin and len(pin) == len(pin_admin) \
+                and self.verificar_admin(pin, pin_admin, contar=bloqueada is not None):
+            with self._lock:
+                self._erros.pop(chave, None)
+            return True
+        if bloqueada is not None:
+            raise bloqueada
+        return False